@@ -14,8 +14,11 @@
 
 import numpy as np
 from scipy.sparse import *
-from sklearn.datasets import load_svmlight_file
-import os 
+from itertools import islice
+
+# Number of lines of sparse data files parsed at once by file_to_libsvm
+LIBSVM_CHUNK_LINES = 10000
+
 # Note: to check for nan values np.any(map(np.isnan,X_train))
 def file_to_array (filename, verbose=False):
     ''' Converts a file to a list of list of STRING
@@ -28,29 +31,55 @@ def file_to_array (filename, verbose=False):
         data = [lines[i].strip().split() for i in range (len(lines))]
     return data
 
-def file_to_libsvm (filename, data_binary  , n_features):
-    ''' Converts a file to svmlib format and return csr matrix 
+def parse_numbers (text):
+    ''' Numbers of a string separated by whitespace, as a float array.
+    Raises ValueError if one of them is not a number.'''
+    return np.array(text.split(), dtype=float)
+
+def file_to_libsvm (filename, data_binary  , n_features, chunk_lines=LIBSVM_CHUNK_LINES):
+    ''' Reads a sparse data file and returns a csr matrix
     filname = path of file 
     data_binary = True if is sparse binary data False else 
     n_features = number of features
+    Each line holds the (1-based) indices of the nonzero features of a pattern, as index:value pairs
+    (sparse data) or alone (sparse binary data, whose values are 1). The file is read by chunks of
+    chunk_lines lines, each parsed at once with numpy, and the indptr, indices and data arrays of the
+    csr matrix are built directly (no temporary file).
     '''
-    data =[]
-    with open(filename, "r") as data_file:
-        lines = data_file.readlines()
-        with open('tmp.txt', 'w') as f:
-            for l in lines  :
-                tmp = l.strip().split()
-                f.write("0 ")
-                for i in range (len(tmp) ):
-                    if(data_binary):
-                        f.write(tmp[i]+":1 ")
-                    else:
-                        f.write(tmp[i]+" ")
-                f.write("\n")
     print ("-------------------- file_to_libsvm  ---------------------")
-    l = load_svmlight_file('tmp.txt', zero_based= False ,  n_features = n_features )
-    os.remove("tmp.txt")
-    return l[0]
+    indptr = [np.zeros(1, dtype=np.int64)]
+    indices = []
+    data = []
+    nnz = 0
+    with open(filename, "r") as data_file:
+        while True:
+            lines = list(islice(data_file, chunk_lines))
+            if not lines:
+                break
+            if data_binary:
+                counts = np.array([len(line.split()) for line in lines], dtype=np.int64)
+                chunk_indices = parse_numbers(''.join(lines))
+                chunk_data = np.ones(len(chunk_indices))
+            else:
+                counts = np.array([line.count(':') for line in lines], dtype=np.int64)
+                pairs = parse_numbers(''.join(lines).replace(':', ' '))
+                chunk_indices = pairs[0::2]
+                chunk_data = pairs[1::2]
+            # A missing or extra ':' gives a different number of indices or values
+            if len(chunk_indices) != counts.sum() or len(chunk_data) != counts.sum():
+                raise ValueError("Malformed sparse data in {}".format(filename))
+            if np.any(chunk_indices != np.floor(chunk_indices)):
+                raise ValueError("Feature indices of {} should be integers".format(filename))
+            indptr.append(nnz + np.cumsum(counts))
+            nnz += counts.sum()
+            indices.append(chunk_indices.astype(np.int64) - 1)
+            data.append(chunk_data)
+    indptr = np.concatenate(indptr)
+    indices = np.concatenate([np.zeros(0, dtype=np.int64)] + indices)
+    data = np.concatenate([np.zeros(0)] + data)
+    if len(indices) and (indices.min() < 0 or indices.max() >= n_features):
+        raise ValueError("Feature indices of {} should be between 1 and n_features={}".format(filename, n_features))
+    return csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, n_features))
 
 def read_first_line (filename):
 	''' Read fist line of file'''
@@ -64,6 +93,65 @@ def num_lines (filename):
 	''' Count the number of lines of file'''
 	return sum(1 for line in open(filename))
 
+def scan_data_file (filename):
+    ''' Read a data file once, line by line, and return a dictionary with
+    'format': 'sparse' if the first value contains ':', 'dense' if all lines have the same number of values, 'sparse_binary' otherwise
+    'feat_num': number of values of the first line (dense) or largest feature index (sparse formats)
+    'num_lines': number of lines
+    Only the current line is kept in memory.'''
+    num_lines = 0
+    nbr_columns = None
+    is_sparse = False
+    constant_columns = True
+    max_index = 0 # Largest last index of a line, for the sparse formats
+    with open(filename, "r") as data_file:
+        for line in data_file:
+            values = line.split()
+            if num_lines == 0:
+                nbr_columns = len(values)
+                is_sparse = len(values) > 0 and ':' in values[0]
+            elif len(values) != nbr_columns:
+                constant_columns = False
+            num_lines += 1
+            if values and max_index is not None:
+                # Indices are sorted in each line: the last one is the largest
+                try:
+                    max_index = max(max_index, int(values[-1].split(':', 1)[0]))
+                except ValueError: # Not an index: dense data
+                    max_index = None
+    if is_sparse:
+        data_format = 'sparse'
+    elif constant_columns:
+        data_format = 'dense'
+    else:
+        data_format = 'sparse_binary'
+    feat_num = nbr_columns if data_format == 'dense' else max_index
+    return {'format': data_format, 'feat_num': feat_num, 'num_lines': num_lines}
+
+def scan_solution_file (filename):
+    ''' Read a solution file once, line by line, and return a dictionary with
+    'target_num': number of values (columns) of the first line
+    'num_lines': number of lines
+    'values': set of the distinct values (single column only, None otherwise)
+    'multilabel': True if a line has a sum larger than 1 (several columns only)
+    Only the current line and the distinct values are kept in memory.'''
+    num_lines = 0
+    target_num = None
+    values = set()
+    multilabel = False
+    with open(filename, "r") as solution_file:
+        for line in solution_file:
+            row = line.split()
+            if num_lines == 0:
+                target_num = len(row)
+            num_lines += 1
+            if target_num == 1:
+                values.update(row)
+            elif not multilabel and sum(map(float, row)) > 1:
+                multilabel = True
+    return {'target_num': target_num, 'num_lines': num_lines,
+            'values': values if target_num == 1 else None, 'multilabel': multilabel}
+
 def binarization (array):
 	''' Takes a binary-class datafile and turn the max value (positive class) into 1 and the min into 0'''
 	array = np.array(array, dtype=float) # conversion needed to use np.inf after
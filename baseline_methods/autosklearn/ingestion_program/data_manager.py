@@ -17,17 +17,40 @@ import data_converter
 import data_io
 from data_io import vprint
 import numpy as np
-try:
-    import cPickle as pickle
-except:
-    import pickle
+import scipy.sparse
+import hashlib
+import json
 import os
+import tempfile
 import time
 
 # This means the user is god and now the truth of everything, especially the
 # solutions for validation set and test set
 GOD_VIEW = True
 
+# Name of the index of the cache: (path, size, mtime) of source files -> hash
+# of their content
+CACHE_INDEX_FILENAME = 'index.json'
+# Default maximum size in bytes of the cached files. Least recently used ones
+# are removed above it
+DEFAULT_CACHE_MAX_SIZE = 20 * 1024**3
+
+def file_sha1(filename, block_size=1024*1024):
+    ''' sha1 hash of the content of a file'''
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+def write_atomic(path, write_function):
+    ''' Call write_function(file) on a temporary file, then rename it to path,
+    so that concurrent readers never see a partial file'''
+    tmp_path = path + '.tmp.' + str(os.getpid())
+    with open(tmp_path, 'wb') as f:
+        write_function(f)
+    os.rename(tmp_path, path)
+
 class DataManager:
     ''' This class aims at loading and saving data easily with a cache and at generating a dictionary (self.info) in which each key is a feature (e.g. : name, format, feat_num,...).
     Methods defined here are :
@@ -52,29 +75,47 @@ class DataManager:
         x.getNbrFeatures (*filenames) -> int
         Get the number of features, using the data files given. It first checks the format of the data. If it's a matrix, the number of features is trivial. If it's a sparse file, it gets the max feature index given in every files.
 
+    getFileScan (...)
+        x.getFileScan (filename, solution=False) -> dict
+        Read a data (or solution) file once and return its format, number of features and number of lines (or number of targets and distinct values). The result is kept for the other get* functions.
+
     getTypeProblem (...)
         x.getTypeProblem (filename) -> str
         Get the kind of problem ('binary.classification', 'multiclass.classification', 'multilabel.classification', 'regression'), using the solution file given.
     '''
 
-    def __init__(self, basename="", input_dir="", verbose=False, replace_missing=True, filter_features=False, max_samples=float('inf')):
-        '''Constructor'''
-        self.use_pickle = False # Turn this to true to save data as pickle (inefficient)
+    def __init__(self, basename="", input_dir="", verbose=False, replace_missing=True, filter_features=False, max_samples=float('inf'), use_cache=True, cache_dir=None, cache_max_size=DEFAULT_CACHE_MAX_SIZE):
+        '''Constructor
+        The data read from text files are cached in binary form in cache_dir
+        (by default tmp/ or ../tmp/ if they exist, or the temporary directory),
+        unless use_cache is False. See getCachePath. The least recently used
+        cached files are removed when their total size exceeds cache_max_size
+        (in bytes).'''
+        self.use_cache = use_cache
+        self.cache_max_size = cache_max_size
         self.basename = basename
         if basename in input_dir or os.path.isfile(os.path.join(input_dir, basename + '_train.data')) :
             self.input_dir = input_dir
         else:
             self.input_dir =  os.path.join (input_dir , basename )
-        if self.use_pickle:
-            if os.path.exists ("tmp"):
-                self.tmp_dir = "tmp"
-            elif os.path.exists ("../tmp"):
-                self.tmp_dir = "../tmp"
-            else:
-                os.makedirs("tmp")
-                self.tmp_dir = "tmp"
+        if self.use_cache:
+            if cache_dir is None:
+                if os.path.exists ("tmp"):
+                    cache_dir = os.path.join("tmp", "data_cache")
+                elif os.path.exists ("../tmp"):
+                    cache_dir = os.path.join("../tmp", "data_cache")
+                else:
+                    cache_dir = os.path.join(tempfile.gettempdir(), "autodl_data_cache")
+            try:
+                if not os.path.isdir(cache_dir):
+                    os.makedirs(cache_dir)
+                self.cache_dir = cache_dir
+            except OSError:
+                vprint (verbose, "Cannot create cache directory " + cache_dir + ", cache disabled")
+                self.use_cache = False
         info_file = os.path.join (self.input_dir, basename + '_public.info')
         self.info = {}
+        self.file_scans = {}
         self.getInfo (info_file)
         self.feat_type = self.loadType (os.path.join(self.input_dir, basename + '_feat.type'), verbose=verbose)
         self.data = {}
@@ -129,14 +170,16 @@ class DataManager:
         ''' Get the data from a text file in one of 3 formats: matrix, sparse, sparse_binary'''
         if verbose:  print("========= Reading " + filename)
         start = time.time()
-        if self.use_pickle and os.path.exists (os.path.join (self.tmp_dir, os.path.basename(filename) + ".pickle")):
-            with open (os.path.join (self.tmp_dir, os.path.basename(filename) + ".pickle"), "r") as pickle_file:
-                vprint (verbose, "Loading pickle file : " + os.path.join(self.tmp_dir, os.path.basename(filename) + ".pickle"))
-                return pickle.load(pickle_file)
         if 'format' not in self.info.keys():
             self.getFormatData(filename)
         if 'feat_num' not in self.info.keys():
             self.getNbrFeatures(filename)
+        # What the result depends on, besides the content of the file
+        variant = {'kind': 'data', 'format': self.info['format'], 'feat_num': self.info['feat_num'], 'replace_missing': replace_missing}
+        data = self.loadFromCache(filename, variant, verbose=verbose)
+        if data is not None:
+            if verbose:  print( "[+] Success in %5.2f sec" % (time.time() - start))
+            return data
 
         data_func = {'dense':data_io.data, 'sparse':data_io.data_sparse, 'sparse_binary':data_io.data_binary_sparse}
 
@@ -147,12 +190,7 @@ class DataManager:
         if self.info['format']=='dense' and replace_missing and np.any(map(np.isnan,data)):
             vprint (verbose, "Replace missing values by 0 (slow, sorry)")
             data = data_converter.replace_missing(data)
-        if self.use_pickle:
-            with open (os.path.join (self.tmp_dir, os.path.basename(filename) + ".pickle"), "wb") as pickle_file:
-                vprint (verbose, "Saving pickle file : " + os.path.join (self.tmp_dir, os.path.basename(filename) + ".pickle"))
-                p = pickle.Pickler(pickle_file)
-                p.fast = True
-                p.dump(data)
+        self.saveToCache(filename, variant, data, verbose=verbose)
         end = time.time()
         if verbose:  print( "[+] Success in %5.2f sec" % (end - start))
         return data
@@ -161,12 +199,13 @@ class DataManager:
         ''' Get the solution/truth values'''
         if verbose:  print("========= Reading " + filename)
         start = time.time()
-        if self.use_pickle and os.path.exists (os.path.join (self.tmp_dir, os.path.basename(filename) + ".pickle")):
-            with open (os.path.join (self.tmp_dir, os.path.basename(filename) + ".pickle"), "r") as pickle_file:
-                vprint (verbose, "Loading pickle file : " + os.path.join (self.tmp_dir, os.path.basename(filename) + ".pickle"))
-                return pickle.load(pickle_file)
         if 'task' not in self.info.keys():
             self.getTypeProblem(filename)
+        variant = {'kind': 'label', 'task': self.info['task']}
+        label = self.loadFromCache(filename, variant, verbose=verbose)
+        if label is not None:
+            if verbose:  print( "[+] Success in %5.2f sec" % (time.time() - start))
+            return label
 
            # IG: Here change to accommodate the new multiclass label format
         if self.info['task'] == 'multilabel.classification':
@@ -179,16 +218,103 @@ class DataManager:
             label = np.ravel(data_io.data(filename)) # get a column vector
             #label = np.array([np.ravel(data_io.data(filename))]).transpose() # get a column vector
 
-        if self.use_pickle:
-            with open (os.path.join (self.tmp_dir, os.path.basename(filename) + ".pickle"), "wb") as pickle_file:
-                vprint (verbose, "Saving pickle file : " + os.path.join (self.tmp_dir, os.path.basename(filename) + ".pickle"))
-                p = pickle.Pickler(pickle_file)
-                p.fast = True
-                p.dump(label)
+        self.saveToCache(filename, variant, label, verbose=verbose)
         end = time.time()
         if verbose:  print( "[+] Success in %5.2f sec" % (end - start))
         return label
 
+    def getContentHash (self, filename):
+        ''' Hash of the content of a file. It is computed once per (path, size,
+        mtime) of the file and then read from the index of the cache, so that
+        a cache hit does not need to read the file. Keys of files that changed
+        or no longer exist are removed from the index when it is updated'''
+        stat = os.stat(filename)
+        path = os.path.abspath(filename)
+        key = "{}|{}|{}".format(path, stat.st_size, stat.st_mtime)
+        index_path = os.path.join(self.cache_dir, CACHE_INDEX_FILENAME)
+        try:
+            with open(index_path, 'r') as index_file:
+                index = json.load(index_file)
+        except (IOError, ValueError):
+            index = {}
+        if key not in index:
+            for old_key in list(index.keys()):
+                old_path = old_key.rsplit('|', 2)[0]
+                if old_path == path or not os.path.exists(old_path):
+                    del index[old_key]
+            index[key] = file_sha1(filename)
+            write_atomic(index_path, lambda f: f.write(json.dumps(index, indent=0).encode('utf-8')))
+        return index[key]
+
+    def getCachePath (self, filename, variant):
+        ''' Path (without extension) of the cached binary version of a data or
+        label file. Entries are named after the hash of the content of the file
+        and of the variant (options the result depends on), so that they stay
+        valid when a file is copied and are not used when it changes'''
+        variant_hash = hashlib.sha1(json.dumps(variant, sort_keys=True).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, self.getContentHash(filename) + '_' + variant_hash[:12])
+
+    def loadFromCache (self, filename, variant, verbose=True):
+        ''' Load the cached version of a file, if any: dense arrays are memory-
+        mapped (copy-on-write) from .npy files, sparse matrices are loaded from
+        CSR .npz files. Returns None if not cached'''
+        if not self.use_cache:
+            return None
+        try:
+            path = self.getCachePath(filename, variant)
+            if os.path.isfile(path + '.npy'):
+                vprint (verbose, "Loading cached file : " + path + '.npy')
+                os.utime(path + '.npy', None) # Mark as recently used
+                return np.load(path + '.npy', mmap_mode='c')
+            if os.path.isfile(path + '.npz'):
+                vprint (verbose, "Loading cached file : " + path + '.npz')
+                os.utime(path + '.npz', None)
+                return scipy.sparse.load_npz(path + '.npz')
+        except (IOError, OSError, ValueError) as e:
+            vprint (verbose, "Cannot load cached version of " + filename + ": " + str(e))
+        return None
+
+    def saveToCache (self, filename, variant, data, verbose=True):
+        ''' Save data read from a file in the cache (see loadFromCache)'''
+        if not self.use_cache:
+            return
+        try:
+            path = self.getCachePath(filename, variant)
+            if scipy.sparse.issparse(data):
+                path += '.npz'
+                vprint (verbose, "Saving cached file : " + path)
+                write_atomic(path, lambda f: scipy.sparse.save_npz(f, data.tocsr(), compressed=False))
+            else:
+                path += '.npy'
+                vprint (verbose, "Saving cached file : " + path)
+                write_atomic(path, lambda f: np.save(f, np.asarray(data)))
+            self.evictCacheEntries(keep=path, verbose=verbose)
+        except (IOError, OSError) as e:
+            vprint (verbose, "Cannot save cached version of " + filename + ": " + str(e))
+
+    def evictCacheEntries (self, keep=None, verbose=True):
+        ''' Remove the least recently used (i.e. loaded or saved) cached files
+        until their total size is at most cache_max_size. The file keep is
+        never removed. Returns the list of removed files'''
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npy') or name.endswith('.npz'):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total_size = sum(size for _, size, _ in entries)
+        removed = []
+        for _, size, path in sorted(entries):
+            if total_size <= self.cache_max_size:
+                break
+            if keep is not None and os.path.abspath(path) == os.path.abspath(keep):
+                continue
+            vprint (verbose, "Removing cached file : " + path)
+            os.remove(path)
+            total_size -= size
+            removed.append(path)
+        return removed
+
     def loadType (self, filename, verbose=True):
         ''' Get the variable types'''
         if verbose:  print("========= Reading " + filename)
@@ -220,8 +346,7 @@ class DataManager:
             self.getFormatData(os.path.join(input_dir, basename + '_train.data'))
         else:
             vprint (verbose, "Info file NOT found : " + os.path.abspath(filename))
-            # Hopefully this never happens because this is done in a very inefficient way
-            # reading the data multiple times...
+            # Each data file and the solution file are read once (see getFileScan)
             self.info['usage'] = 'No Info File'
             self.info['name'] = basename
             # Get the data format and sparsity
@@ -273,18 +398,8 @@ class DataManager:
                 else:
                     self.info['format'] = 'sparse_binary'
         else:
-            data = data_converter.file_to_array (filename)
-            if ':' in data[0][0]:
-                self.info['is_sparse'] = 1
-                self.info['format'] = 'sparse'
-            else:
-                nbr_columns = len(data[0])
-                for row in range (len(data)):
-                    if len(data[row]) != nbr_columns:
-                        self.info['format'] = 'sparse_binary'
-                if 'format' not in self.info.keys():
-                    self.info['format'] = 'dense'
-                    self.info['is_sparse'] = 0
+            self.info['format'] = self.getFileScan(filename)['format']
+            self.info['is_sparse'] = int(self.info['format'] != 'dense')
         return self.info['format']
 
     def getNbrFeatures (self, *filenames):
@@ -292,39 +407,38 @@ class DataManager:
         if 'feat_num' not in self.info.keys():
             self.getFormatData(filenames[0])
             if self.info['format'] == 'dense':
-                data = data_converter.file_to_array(filenames[0])
-                self.info['feat_num'] = len(data[0])
-            elif self.info['format'] == 'sparse':
-                self.info['feat_num'] = 0
-                for filename in filenames:
-                    sparse_list = data_converter.sparse_file_to_sparse_list (filename)
-                    last_column = [sparse_list[i][-1] for i in range(len(sparse_list))]
-                    last_column_feature = [a for (a,b) in last_column]
-                    self.info['feat_num'] = max(self.info['feat_num'], max(last_column_feature))
-            elif self.info['format'] == 'sparse_binary':
-                self.info['feat_num'] = 0
-                for filename in filenames:
-                    data = data_converter.file_to_array (filename)
-                    last_column = [int(data[i][-1]) for i in range(len(data))]
-                    self.info['feat_num'] = max(self.info['feat_num'], max(last_column))
+                self.info['feat_num'] = self.getFileScan(filenames[0])['feat_num']
+            else:
+                # Largest feature index in every file
+                self.info['feat_num'] = max(self.getFileScan(filename)['feat_num'] for filename in filenames)
         return self.info['feat_num']
 
     def getNbrPatterns (self, basename, info_dir, datatype):
         ''' Get the number of patterns directly from the data file (in case we do not have an info file)'''
-        line_num = data_converter.num_lines(os.path.join(info_dir, basename + '_' + datatype + '.data'))
+        line_num = self.getFileScan(os.path.join(info_dir, basename + '_' + datatype + '.data'))['num_lines']
         self.info[datatype+'_num'] =  line_num
         return line_num
 
+    def getFileScan (self, filename, solution=False):
+        ''' Read a data file (or a solution file) once and keep its format, number of features
+        and number of lines (or its number of targets and distinct values), see
+        data_converter.scan_data_file and data_converter.scan_solution_file'''
+        if filename not in self.file_scans:
+            if solution:
+                self.file_scans[filename] = data_converter.scan_solution_file(filename)
+            else:
+                self.file_scans[filename] = data_converter.scan_data_file(filename)
+        return self.file_scans[filename]
+
     def getTypeProblem (self, solution_filename):
         ''' Get the type of problem directly from the solution file (in case we do not have an info file)'''
         if 'task' not in self.info.keys():
-            solution = np.array(data_converter.file_to_array(solution_filename))
-            target_num = solution.shape[1]
+            scan = self.getFileScan(solution_filename, solution=True)
+            target_num = scan['target_num']
             self.info['target_num']=target_num
             if target_num == 1: # if we have only one column
-                solution = np.ravel(solution) # flatten
-                nbr_unique_values = len(np.unique(solution))
-                if nbr_unique_values < len(solution)/8:
+                nbr_unique_values = len(scan['values'])
+                if nbr_unique_values < scan['num_lines']/8:
                     # Classification
                     self.info['label_num'] = nbr_unique_values
                     if nbr_unique_values == 2:
@@ -342,7 +456,7 @@ class DataManager:
                 # Multilabel or multiclass
                 self.info['label_num'] = target_num
                 self.info['target_type'] = 'Binary'
-                if any(item > 1 for item in map(np.sum,solution.astype(int))):
+                if scan['multilabel']:
                     self.info['task'] = 'multilabel.classification'
                 else:
                     self.info['task'] = 'multiclass.classification'
@@ -26,9 +26,12 @@ and has nothing to do with the dataset metadata.
 
 import tensorflow as tf
 import os
+import shutil
+import tempfile
 
 # Import the challenge algorithm (model) API from algorithm.py
 import algorithm
+from dataset import dataset_to_memmap
 
 # Utility packages
 import time
@@ -51,6 +54,8 @@ class Model(algorithm.Algorithm):
     self.X_train = None
     self.Y_train = None
     self.X_test = None
+    # Directory of the memory-mapped arrays of training and test sets
+    self.memmap_dir = tempfile.mkdtemp(prefix='memmap_' + self.dataset_name + '_')
 
     # Attributes for managing time budget
     # Cumulated number of training steps
@@ -89,30 +94,17 @@ class Model(algorithm.Algorithm):
       return
 
     # Transform data to numpy.ndarray if not done yet
-    if not self.X_train or not self.Y_train:
-      # Turn `features` in the tensor tuples (matrix_bundle_0,...,matrix_bundle_(N-1), labels)
-      # to a dict. This example model only uses the first matrix bundle
-      # (i.e. matrix_bundle_0) (see the documentation of this train() function above for the description of each example)
-      dataset = dataset.map(lambda *x: ({'x': x[0]}, x[-1]))
-      iterator = dataset.make_one_shot_iterator()
-      next_element = iterator.get_next()
-      counter = 0
-      X_train = []
-      Y_train = []
-      with tf.Session() as sess:
-        while True:
-          try:
-            features, labels = sess.run(next_element)
-            X_train.append(features.flatten())
-            Y_train.append(labels.flatten())
-            counter += 1
-            if counter % 1000 == 0:
-              print(counter)
-          except tf.errors.OutOfRangeError:
-            print("The End.", counter)
-            break
-      self.X_train = np.array(X_train)
-      self.Y_train = np.array(Y_train)
+    if self.X_train is None or self.Y_train is None:
+      # Export the dataset once to memory-mapped arrays. This example model
+      # only uses the first matrix bundle (i.e. matrix_bundle_0) (see the
+      # documentation of this train() function above for the description of
+      # each example)
+      arrays = dataset_to_memmap(dataset, self.metadata_,
+                                 os.path.join(self.memmap_dir, 'train'))
+      # Reshaping the memmaps is free (no copy of the data)
+      self.X_train = arrays[0].reshape(arrays[0].shape[0], -1)
+      self.Y_train = arrays[-1]
+      print("The End.", self.X_train.shape[0])
 
     if not remaining_time_budget: # This is never true in the competition anyway
       remaining_time_budget = 1200 # if no time limit is given, set to 20min
@@ -143,27 +135,15 @@ class Model(algorithm.Algorithm):
       return None
 
     # Transform data to numpy.ndarray if not done yet
-    if not self.X_test:
-      # Turn `features` in the tensor tuples (matrix_bundle_0,...,matrix_bundle_(N-1), labels)
-      # to a dict. This example model only uses the first matrix bundle
-      # (i.e. matrix_bundle_0) (see the documentation of this train() function above for the description of each example)
-      dataset = dataset.map(lambda *x: ({'x': x[0]}, x[-1]))
-      iterator = dataset.make_one_shot_iterator()
-      next_element = iterator.get_next()
-      counter = 0
-      X_test = []
-      with tf.Session() as sess:
-        while True:
-          try:
-            features, labels = sess.run(next_element)
-            X_test.append(features.flatten())
-            counter += 1
-            if counter % 1000 == 0:
-              print(counter)
-          except tf.errors.OutOfRangeError:
-            print("The End.", counter)
-            break
-      self.X_test = np.array(X_test)
+    if self.X_test is None:
+      # Export the dataset once to memory-mapped arrays. This example model
+      # only uses the first matrix bundle (i.e. matrix_bundle_0) (see the
+      # documentation of this train() function above for the description of
+      # each example)
+      arrays = dataset_to_memmap(dataset, self.metadata_,
+                                 os.path.join(self.memmap_dir, 'test'))
+      self.X_test = arrays[0].reshape(arrays[0].shape[0], -1)
+      print("The End.", self.X_test.shape[0])
 
     # The following snippet of code intends to do:
     # 0. Use the function self.choose_to_stop_early() to decide if stop the whole
@@ -201,6 +181,12 @@ class Model(algorithm.Algorithm):
           "Current estimated time for test: {:.2e} sec.".format(self.estimated_time_test))
     return predictions
 
+  def __del__(self):
+    # The memory-mapped arrays are reused by each call of `test`, so they are
+    # only removed with the model
+    self.X_train = self.Y_train = self.X_test = None
+    shutil.rmtree(self.memmap_dir, ignore_errors=True)
+
   ##############################################################################
   #### Above 3 methods (__init__, train, test) should always be implemented ####
   ##############################################################################
@@ -0,0 +1,241 @@
+'''Without a public.info file, DataManager.getInfo finds the same format, number
+of features, numbers of patterns and task as its previous implementation
+(copied below with the `previous_` prefix), which read the files several times
+instead of scanning each of them once with data_converter.scan_data_file and
+data_converter.scan_solution_file.
+
+The scans are checked against the results of the previous implementation
+without data_manager, whose data_io imports pandas. The whole info dictionary
+of DataManager.getInfo is checked when data_manager can be imported.
+
+Run
+```
+python -m pytest tests
+```
+in the baseline_methods/autosklearn directory.
+'''
+
+import importlib
+import os
+import sys
+import numpy as np
+import pytest
+
+def _HERE(*args):
+    h = os.path.dirname(os.path.realpath(__file__))
+    return os.path.join(h, *args)
+
+INGESTION_PROGRAM = _HERE(os.pardir, 'ingestion_program')
+
+def import_program_module(name):
+    ''' Import ingestion_program/<name>.py and the modules it imports from
+    ingestion_program. The starting kit has other data_converter and data_io
+    modules: those already imported are restored afterwards.'''
+    names = [name, 'data_converter', 'data_io']
+    saved_modules = {n: sys.modules.pop(n) for n in names if n in sys.modules}
+    sys.path.insert(0, INGESTION_PROGRAM)
+    try:
+        return importlib.import_module(name)
+    finally:
+        sys.path.remove(INGESTION_PROGRAM)
+        for n in names:
+            sys.modules.pop(n, None)
+        sys.modules.update(saved_modules)
+
+data_converter = import_program_module('data_converter')
+
+def previous_format(filename):
+    ''' getFormatData without info file'''
+    data = data_converter.file_to_array (filename)
+    if ':' in data[0][0]:
+        return 'sparse'
+    nbr_columns = len(data[0])
+    for row in range (len(data)):
+        if len(data[row]) != nbr_columns:
+            return 'sparse_binary'
+    return 'dense'
+
+def previous_feat_num(data_format, *filenames):
+    ''' getNbrFeatures without info file'''
+    if data_format == 'dense':
+        data = data_converter.file_to_array(filenames[0])
+        return len(data[0])
+    feat_num = 0
+    for filename in filenames:
+        data = data_converter.file_to_array (filename)
+        if data_format == 'sparse':
+            # The previous version called sparse_file_to_sparse_list, which
+            # data_converter does not define: the last index is parsed here
+            last_column = [int(data[i][-1].split(':')[0]) for i in range(len(data))]
+        else:
+            last_column = [int(data[i][-1]) for i in range(len(data))]
+        feat_num = max(feat_num, max(last_column))
+    return feat_num
+
+def previous_type_problem(solution_filename):
+    ''' getTypeProblem without info file'''
+    info = {}
+    solution = np.array(data_converter.file_to_array(solution_filename))
+    target_num = solution.shape[1]
+    info['target_num']=target_num
+    if target_num == 1: # if we have only one column
+        solution = np.ravel(solution) # flatten
+        nbr_unique_values = len(np.unique(solution))
+        if nbr_unique_values < len(solution)/8:
+            # Classification
+            info['label_num'] = nbr_unique_values
+            if nbr_unique_values == 2:
+                info['task'] = 'binary.classification'
+                info['target_type'] = 'Binary'
+            else:
+                info['task'] = 'multiclass.classification'
+                info['target_type'] = 'Categorical'
+        else:
+            # Regression
+            info['label_num'] = 0
+            info['task'] = 'regression'
+            info['target_type'] = 'Numerical'
+    else:
+        # Multilabel or multiclass
+        info['label_num'] = target_num
+        info['target_type'] = 'Binary'
+        if any(item > 1 for item in map(np.sum,solution.astype(int))):
+            info['task'] = 'multilabel.classification'
+        else:
+            info['task'] = 'multiclass.classification'
+    return info
+
+def previous_get_info(basename, input_dir):
+    ''' The 'No Info File' branch of getInfo'''
+    data_files = [os.path.join(input_dir, basename + '_' + datatype + '.data')
+                  for datatype in ['train', 'test', 'valid']]
+    info = {'usage': 'No Info File', 'name': basename}
+    info['format'] = previous_format(data_files[0])
+    if info['format'] != 'sparse_binary':
+        info['is_sparse'] = int(info['format'] == 'sparse')
+    info['has_categorical'] = 0
+    info['has_missing'] = 0
+    info.update(previous_type_problem(os.path.join(input_dir, basename + '_train.solution')))
+    if info['task']=='regression':
+        info['metric'] = 'r2_metric'
+    else:
+        info['metric'] = 'auc_metric'
+    info['feat_type'] = 'Mixed'
+    info['feat_num'] = previous_feat_num(info['format'], *data_files)
+    for datatype, filename in zip(['train', 'test', 'valid'], data_files):
+        info[datatype + '_num'] = data_converter.num_lines(filename)
+    info['time_budget'] = 600
+    return info
+
+def make_data_lines(data_format, num_lines, feat_num, random_state):
+    lines = []
+    for row in range(num_lines):
+        if data_format == 'dense':
+            lines.append(' '.join('{:g}'.format(v) for v in random_state.randn(feat_num)))
+            continue
+        # At least one nonzero feature per pattern, the number varying
+        num_nonzero = random_state.randint(1, 5) if row else 3
+        features = np.sort(random_state.choice(feat_num, num_nonzero, replace=False)) + 1
+        if data_format == 'sparse':
+            lines.append(' '.join('{}:{:g}'.format(i, random_state.randn()) for i in features))
+        else:
+            lines.append(' '.join(str(i) for i in features))
+    return lines
+
+def make_solution_lines(task, num_lines, random_state):
+    if task == 'binary':
+        rows = random_state.randint(2, size=(num_lines, 1))
+    elif task == 'multiclass':
+        rows = random_state.randint(3, size=(num_lines, 1))
+    elif task == 'regression':
+        return ['{:g}'.format(v) for v in random_state.randn(num_lines)]
+    elif task == 'onehot':
+        rows = np.eye(4, dtype=int)[random_state.randint(4, size=num_lines)]
+    else: # multilabel
+        rows = (random_state.rand(num_lines, 4) < 0.4).astype(int)
+        rows[0] = 1 # Sum larger than 1
+    return [' '.join(str(v) for v in row) for row in rows]
+
+def write_dataset(tmp_path, data_format, task, seed=0):
+    ''' Writes sample_{train,valid,test}.data and sample_train.solution, the
+    test data having the largest feature index for the sparse formats'''
+    random_state = np.random.RandomState(seed)
+    input_dir = str(tmp_path)
+    for datatype, num_lines, feat_num in [('train', 80, 20), ('valid', 15, 20), ('test', 25, 30)]:
+        if data_format == 'dense':
+            feat_num = 20
+        lines = make_data_lines(data_format, num_lines, feat_num, random_state)
+        with open(os.path.join(input_dir, 'sample_' + datatype + '.data'), 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+    with open(os.path.join(input_dir, 'sample_train.solution'), 'w') as f:
+        f.write('\n'.join(make_solution_lines(task, 80, random_state)) + '\n')
+    return 'sample', input_dir
+
+DATA_FORMATS = ['dense', 'sparse', 'sparse_binary']
+TASKS = ['binary', 'multiclass', 'regression', 'onehot', 'multilabel']
+
+@pytest.mark.parametrize('data_format', DATA_FORMATS)
+def test_scan_data_file(tmp_path, data_format):
+    # The format, number of features and numbers of patterns found by
+    # getInfo, from the scans of the data files only
+    basename, input_dir = write_dataset(tmp_path, data_format, 'binary')
+    expected = previous_get_info(basename, input_dir)
+    scans = {}
+    for datatype in ['train', 'test', 'valid']:
+        filename = os.path.join(input_dir, basename + '_' + datatype + '.data')
+        scans[datatype] = data_converter.scan_data_file(filename)
+        assert scans[datatype]['num_lines'] == expected[datatype + '_num']
+    assert scans['train']['format'] == expected['format'] == data_format
+    if data_format == 'dense':
+        feat_num = scans['train']['feat_num']
+    else:
+        feat_num = max(scan['feat_num'] for scan in scans.values())
+    assert feat_num == expected['feat_num']
+
+@pytest.mark.parametrize('task', TASKS)
+def test_scan_solution_file(tmp_path, task):
+    # The target number, label number and task found by getInfo, from the
+    # scan of the solution file only
+    basename, input_dir = write_dataset(tmp_path, 'dense', task)
+    expected = previous_get_info(basename, input_dir)
+    filename = os.path.join(input_dir, basename + '_train.solution')
+    scan = data_converter.scan_solution_file(filename)
+    assert scan['num_lines'] == 80
+    assert scan['target_num'] == expected['target_num']
+    if scan['target_num'] == 1:
+        assert scan['values'] == set(np.ravel(data_converter.file_to_array(filename)))
+        nbr_unique_values = len(scan['values'])
+        if nbr_unique_values < scan['num_lines']/8:
+            assert expected['label_num'] == nbr_unique_values
+            assert expected['task'] == ('binary.classification' if nbr_unique_values == 2
+                                        else 'multiclass.classification')
+        else:
+            assert expected['task'] == 'regression'
+    else:
+        assert expected['label_num'] == scan['target_num']
+        assert expected['task'] == ('multilabel.classification' if scan['multilabel']
+                                    else 'multiclass.classification')
+
+@pytest.mark.parametrize('task', TASKS)
+@pytest.mark.parametrize('data_format', DATA_FORMATS)
+def test_get_info_equals_previous(tmp_path, data_format, task):
+    # The whole info dictionary, when DataManager can be imported
+    # data_io, imported by data_manager, needs pandas, yaml, psutil and pip < 21
+    try:
+        data_manager = import_program_module('data_manager')
+    except ImportError as error:
+        pytest.skip('could not import data_manager: {}'.format(error))
+    basename, input_dir = write_dataset(tmp_path, data_format, task)
+    manager = object.__new__(data_manager.DataManager) # No data loading
+    manager.basename = basename
+    manager.input_dir = input_dir
+    manager.use_cache = False
+    manager.info = {}
+    manager.file_scans = {}
+    info = manager.getInfo(os.path.join(input_dir, basename + '_public.info'), verbose=False)
+    expected = previous_get_info(basename, input_dir)
+    # The previous version did not set is_sparse for the sparse_binary format
+    assert info.pop('is_sparse') == int(data_format != 'dense')
+    expected.pop('is_sparse', None)
+    assert info == expected
+    assert len(manager.file_scans) == 4 # Each file read once
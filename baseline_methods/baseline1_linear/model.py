@@ -73,6 +73,7 @@ class Model(algorithm.Algorithm):
     # Attributes for preprocessing
     self.default_image_size = (112,112)
     self.default_num_frames = 10
+    self.decode_images_at_size(self.default_image_size)
     self.default_shuffle_buffer = 100
 
     # Attributes for managing time budget
@@ -236,17 +237,22 @@ class Model(algorithm.Algorithm):
     """
     input_layer = features
 
-    # Replace missing values by 0
-    hidden_layer = tf.where(tf.is_nan(input_layer),
-                           tf.zeros_like(input_layer), input_layer)
+    if isinstance(input_layer, tf.SparseTensor):
+      # Sparse examples (see `keep_sparse` in AutoDLDataset): same model,
+      # computed without ever densifying the examples
+      logits = self.sparse_linear_logits(input_layer)
+    else:
+      # Replace missing values by 0
+      hidden_layer = tf.where(tf.is_nan(input_layer),
+                             tf.zeros_like(input_layer), input_layer)
 
-    # Sum over time axis
-    hidden_layer = tf.reduce_sum(hidden_layer, axis=1)
+      # Sum over time axis
+      hidden_layer = tf.reduce_sum(hidden_layer, axis=1)
 
-    # Flatten
-    hidden_layer = tf.layers.flatten(hidden_layer)
+      # Flatten
+      hidden_layer = tf.layers.flatten(hidden_layer)
 
-    logits = tf.layers.dense(inputs=hidden_layer, units=self.output_dim)
+      logits = tf.layers.dense(inputs=hidden_layer, units=self.output_dim)
     sigmoid_tensor = tf.nn.sigmoid(logits, name="sigmoid_tensor")
 
     predictions = {
@@ -281,6 +287,34 @@ class Model(algorithm.Algorithm):
     return tf.estimator.EstimatorSpec(
         mode=mode, loss=loss, eval_metric_ops=eval_metric_ops)
 
+  def sparse_linear_logits(self, sparse_input):
+    """Linear model of `model_fn` for a batch of sparse examples.
+
+    Args:
+      sparse_input: a tf.SparseTensor of dense shape
+          [batch_size, sequence_size, row_count, col_count, 1]
+    Returns:
+      logits: a Tensor of shape [batch_size, output_dim]
+    """
+    row_count, col_count = self.metadata_.get_matrix_size(0)
+    num_entries = row_count * col_count
+    # Replace missing values by 0
+    values = sparse_input.values
+    values = tf.where(tf.is_nan(values), tf.zeros_like(values), values)
+    hidden_layer = tf.SparseTensor(sparse_input.indices, values,
+                                   sparse_input.dense_shape)
+    # Sum over time axis
+    hidden_layer = tf.sparse_reduce_sum_sparse(hidden_layer, axis=1)
+    # Flatten
+    hidden_layer = tf.sparse_reshape(hidden_layer, [-1, num_entries])
+    # Same variables as tf.layers.dense in the dense case
+    with tf.variable_scope('dense'):
+      kernel = tf.get_variable('kernel', shape=[num_entries, self.output_dim],
+                               initializer=tf.glorot_uniform_initializer())
+      bias = tf.get_variable('bias', shape=[self.output_dim],
+                             initializer=tf.zeros_initializer())
+    return tf.sparse_tensor_dense_matmul(hidden_layer, kernel) + bias
+
   def input_function(self, dataset, is_training):
     """Given `dataset` received by the method `self.train` or `self.test`,
     prepare input to feed to model function.
@@ -288,7 +322,10 @@ class Model(algorithm.Algorithm):
     For more information on how to write an input function, see:
       https://www.tensorflow.org/guide/custom_estimators#write_an_input_function
     """
-    dataset = dataset.map(lambda *x: (self.preprocess_tensor_4d(x[0]), x[1]))
+    # Sparse examples always have fixed shape: no preprocessing needed
+    if dataset.output_classes[0] is not tf.SparseTensor:
+      dataset = dataset.map(
+          lambda *x: (self.preprocess_tensor_4d(x[0]), x[1]))
 
     if is_training:
       # Shuffle input examples
@@ -73,6 +73,7 @@ class Model(algorithm.Algorithm):
     # Attributes for preprocessing
     self.default_image_size = (112,112)
     self.default_num_frames = 10
+    self.decode_images_at_size(self.default_image_size)
     self.default_shuffle_buffer = 100
 
     # Attributes for managing time budget
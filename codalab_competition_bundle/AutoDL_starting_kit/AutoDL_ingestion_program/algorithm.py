@@ -22,6 +22,28 @@ class Algorithm(object):
 
   def __init__(self, metadata):
     self.metadata_ = metadata # An AutoDLMetadata object
+    # Optional: (row_count, col_count) to which images of COMPRESSED bundles
+    # are resized while being decoded, and
+    # (offset_row, offset_col, row_count, col_count) of the part of them that
+    # is decoded. Set them in `__init__` to avoid decoding images at full size
+    # (see AutoDLDataset in dataset.py).
+    self.decode_image_size = None
+    self.decode_crop_box = None
+
+  def decode_images_at_size(self, image_size):
+    """Have images of variable size resized to `image_size` while decoded.
+
+    For COMPRESSED bundles whose matrix size is not fixed, sets
+    `decode_image_size` to the known dimensions of the images and to
+    `image_size` (row_count, col_count) for the others, so that the ingestion
+    program resizes images while decoding them (cheaper than decoding them at
+    full size and resizing them in the model). Does nothing otherwise.
+    """
+    row_count, col_count = self.metadata_.get_matrix_size(0)
+    if (row_count > 0 and col_count > 0) or not self.metadata_.is_compressed(0):
+      return
+    self.decode_image_size = (row_count if row_count > 0 else image_size[0],
+                              col_count if col_count > 0 else image_size[1])
 
   def train(self, dataset, remaining_time_budget=None):
     """Train this algorithm on the tensorflow |dataset|.
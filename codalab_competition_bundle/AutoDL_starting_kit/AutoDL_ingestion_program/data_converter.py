@@ -14,8 +14,11 @@
 
 import numpy as np
 from scipy.sparse import *
-from sklearn.datasets import load_svmlight_file
-import os 
+from itertools import islice
+
+# Number of lines of sparse data files parsed at once by file_to_libsvm
+LIBSVM_CHUNK_LINES = 10000
+
 # Note: to check for nan values np.any(map(np.isnan,X_train))
 def file_to_array (filename, verbose=False):
     ''' Converts a file to a list of list of STRING
@@ -28,29 +31,55 @@ def file_to_array (filename, verbose=False):
         data = [lines[i].strip().split() for i in range (len(lines))]
     return data
 
-def file_to_libsvm (filename, data_binary  , n_features):
-    ''' Converts a file to svmlib format and return csr matrix 
+def parse_numbers (text):
+    ''' Numbers of a string separated by whitespace, as a float array.
+    Raises ValueError if one of them is not a number.'''
+    return np.array(text.split(), dtype=float)
+
+def file_to_libsvm (filename, data_binary  , n_features, chunk_lines=LIBSVM_CHUNK_LINES):
+    ''' Reads a sparse data file and returns a csr matrix
     filname = path of file 
     data_binary = True if is sparse binary data False else 
     n_features = number of features
+    Each line holds the (1-based) indices of the nonzero features of a pattern, as index:value pairs
+    (sparse data) or alone (sparse binary data, whose values are 1). The file is read by chunks of
+    chunk_lines lines, each parsed at once with numpy, and the indptr, indices and data arrays of the
+    csr matrix are built directly (no temporary file).
     '''
-    data =[]
-    with open(filename, "r") as data_file:
-        lines = data_file.readlines()
-        with open('tmp.txt', 'w') as f:
-            for l in lines  :
-                tmp = l.strip().split()
-                f.write("0 ")
-                for i in range (len(tmp) ):
-                    if(data_binary):
-                        f.write(tmp[i]+":1 ")
-                    else:
-                        f.write(tmp[i]+" ")
-                f.write("\n")
     print ("-------------------- file_to_libsvm  ---------------------")
-    l = load_svmlight_file('tmp.txt', zero_based= False ,  n_features = n_features )
-    os.remove("tmp.txt")
-    return l[0]
+    indptr = [np.zeros(1, dtype=np.int64)]
+    indices = []
+    data = []
+    nnz = 0
+    with open(filename, "r") as data_file:
+        while True:
+            lines = list(islice(data_file, chunk_lines))
+            if not lines:
+                break
+            if data_binary:
+                counts = np.array([len(line.split()) for line in lines], dtype=np.int64)
+                chunk_indices = parse_numbers(''.join(lines))
+                chunk_data = np.ones(len(chunk_indices))
+            else:
+                counts = np.array([line.count(':') for line in lines], dtype=np.int64)
+                pairs = parse_numbers(''.join(lines).replace(':', ' '))
+                chunk_indices = pairs[0::2]
+                chunk_data = pairs[1::2]
+            # A missing or extra ':' gives a different number of indices or values
+            if len(chunk_indices) != counts.sum() or len(chunk_data) != counts.sum():
+                raise ValueError("Malformed sparse data in {}".format(filename))
+            if np.any(chunk_indices != np.floor(chunk_indices)):
+                raise ValueError("Feature indices of {} should be integers".format(filename))
+            indptr.append(nnz + np.cumsum(counts))
+            nnz += counts.sum()
+            indices.append(chunk_indices.astype(np.int64) - 1)
+            data.append(chunk_data)
+    indptr = np.concatenate(indptr)
+    indices = np.concatenate([np.zeros(0, dtype=np.int64)] + indices)
+    data = np.concatenate([np.zeros(0)] + data)
+    if len(indices) and (indices.min() < 0 or indices.max() >= n_features):
+        raise ValueError("Feature indices of {} should be between 1 and n_features={}".format(filename, n_features))
+    return csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, n_features))
 
 def read_first_line (filename):
 	''' Read fist line of file'''
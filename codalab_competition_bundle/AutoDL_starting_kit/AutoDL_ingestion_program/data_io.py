@@ -22,9 +22,12 @@ except ImportError:
     pass
 
 import numpy as np
-import pandas as pd
 import os
 import shutil
+import json
+import threading
+import time
+import queue
 from scipy.sparse import * # used in data_binary_sparse 
 from zipfile import ZipFile, ZIP_DEFLATED
 from contextlib import closing
@@ -34,23 +37,18 @@ from sys import version
 from glob import glob as ls
 from os import getcwd as pwd
 from os.path import isfile
-
-# get_installed_distributions has gone from pip v10
-try:
-    from pip._internal.utils.misc import get_installed_distributions as lib
-except ImportError:  # pip < 10
-    from pip import get_installed_distributions as lib
-
-import yaml
+# pandas, yaml, psutil and pip are slow to import and only used by a few
+# functions, which import them on first use (this module is imported by the
+# ingestion program before the first prediction).
 from shutil import copy2
 import csv
-import psutil
 import platform
 
 # ================ Small auxiliary functions =================
 
 def read_as_df(basename, type="train"):
     ''' Function to read the AutoML format and return a Panda Data Frame '''
+    import pandas as pd
     csvfile = basename + '_' + type + '.csv'
     if isfile(csvfile):
         print('Reading '+ basename + '_' + type + ' from CSV')
@@ -134,6 +132,166 @@ def write(filename, predictions):
                 output_file.write('{0:g} '.format(float(val)))
             output_file.write('\n')
 
+def write_npy(filename, predictions):
+    ''' Write prediction scores in the NumPy .npy binary format (float32),
+    which is much faster to write and read than the text format of `write`.
+    The scoring program detects this format and memory-maps the file.'''
+    with open(filename, "wb") as output_file:
+        np.save(output_file, np.asarray(predictions, dtype=np.float32))
+
+def write_atomic(filename, predictions, timestamp=None, binary=False):
+    ''' Write prediction scores like `write` (or `write_npy` if binary), but to
+    a temporary (hidden) file renamed to filename at the end, so that readers
+    never see a partial file. If timestamp is given, it is set as modification
+    time of the file (the scoring program uses it as the time at which
+    predictions were made).'''
+    dirname, name = os.path.split(filename)
+    tmp_filename = os.path.join(dirname, '.' + name + '.tmp')
+    if binary:
+        write_npy(tmp_filename, predictions)
+    else:
+        write(tmp_filename, predictions)
+    if timestamp is not None:
+        os.utime(tmp_filename, (timestamp, timestamp))
+    os.rename(tmp_filename, filename)
+
+# Name of the manifest of predictions, in the output directory of the
+# ingestion program
+MANIFEST_FILENAME = 'manifest.jsonl'
+
+def monotonic_time():
+    ''' Monotonic clock (wall clock on Python 2)'''
+    return time.monotonic() if hasattr(time, 'monotonic') else time.time()
+
+def append_to_manifest(output_dir, event, **fields):
+    ''' Append one JSON line describing an event ('start', 'prediction' or
+    'end') to the manifest of output_dir, which the scoring program follows
+    instead of scanning the directory. Each line is written with a single
+    write to a file opened in append mode.'''
+    entry = {'event': event, 'wall': time.time(),
+             'monotonic': monotonic_time()}
+    entry.update(fields)
+    with open(os.path.join(output_dir, MANIFEST_FILENAME), 'a') as f:
+        f.write(json.dumps(entry, sort_keys=True) + '\n')
+
+class ScoringClient(object):
+    ''' Client of the local scoring service (scoring_service.py in the
+    scoring program), which scores predictions sent as raw float32 values
+    over localhost HTTP.'''
+
+    def __init__(self, url, timeout=60):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def start(self, timestamp=None):
+        ''' Start a new learning curve, at timestamp (default: now).'''
+        return self._request('/start', {'timestamp': timestamp or time.time()},
+                             data=b'')
+
+    def score(self, name, predictions, timestamp=None):
+        ''' Send predictions and return their scores, as a dict with keys
+        'bac', 'accuracy', 'alc' and 'num_predictions'.'''
+        data = np.ascontiguousarray(predictions, dtype=np.float32).tobytes()
+        return self._request('/predict',
+                             {'name': name,
+                              'timestamp': timestamp or time.time()}, data)
+
+    def scores(self):
+        ''' Return the current ALC and the points of the learning curve.'''
+        return self._request('/scores')
+
+    def shutdown(self):
+        return self._request('/shutdown', data=b'')
+
+    def _request(self, path, params=None, data=None):
+        ''' GET request if data is None, POST request otherwise.'''
+        from urllib.request import Request, urlopen
+        from urllib.parse import urlencode
+        url = self.url + path
+        if params:
+            url += '?' + urlencode(params)
+        request = Request(url, data=data,
+                          headers={'Content-Type': 'application/octet-stream'})
+        response = urlopen(request, timeout=self.timeout)
+        try:
+            return json.loads(response.read().decode('utf-8'))
+        finally:
+            response.close()
+
+class PredictionWriter(object):
+    ''' Write predictions in a background thread (see `write_atomic`), so that
+    the caller (e.g. the ingestion program) does not wait for them to be
+    formatted and written. Files are written in the order they are given.
+    Once written, each file is announced in the manifest of its directory
+    (see `append_to_manifest`). If a ScoringClient is given, the predictions
+    are first sent to the local scoring service from memory, so that scoring
+    does not wait for the file to be written.'''
+
+    def __init__(self, max_pending=4, binary=False, scoring_client=None):
+        ''' max_pending: number of predictions waiting to be written above
+        which `write` blocks (bounds the memory used).
+        binary: if True, write predictions with `write_npy` instead of as
+        text.
+        scoring_client: optional ScoringClient. Errors of the service are
+        reported but do not stop the writer.'''
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.binary = binary
+        self.scoring_client = scoring_client
+        self.error = None
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, filename, predictions):
+        ''' Schedule writing predictions to filename and return immediately.
+        The modification time of the file will be the time of this call.'''
+        if self.error is not None:
+            raise self.error
+        # Copy, in case the caller reuses its array for the next predictions
+        self.queue.put((filename, np.array(predictions), time.time(),
+                        monotonic_time()))
+
+    def close(self):
+        ''' Wait until all scheduled predictions are written, then stop the
+        thread. Raises the first error that happened while writing.'''
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            filename, predictions, timestamp, monotonic = item
+            if self.scoring_client is not None:
+                self._send_to_service(filename, predictions, timestamp)
+            try:
+                write_atomic(filename, predictions, timestamp=timestamp,
+                             binary=self.binary)
+                dirname, name = os.path.split(filename)
+                append_to_manifest(dirname, 'prediction', file=name,
+                                   wall=timestamp, monotonic=monotonic,
+                                   shape=list(predictions.shape))
+            except Exception as e:
+                swrite("Error while writing {}: {}\n".format(filename, e))
+                if self.error is None:
+                    self.error = e
+
+    def _send_to_service(self, filename, predictions, timestamp):
+        name = os.path.basename(filename)
+        try:
+            result = self.scoring_client.score(name, predictions, timestamp)
+        except Exception as e:
+            swrite("Error while sending {} to the scoring service: {}\n"
+                   .format(name, e))
+            return
+        message = "Scoring service: {} BAC={:.4f}".format(name, result['bac'])
+        if result.get('accuracy') is not None:
+            message += " accuracy={:.4f}".format(result['accuracy'])
+        print(message + " ALC={:.4f}".format(result['alc']))
+
 def zipdir(archivename, basedir):
     '''Zip directory, from J.F. Sebastian http://stackoverflow.com/'''
     assert os.path.isdir(basedir)
@@ -241,6 +399,7 @@ def show_dir(run_dir):
     write_list(ls(run_dir + '/*/*/*/*'))
       
 def show_io(input_dir, output_dir):     
+    import yaml
     swrite('\n=== DIRECTORIES ===\n\n')
     # Show this directory
     swrite("-- Current directory " + pwd() + ":\n")
@@ -288,6 +447,11 @@ def show_version():
     swrite("Python version: " + version + "\n\n")
     # Give information on the version installed
     swrite("Versions of libraries installed:\n")
+    # get_installed_distributions has gone from pip v10
+    try:
+        from pip._internal.utils.misc import get_installed_distributions as lib
+    except ImportError:  # pip < 10
+        from pip import get_installed_distributions as lib
     map(swrite, sorted(["%s==%s\n" % (i.key, i.version) for i in lib()]))
  
  # Compute the total memory size of an object in bytes
@@ -335,6 +499,7 @@ def total_size(o, handlers={}, verbose=False):
     # write the results in a csv file
 def platform_score ( basename , mem_used ,n_estimators , time_spent , time_budget ):
 # write the results and platform information in a csv file (performance.csv)
+    import psutil
     with open('performance.csv', 'a') as fp:
         a = csv.writer(fp, delimiter=',')
         #['Data name','Nb estimators','System', 'Machine' , 'Platform' ,'memory used (Mb)' , 'number of CPU' ,' time spent (sec)' , 'time budget (sec)'],
@@ -17,82 +17,29 @@
 Reads data in the Tensorflow AutoDL standard format.
 """
 import os
+import json
+import multiprocessing
+import shutil
+import tempfile
 import tensorflow as tf
 import numpy as np
-import matplotlib.pyplot as plt
 from tensorflow import app
 from tensorflow import flags
 from tensorflow import gfile
 from tensorflow import logging
-from google.protobuf import text_format
 import dataset_utils
-from data_pb2 import DataSpecification
-from data_pb2 import MatrixSpec
+import tfrecord_index
+from dataset_metadata import AutoDLMetadata
+from dataset_metadata import dataset_file_pattern
+from dataset_metadata import metadata_filename
 
 
-def metadata_filename(dataset_name):
-  return os.path.join("", dataset_name, "metadata.textproto")
+# Name of the file describing the arrays written by `dataset_to_memmap`
+MEMMAP_SHAPES_FILENAME = "shapes.json"
 
 
-def dataset_file_pattern(dataset_name):
-  return os.path.join("", dataset_name, "sample*")
-
-
-class AutoDLMetadata(object):
-  """AutoDL data specification."""
-
-  def __init__(self, dataset_name):
-    self.dataset_name_ = dataset_name
-    self.metadata_ = DataSpecification()
-    with gfile.GFile(metadata_filename(dataset_name), "r") as f:
-      text_format.Merge(f.read(), self.metadata_)
-
-  def get_dataset_name(self):
-    return self.dataset_name_
-
-  def is_compressed(self, bundle_index):
-    return self.metadata_.matrix_spec[
-        bundle_index].format == MatrixSpec.COMPRESSED
-
-  def is_sparse(self, bundle_index):
-    return self.metadata_.matrix_spec[bundle_index].format == MatrixSpec.SPARSE
-
-  def get_bundle_size(self):
-    return len(self.metadata_.matrix_spec)
-
-  def get_matrix_size(self, bundle_index):
-    return (self.metadata_.matrix_spec[bundle_index].row_count,
-            self.metadata_.matrix_spec[bundle_index].col_count)
-
-  def get_num_channels(self, bundle_index):
-    num_channels = self.metadata_.matrix_spec[bundle_index].num_channels
-    if num_channels == -1: # Unknown or undefined num_channels
-      if self.is_compressed(bundle_index): # If is compressed image, set to 3
-        return 3
-      else:
-        return 1
-    else:
-      return num_channels
-
-  def get_tensor_size(self, bundle_index):
-    matrix_size = self.get_matrix_size(bundle_index)
-    num_channels = self.get_num_channels(bundle_index)
-    return matrix_size[0], matrix_size[1], num_channels
-
-  def get_sequence_size(self):
-    return self.metadata_.sequence_size
-
-  def get_output_size(self):
-    return self.metadata_.output_dim
-
-  def size(self):
-    return self.metadata_.sample_count
-
-  def get_label_to_index_map(self):
-    return self.metadata_.label_to_index_map
-
-  def get_feature_to_index_map(self):
-    return self.metadata_.feature_to_index_map
+# Maximum size (in bytes) of the cache of decoded examples, see `AutoDLDataset`
+DEFAULT_CACHE_MAX_SIZE = 20 * 1024**3
 
 
 class AutoDLDataset(object):
@@ -102,41 +49,238 @@ class AutoDLDataset(object):
      on the features and labels.
   """
 
-  def __init__(self, dataset_name):
+  def __init__(self, dataset_name, num_parallel_reads=None,
+               interleave_shards=False, num_parallel_calls=None,
+               prefetch_buffer_size=None, cache_dir=None,
+               cache_max_size=DEFAULT_CACHE_MAX_SIZE, parse_batch_size=None,
+               keep_sparse=False, image_size=None, crop_box=None):
     """Construct an AutoDL Dataset.
 
     Args:
       dataset_name: name of the dataset under the 'dataset_dir' flag.
+      num_parallel_reads: number of `sample*` shards read concurrently. If
+          None, use one reader per shard, up to the number of CPUs. Use 1 to
+          read the shards one after the other.
+      interleave_shards: if True, records of the shards being read are
+          interleaved, which changes the order of the examples (fine for a
+          training set). If False, the next shards are only read ahead and
+          examples come out in the same order as with a sequential read, which
+          is what a test set needs.
+      num_parallel_calls: number of records parsed (and decoded) in parallel.
+          If None, let tf.data autotune it. Use 1 to parse one record at a
+          time.
+      prefetch_buffer_size: number of parsed examples prefetched at the end of
+          the pipeline. If None, let tf.data autotune it. Use 0 to disable
+          prefetching.
+      cache_dir: if not None, directory of a persistent cache of decoded
+          examples. If the entry of this dataset (keyed by the content of the
+          shards, the metadata, the parse options and the interleaving of the
+          shards) is not complete yet, it is written here in one dedicated
+          full pass (see `_fill_cache`). Every iterator, in this run or in a
+          later one, then reads the decoded examples from there instead of
+          parsing the TFRecords again, and may stop at any point.
+      cache_max_size: maximum size in bytes of `cache_dir`. Least recently
+          used entries are evicted when building a dataset. If None, the cache
+          is unbounded.
+      parse_batch_size: if not None, records are grouped by batches of this
+          size and each batch is parsed in one call (see
+          `_parse_batch_function`), which is faster for small examples.
+          `get_dataset()` still gives the same examples as the per-record
+          parsing (unbatched) and `get_batched_dataset()` gives the batches.
+          Only used if the shape of the examples is fully known (fixed
+          sequence size and matrix size, or image size for COMPRESSED
+          bundles): otherwise records are parsed one at a time, as if
+          `parse_batch_size` were None.
+      keep_sparse: if True, bundles in the SPARSE format are given as
+          tf.SparseTensor of dense shape
+            [sequence_size, row_count, col_count, 1]
+          instead of being converted to dense tensors. Batching the dataset
+          (with `batch`, not `padded_batch`) keeps them sparse. Only models
+          handling tf.SparseTensor examples can use this mode.
+      image_size: if not None, (row_count, col_count) to which images of
+          COMPRESSED bundles are resized while being decoded (JPEG images are
+          decoded with DCT downscaling, see `dataset_utils.decompress_image`).
+          Models resizing images anyway should push their target size here.
+      crop_box: if not None, (offset_row, offset_col, row_count, col_count)
+          of the part of the images of COMPRESSED bundles that is decoded. If
+          `image_size` is also given, the box is resized to `image_size`.
     """
+    if keep_sparse and parse_batch_size:
+      raise ValueError("keep_sparse cannot be used with parse_batch_size.")
     self.dataset_name_ = dataset_name
     self.metadata_ = AutoDLMetadata(dataset_name)
+    self.num_parallel_reads_ = num_parallel_reads
+    self.interleave_shards_ = interleave_shards
+    if num_parallel_calls is None:
+      num_parallel_calls = tf.data.experimental.AUTOTUNE
+    self.num_parallel_calls_ = num_parallel_calls
+    if prefetch_buffer_size is None:
+      prefetch_buffer_size = tf.data.experimental.AUTOTUNE
+    self.prefetch_buffer_size_ = prefetch_buffer_size
+    self.keep_sparse_ = keep_sparse
+    self.image_size_ = tuple(image_size) if image_size else None
+    self.crop_box_ = tuple(crop_box) if crop_box else None
+    if parse_batch_size and not self._has_static_example_shape():
+      logging.info("Examples of %s have a variable shape, parsing them one "
+                   "at a time.", dataset_name)
+      parse_batch_size = None
+    self.parse_batch_size_ = parse_batch_size
+    self.index_ = None
+    self.cache_dir_ = cache_dir
+    self.nth_session_ = None
     self._create_dataset()
-    self.dataset_ = self.dataset_.map(self._parse_function)
+    self.dataset_ = self._parse_records(self.dataset_)
+    self.cache_path_ = None
+    if cache_dir:
+      self.cache_path_ = self._get_cache_path(cache_dir, cache_max_size)
+      if self._fill_cache():
+        self.dataset_ = self.dataset_.cache(self.cache_path_)
+      else:
+        self.cache_path_ = None
+    self.batched_dataset_ = None
+    if parse_batch_size:
+      self.batched_dataset_ = self.dataset_
+      self.dataset_ = self.dataset_.apply(tf.data.experimental.unbatch())
+      if prefetch_buffer_size != 0:
+        self.batched_dataset_ = self.batched_dataset_.prefetch(
+            prefetch_buffer_size)
+    if prefetch_buffer_size != 0:
+      self.dataset_ = self.dataset_.prefetch(prefetch_buffer_size)
 
   def get_dataset(self):
     """Returns a tf.data.dataset object."""
     return self.dataset_
 
+  def get_batched_dataset(self):
+    """Returns the tf.data.dataset of batches parsed in one call, or None if
+    `parse_batch_size` was not given."""
+    return self.batched_dataset_
+
   def get_metadata(self):
     """Returns an AutoDLMetadata object."""
     return self.metadata_
 
+  def is_cached(self):
+    """Returns True if decoded examples are served from a complete cache."""
+    return (self.cache_path_ is not None and
+            gfile.Exists(self.cache_path_ + ".index"))
+
+  def _parse_options(self):
+    """Returns a dict of the options changing the output of parsing."""
+    # Order of the examples is part of the decoded dataset
+    return {'interleave_shards': self.interleave_shards_,
+            'interleave_cycle_length': self.interleave_cycle_length_,
+            'parse_batch_size': self.parse_batch_size_,
+            'keep_sparse': self.keep_sparse_,
+            'image_size': self.image_size_,
+            'crop_box': self.crop_box_}
+
+  def _get_cache_path(self, cache_dir, cache_max_size):
+    """Returns the file prefix of the cache entry of this dataset."""
+    if not os.path.isdir(cache_dir):
+      os.makedirs(cache_dir)
+    key = dataset_utils.get_cache_key(self.files_,
+                                      metadata_filename(self.dataset_name_),
+                                      self._parse_options(), cache_dir)
+    entry_dir = dataset_utils.touch_cache_entry(cache_dir, key)
+    evicted = dataset_utils.evict_cache_entries(cache_dir, cache_max_size,
+                                                keep=key)
+    if evicted:
+      logging.info("Evicted %d entries from cache %s.", len(evicted),
+                   cache_dir)
+    return os.path.join(entry_dir, "examples")
+
+  def _fill_cache(self):
+    """Writes the cache entry of this dataset if it is not complete yet.
+
+    tf.data only completes a file cache when an iterator reaches the end of
+    the data. An iterator stopped before (as the models' train() and test()
+    do) leaves a partial entry and its lockfile, on which the next iterator
+    fails. So the entry is written here in one full pass, in a separate graph
+    and a temporary directory, and its files are moved into place once
+    complete, the ".index" file (see `is_cached`) last.
+
+    Returns:
+      True if the entry is complete, False if it could not be written (the
+      dataset is then not cached).
+    """
+    if self.is_cached():
+      return True
+    entry_dir, prefix = os.path.split(self.cache_path_)
+    # Inside the entry, so that it is never evicted while being written
+    tmp_dir = tempfile.mkdtemp(prefix="tmp-", dir=entry_dir)
+    try:
+      with tf.Graph().as_default():
+        dataset = self._parse_records(self._read_records())
+        dataset = dataset.cache(os.path.join(tmp_dir, prefix))
+        next_element = dataset.make_one_shot_iterator().get_next()
+        with tf.Session() as sess:
+          try:
+            while True:
+              sess.run(next_element)
+          except tf.errors.OutOfRangeError:
+            pass
+      filenames = sorted(os.listdir(tmp_dir),
+                         key=lambda filename: filename.endswith(".index"))
+      for filename in filenames:
+        os.rename(os.path.join(tmp_dir, filename),
+                  os.path.join(entry_dir, filename))
+      logging.info("Decoded examples of %s written to cache %s.",
+                   self.dataset_name_, self.cache_path_)
+      return True
+    except (tf.errors.OpError, OSError) as e:
+      logging.warning("Cannot write cache %s, examples are not cached: %s",
+                      self.cache_path_, e)
+      return False
+    finally:
+      shutil.rmtree(tmp_dir, ignore_errors=True)
+
+  def to_memmap(self, output_dir, batch_size=256):
+    """Export this dataset to memory-mapped NumPy arrays.
+
+    See `dataset_to_memmap`.
+    """
+    return dataset_to_memmap(self.get_dataset(), self.get_metadata(),
+                             output_dir, batch_size=batch_size)
+
+  def _get_image_size(self, row_count, col_count):
+    """Returns (row_count, col_count) of the decoded images of a COMPRESSED
+    bundle of matrix size (`row_count`, `col_count`), None if unknown."""
+    if self.image_size_ is not None:
+      return self.image_size_
+    if self.crop_box_ is not None:
+      return self.crop_box_[2:]
+    return row_count, col_count
+
+  def _decompress_image(self, compressed_image, num_channels):
+    return dataset_utils.decompress_image(compressed_image,
+                                          num_channels=num_channels,
+                                          image_size=self.image_size_,
+                                          crop_box=self.crop_box_)
+
+  def _has_static_example_shape(self):
+    """Returns True if the parsed examples of all bundles have a fully known
+    shape, as needed by `_parse_batch_function` (batches of examples of
+    different sequence sizes would be padded)."""
+    for i in range(self.metadata_.get_bundle_size()):
+      sequence_size, row_count, col_count, _ =\
+        self.metadata_.get_example_shape(i)
+      if self.metadata_.is_compressed(i):
+        row_count, col_count = self._get_image_size(row_count, col_count)
+      if sequence_size is None or row_count is None or col_count is None:
+        return False
+    return True
+
   def _feature_key(self, index, feature_name):
     return str(index) + "_" + feature_name
 
-  def _parse_function(self, sequence_example_proto):
-    """Parse a SequenceExample in the AutoDL/TensorFlow format.
+  def _get_context_features(self):
+    return {
+        "label_index": tf.VarLenFeature(tf.int64),
+        "label_score": tf.VarLenFeature(tf.float32)
+    }
 
-    Args:
-      sequence_example_proto: a SequenceExample with "x_dense_input" or sparse
-          input representation.
-    Returns:
-      An array of tensors. For first edition of AutoDl challenge, returns a
-          pair `(features, labels)` where `features` is a Tensor of shape
-            [sequence_size, row_count, col_count, num_channels]
-          and `labels` a Tensor of shape
-            [output_dim, ]
-    """
+  def _get_sequence_features(self):
     sequence_features = {}
     for i in range(self.metadata_.get_bundle_size()):
       if self.metadata_.is_sparse(i):
@@ -153,12 +297,25 @@ class AutoDLDataset(object):
         sequence_features[self._feature_key(
             i, "dense_input")] = tf.FixedLenSequenceFeature(
                 self.metadata_.get_tensor_size(i), dtype=tf.float32)
+    return sequence_features
+
+  def _parse_function(self, sequence_example_proto):
+    """Parse a SequenceExample in the AutoDL/TensorFlow format.
+
+    Args:
+      sequence_example_proto: a SequenceExample with "x_dense_input" or sparse
+          input representation.
+    Returns:
+      An array of tensors. For first edition of AutoDl challenge, returns a
+          pair `(features, labels)` where `features` is a Tensor of shape
+            [sequence_size, row_count, col_count, num_channels]
+          and `labels` a Tensor of shape
+            [output_dim, ]
+    """
+    sequence_features = self._get_sequence_features()
     contexts, features = tf.parse_single_sequence_example(
         sequence_example_proto,
-        context_features={
-            "label_index": tf.VarLenFeature(tf.int64),
-            "label_score": tf.VarLenFeature(tf.float32)
-        },
+        context_features=self._get_context_features(),
         sequence_features=sequence_features)
 
     sample = []
@@ -184,13 +341,14 @@ class AutoDLDataset(object):
       if key_compressed in features:
         compressed_images = features[key_compressed].values
         decompress_image_func =\
-          lambda x: dataset_utils.decompress_image(x, num_channels=num_channels)
+          lambda x: self._decompress_image(x, num_channels=num_channels)
         # `images` here is a 4D-tensor of shape [T, H, W, C], some of which
         # might be unknown
         images = tf.map_fn(
             decompress_image_func,
             compressed_images, dtype=tf.float32)
-        images.set_shape([sequence_size, row_count, col_count, num_channels])
+        image_rows, image_cols = self._get_image_size(row_count, col_count)
+        images.set_shape([sequence_size, image_rows, image_cols, num_channels])
         sample.append(images)
 
       key_sparse_val = self._feature_key(i, "sparse_value")
@@ -210,15 +368,103 @@ class AutoDLDataset(object):
             tf.SparseTensor(
                 indices, sparse_val.values,
                 [sequence_size, row_count, col_count]))
-        # TODO: see how we can keep sparse tensors instead of
-        # returning dense ones.
+        if self.keep_sparse_:
+          tensor = tf.sparse_reshape(
+              sparse_tensor, [sequence_size, row_count, col_count, 1])
+        else:
+          tensor = tf.sparse_tensor_to_dense(sparse_tensor)
+          tensor = tf.reshape(tensor,
+                    [sequence_size, row_count, col_count, 1])
+        sample.append(tensor)
+
+    labels = tf.sparse_to_dense(
+        contexts["label_index"].values, (self.metadata_.get_output_size(),),
+        contexts["label_score"].values,
+        validate_indices=False)
+    sample.append(labels)
+    return sample
+
+  def _parse_batch_function(self, sequence_example_protos):
+    """Parse a batch of SequenceExamples in the AutoDL/TensorFlow format.
+
+    Same as `_parse_function` but with one `parse_sequence_example` call for
+    the whole batch, which is much cheaper for datasets with small examples
+    (e.g. tabular). Only for examples of fully known shape (see
+    `_has_static_example_shape`), so that no padding is added.
+
+    Args:
+      sequence_example_protos: a 1-D string Tensor of serialized
+          SequenceExamples.
+    Returns:
+      An array of tensors, i.e. the examples returned by `_parse_function`
+          stacked along a new first (batch) axis: features of shape
+            [batch_size, sequence_size, row_count, col_count, num_channels]
+          and labels of shape
+            [batch_size, output_dim]
+    """
+    contexts, features, _ = tf.io.parse_sequence_example(
+        sequence_example_protos,
+        context_features=self._get_context_features(),
+        sequence_features=self._get_sequence_features())
+    batch_size = tf.shape(sequence_example_protos, out_type=tf.int64)[0]
+
+    sample = []
+    for i in range(self.metadata_.get_bundle_size()):
+      key_dense = self._feature_key(i, "dense_input")
+      row_count, col_count = self.metadata_.get_matrix_size(i)
+      num_channels = self.metadata_.get_num_channels(i)
+      # All known, see _has_static_example_shape
+      sequence_size = self.metadata_.get_sequence_size()
+      if key_dense in features:
+        f = features[key_dense]
+        f = tf.reshape(f,
+                       [-1, sequence_size, row_count, col_count, num_channels])
+        sample.append(f)
+
+      key_compressed = self._feature_key(i, "compressed")
+      if key_compressed in features:
+        image_rows, image_cols = self._get_image_size(row_count, col_count)
+        # Images of all examples, in order
+        compressed_images = features[key_compressed].values
+        decompress_image_func =\
+          lambda x: self._decompress_image(x, num_channels=num_channels)
+        images = tf.map_fn(
+            decompress_image_func,
+            compressed_images, dtype=tf.float32)
+        images = tf.reshape(
+            images, [-1, sequence_size, image_rows, image_cols, num_channels])
+        sample.append(images)
+
+      key_sparse_val = self._feature_key(i, "sparse_value")
+      if key_sparse_val in features:
+        key_sparse_col = self._feature_key(i, "sparse_col_index")
+        key_sparse_row = self._feature_key(i, "sparse_row_index")
+        sparse_col = features[key_sparse_col].values
+        sparse_row = features[key_sparse_row].values
+        sparse_val = features[key_sparse_val]
+        # Indices of batched sequence features are [example, time, position]
+        indices = sparse_val.indices
+        indices = tf.concat([
+            indices[:, 0:2],
+            tf.reshape(sparse_row, [-1, 1]),
+            tf.reshape(sparse_col, [-1, 1])
+        ], 1)
+        dense_shape = tf.stack([batch_size, sequence_size,
+                                row_count, col_count])
+        sparse_tensor = tf.sparse_reorder(
+            tf.SparseTensor(indices, sparse_val.values, dense_shape))
         tensor = tf.sparse_tensor_to_dense(sparse_tensor)
         tensor = tf.reshape(tensor,
-                  [sequence_size, row_count, col_count, 1])
+                            [-1, sequence_size, row_count, col_count, 1])
         sample.append(tensor)
 
+    # Indices of the batched context features are [example, position]
+    label_index = contexts["label_index"]
+    label_indices = tf.stack([label_index.indices[:, 0], label_index.values],
+                             axis=1)
     labels = tf.sparse_to_dense(
-        contexts["label_index"].values, (self.metadata_.get_output_size(),),
+        label_indices,
+        tf.stack([batch_size, self.metadata_.get_output_size()]),
         contexts["label_score"].values,
         validate_indices=False)
     sample.append(labels)
@@ -226,13 +472,51 @@ class AutoDLDataset(object):
 
   def _create_dataset(self):
     if not hasattr(self, "dataset_"):
-      files = gfile.Glob(dataset_file_pattern(self.dataset_name_))
+      # Sorted, as in numpy_dataset, so that the order of the examples (and
+      # the index of the shards) does not depend on the file system
+      files = sorted(gfile.Glob(dataset_file_pattern(self.dataset_name_)))
       if not files:
         raise IOError("Unable to find training files. data_pattern='" +
                       dataset_file_pattern(self.dataset_name_) + "'.")
       # logging.info("Number of training files: %s.", str(len(files)))
-      self.dataset_ = tf.data.TFRecordDataset(files)
-      
+      self.files_ = files
+      self.dataset_ = self._read_records()
+
+  def _read_records(self):
+    """Returns a dataset of the records of the shards, in the current
+    graph."""
+    files = self.files_
+    num_parallel_reads = self.num_parallel_reads_
+    if num_parallel_reads is None:
+      num_parallel_reads = min(len(files), multiprocessing.cpu_count())
+    num_parallel_reads = max(1, min(len(files), num_parallel_reads))
+    # Number of shards whose records are interleaved (1: sequential order)
+    self.interleave_cycle_length_ = 1
+    if num_parallel_reads == 1:
+      return tf.data.TFRecordDataset(files)
+    if self.interleave_shards_:
+      self.interleave_cycle_length_ = num_parallel_reads
+      return tf.data.Dataset.from_tensor_slices(files).apply(
+          tf.data.experimental.parallel_interleave(
+              tf.data.TFRecordDataset, cycle_length=num_parallel_reads))
+    # A cycle of length 1 keeps the order of the records, while the
+    # prefetched input elements (i.e. the next shards) are already being
+    # read by background threads.
+    return tf.data.Dataset.from_tensor_slices(files).apply(
+        tf.data.experimental.parallel_interleave(
+            tf.data.TFRecordDataset, cycle_length=1,
+            prefetch_input_elements=num_parallel_reads - 1))
+
+  def _parse_records(self, dataset):
+    """Returns `dataset` of records parsed into examples, by batches of
+    `parse_batch_size` if given."""
+    if self.parse_batch_size_:
+      dataset = dataset.batch(self.parse_batch_size_)
+      return dataset.map(self._parse_batch_function,
+                         num_parallel_calls=self.num_parallel_calls_)
+    return dataset.map(self._parse_function,
+                       num_parallel_calls=self.num_parallel_calls_)
+
   def get_class_labels(self):
     """Get all class labels"""
     # -- IG: inefficient, but... not needed very often
@@ -244,19 +528,63 @@ class AutoDLDataset(object):
       classes_list[index] = label
     return classes_list
 
+  def get_index(self):
+    """Returns the TFRecordIndex of the shards of this dataset.
+
+    The index is built by scanning the record headers of the shards the first
+    time it is needed, then loaded from its file in the cache directory (see
+    `tfrecord_index.get_index_path`) as long as the shards do not change.
+    """
+    if self.index_ is None:
+      index_path = tfrecord_index.get_index_path(
+          os.path.dirname(self.files_[0]), cache_dir=self.cache_dir_)
+      self.index_ = tfrecord_index.load_index(self.files_, index_path)
+    return self.index_
+
+  def __len__(self):
+    """Number of examples, counted from the index (not from the metadata)."""
+    return len(self.get_index())
+
+  def get_slice_dataset(self, start=0, stop=None):
+    """Returns a tf.data.dataset of the parsed examples `start` (included) to
+    `stop` (excluded), in the order of a sequential read of the shards.
+
+    Only the records of the slice are read, directly at their offsets.
+    """
+    index = self.get_index()
+    dataset = tf.data.Dataset.from_generator(
+        lambda: index.read_records(start, stop), tf.string, tf.TensorShape([]))
+    return dataset.map(self._parse_function,
+                       num_parallel_calls=self.num_parallel_calls_)
+
+  def get_shard_dataset(self, num_shards, shard_index):
+    """Returns the `shard_index`-th of `num_shards` contiguous slices of the
+    examples (see `get_slice_dataset`), e.g. one per worker process."""
+    start, stop = self.get_index().get_shard_range(num_shards, shard_index)
+    return self.get_slice_dataset(start, stop)
+
   def get_nth_element(self, num):
-    """Get n-th element in `autodl_dataset` using iterator."""
+    """Get n-th element in `autodl_dataset`, in the order of a sequential read
+    of the shards.
+
+    The record is read at its offset in the index and parsed in a small graph
+    built on the first call, so the cost does not depend on `num`.
+    """
     # -- IG: replaced previous 3d version
-    dataset = self.get_dataset()
-    iterator = dataset.make_one_shot_iterator()
-    next_element = iterator.get_next()
-    with tf.Session() as sess:
-      for _ in range(num+1):
-        tensor_4d, labels = sess.run(next_element)
+    if self.nth_session_ is None:
+      graph = tf.Graph()
+      with graph.as_default():
+        self.nth_record_ = tf.placeholder(tf.string, shape=[])
+        self.nth_element_ = self._parse_function(self.nth_record_)
+      self.nth_session_ = tf.Session(graph=graph)
+    record = self.get_index().read_record(num)
+    tensor_4d, labels = self.nth_session_.run(
+        self.nth_element_, feed_dict={self.nth_record_: record})
     return tensor_4d, labels
     
   def show_image(self, num):
     """Visualize a image represented by `tensor_4d` in RGB or grayscale."""
+    import matplotlib.pyplot as plt # slow to import, only needed here
     # -- IG: replaced previous 3d version
     tensor_4d, label_confidence_pairs = self.get_nth_element(num)
     num_channels = tensor_4d.shape[-1]
@@ -280,6 +608,117 @@ class AutoDLDataset(object):
     plt.show()
     return plt    
 
+def dataset_to_memmap(dataset, metadata, output_dir, batch_size=256):
+  """Write all examples of `dataset` to `.npy` files in one pass.
+
+  The examples are fetched by batches of `batch_size` and written to arrays
+  preallocated on disk (`bundle_<i>.npy` for each matrix bundle and
+  `labels.npy`), then a sidecar file `shapes.json` gives their dtype, number
+  of examples and shape of one example (`example_shapes`). This
+  avoids keeping Python lists of examples, which is slow and doubles memory.
+
+  Args:
+    dataset: a tf.data.Dataset as given by `AutoDLDataset.get_dataset()`.
+    metadata: the AutoDLMetadata object of the dataset. The shapes of the
+        examples must be fully known. Its sample_count is only used to
+        preallocate the arrays (the metadata of the training set can thus be
+        used for the test set).
+    output_dir: directory where the arrays are written.
+    batch_size: number of examples fetched by each `sess.run`.
+  Returns:
+    a list `[bundle_0, ..., bundle_(N-1), labels]` of read-only memory-mapped
+        arrays, with shapes [sample_count, sequence_size, row_count,
+        col_count, num_channels] for the bundles and
+        [sample_count, output_dim] for the labels. Reshaping them (e.g. to
+        [sample_count, -1]) does not copy any data.
+  """
+  dtype = metadata.get_dtype()
+  names = []
+  example_shapes = []
+  for i in range(metadata.get_bundle_size()):
+    example_shape = metadata.get_example_shape(i)
+    if None in example_shape:
+      raise ValueError("Cannot export bundle {} of variable shape {} to a "
+                       .format(i, example_shape) + "NumPy array.")
+    names.append("bundle_{}".format(i))
+    example_shapes.append(example_shape)
+  names.append("labels")
+  example_shapes.append([metadata.get_output_size()])
+
+  if not os.path.isdir(output_dir):
+    os.makedirs(output_dir)
+  paths = [os.path.join(output_dir, name + ".npy") for name in names]
+  capacity = max(metadata.size(), 1)
+  arrays = [np.lib.format.open_memmap(path, mode="w+", dtype=dtype,
+                                      shape=tuple([capacity] + shape))
+            for path, shape in zip(paths, example_shapes)]
+
+  iterator = dataset.batch(batch_size).prefetch(1).make_one_shot_iterator()
+  next_element = iterator.get_next()
+  count = 0
+  with tf.Session() as sess:
+    while True:
+      try:
+        batch = sess.run(next_element)
+      except tf.errors.OutOfRangeError:
+        break
+      num_examples = batch[-1].shape[0]
+      if count + num_examples > capacity:
+        # More examples than announced: double the capacity of the arrays
+        capacity = max(2 * capacity, count + num_examples)
+        arrays = [_grow_memmap(array, path, capacity, count)
+                  for array, path in zip(arrays, paths)]
+      for array, values in zip(arrays, batch):
+        if isinstance(values, tf.SparseTensorValue): # See `keep_sparse`
+          array[count:count + num_examples] = 0
+          indices = values.indices.copy()
+          indices[:, 0] += count
+          array[tuple(indices.T)] = values.values
+        else:
+          array[count:count + num_examples] = values
+      count += num_examples
+  for array in arrays:
+    array.flush()
+  del arrays
+
+  # Written last, so it also tells that the export is complete
+  shapes_info = {'dtype': np.dtype(dtype).name, 'sample_count': count,
+                 'arrays': names, 'example_shapes': example_shapes}
+  with open(os.path.join(output_dir, MEMMAP_SHAPES_FILENAME), "w") as f:
+    json.dump(shapes_info, f)
+  return load_memmap(output_dir)
+
+
+def _grow_memmap(array, path, capacity, count):
+  """Copy the `count` first rows of `array` to a new `.npy` memmap at `path`
+  with `capacity` rows."""
+  tmp_path = path + ".tmp"
+  new_array = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=array.dtype,
+                                        shape=(capacity,) + array.shape[1:])
+  new_array[:count] = array[:count]
+  new_array.flush()
+  del array, new_array
+  os.rename(tmp_path, path)
+  return np.lib.format.open_memmap(path, mode="r+")
+
+
+def load_memmap(output_dir):
+  """Load the arrays written by `dataset_to_memmap` as read-only memmaps."""
+  with open(os.path.join(output_dir, MEMMAP_SHAPES_FILENAME), "r") as f:
+    shapes_info = json.load(f)
+  count = shapes_info['sample_count']
+  arrays = []
+  for name, example_shape in zip(shapes_info['arrays'],
+                                 shapes_info['example_shapes']):
+    array = np.load(os.path.join(output_dir, name + ".npy"), mmap_mode="r")
+    if list(array.shape[1:]) != example_shape:
+      raise ValueError("Array {} of shape {} does not hold examples of shape "
+                       "{}.".format(name, array.shape, example_shape))
+    # Arrays are preallocated, so they might have more rows than examples
+    arrays.append(array[:count])
+  return arrays
+
+
 def main(argv):
   del argv  # Unused.
   dataset = AutoDLDataset("mnist")
@@ -0,0 +1,108 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Metadata of AutoDL datasets.
+
+Reads the `metadata.textproto` file of a dataset in the Tensorflow AutoDL
+standard format. This module does not depend on TensorFlow, so that it can be
+used by TensorFlow-free readers (see numpy_dataset.py).
+"""
+
+import os
+import numpy as np
+from google.protobuf import text_format
+from data_pb2 import DataSpecification
+from data_pb2 import MatrixSpec
+
+
+def metadata_filename(dataset_name):
+  return os.path.join("", dataset_name, "metadata.textproto")
+
+
+def dataset_file_pattern(dataset_name):
+  return os.path.join("", dataset_name, "sample*")
+
+
+class AutoDLMetadata(object):
+  """AutoDL data specification."""
+
+  def __init__(self, dataset_name):
+    self.dataset_name_ = dataset_name
+    self.metadata_ = DataSpecification()
+    with open(metadata_filename(dataset_name), "r") as f:
+      text_format.Merge(f.read(), self.metadata_)
+
+  def get_dataset_name(self):
+    return self.dataset_name_
+
+  def is_compressed(self, bundle_index):
+    return self.metadata_.matrix_spec[
+        bundle_index].format == MatrixSpec.COMPRESSED
+
+  def is_sparse(self, bundle_index):
+    return self.metadata_.matrix_spec[bundle_index].format == MatrixSpec.SPARSE
+
+  def get_bundle_size(self):
+    return len(self.metadata_.matrix_spec)
+
+  def get_matrix_size(self, bundle_index):
+    return (self.metadata_.matrix_spec[bundle_index].row_count,
+            self.metadata_.matrix_spec[bundle_index].col_count)
+
+  def get_num_channels(self, bundle_index):
+    num_channels = self.metadata_.matrix_spec[bundle_index].num_channels
+    if num_channels == -1: # Unknown or undefined num_channels
+      if self.is_compressed(bundle_index): # If is compressed image, set to 3
+        return 3
+      else:
+        return 1
+    else:
+      return num_channels
+
+  def get_tensor_size(self, bundle_index):
+    matrix_size = self.get_matrix_size(bundle_index)
+    num_channels = self.get_num_channels(bundle_index)
+    return matrix_size[0], matrix_size[1], num_channels
+
+  def get_sequence_size(self):
+    return self.metadata_.sequence_size
+
+  def get_example_shape(self, bundle_index):
+    """Shape of the examples of a bundle once parsed by AutoDLDataset, i.e.
+    [sequence_size, row_count, col_count, num_channels] with None for
+    unknown (variable) dimensions."""
+    row_count, col_count = self.get_matrix_size(bundle_index)
+    sequence_size = self.get_sequence_size()
+    if self.is_sparse(bundle_index):
+      num_channels = 1
+    else:
+      num_channels = self.get_num_channels(bundle_index)
+    return [x if x > 0 else None
+            for x in (sequence_size, row_count, col_count, num_channels)]
+
+  def get_dtype(self):
+    """Data type of the parsed examples (features and labels)."""
+    return np.float32
+
+  def get_output_size(self):
+    return self.metadata_.output_dim
+
+  def size(self):
+    return self.metadata_.sample_count
+
+  def get_label_to_index_map(self):
+    return self.metadata_.label_to_index_map
+
+  def get_feature_to_index_map(self):
+    return self.metadata_.feature_to_index_map
@@ -14,8 +14,16 @@
 
 """Util functions to help parsing a Tensorflow dataset."""
 
+import hashlib
+import json
+import os
+import shutil
 import tensorflow as tf
 
+# Name of the file of a cache directory storing the content hashes of the
+# shards, see `get_content_hashes`
+CONTENT_HASHES_FILENAME = "content_hashes.json"
+
 
 def enforce_sequence_size(sample, sequence_size):
   """Takes a Sample as 4-D tensor and enfore the sequence size.
@@ -38,24 +46,216 @@ def enforce_sequence_size(sample, sequence_size):
   return sample
 
 
-def decompress_image(compressed_image, num_channels=3):
+def decompress_image(compressed_image, num_channels=3, image_size=None,
+                     crop_box=None):
   """Decode a JPEG compressed image into a 3-D float Tensor.
 
-  TODO(andreamichi): Test this function.
+  With `image_size` or `crop_box`, JPEG images are decoded directly at a
+  reduced size, so that the full-resolution image is never materialized:
+    - with `crop_box` only, only the pixels of the box are decoded
+      (`decode_and_crop_jpeg`);
+    - with `image_size` only, the image is decoded with the largest DCT
+      downscaling ratio (1, 2, 4 or 8) that keeps it at least as large as
+      `image_size`, then resized to `image_size`;
+    - with both, the box is decoded then resized to `image_size`.
+  Other formats (PNG, GIF, BMP) are decoded fully, then cropped and resized.
 
   Args:
     compressed_image: string representing an image compressed as JPEG.
+    num_channels: number of channels of the decoded image.
+    image_size: if not None, (height, width) of the returned image.
+    crop_box: if not None, (offset_height, offset_width, height, width) of the
+        part of the image to return, as in `tf.image.crop_to_bounding_box`.
+        It must lie within every image.
   Returns:
     3-D float Tensor with values ranging from [0, 1).
   """
-  # Note that the resulting image contains an unknown height and width
-  # that is set dynamically by decode_jpeg. The returned image
-  # is a 3-D Tensor of uint8 [0, 255]. The third dimension is the channel.
-  image = tf.image.decode_image(compressed_image, channels=num_channels)
+  if image_size is None and crop_box is None:
+    # Note that the resulting image contains an unknown height and width
+    # that is set dynamically by decode_jpeg. The returned image
+    # is a 3-D Tensor of uint8 [0, 255]. The third dimension is the channel.
+    image = tf.image.decode_image(compressed_image, channels=num_channels)
 
-  # Use float32 rather than uint8.
-  image = tf.image.convert_image_dtype(image, dtype=tf.float32)
+    # Use float32 rather than uint8.
+    image = tf.image.convert_image_dtype(image, dtype=tf.float32)
+
+    image.set_shape([None, None, num_channels])
+
+    return image
+
+  def decode_jpeg():
+    if crop_box is not None:
+      return tf.image.decode_and_crop_jpeg(compressed_image,
+                                           crop_window=list(crop_box),
+                                           channels=num_channels)
+    return _decode_jpeg_downscaled(compressed_image, num_channels, image_size)
 
-  image.set_shape([None, None, num_channels])
+  def decode_other():
+    image = tf.image.decode_image(compressed_image, channels=num_channels)
+    image.set_shape([None, None, num_channels])
+    if crop_box is not None:
+      image = tf.image.crop_to_bounding_box(image, *crop_box)
+    return image
 
+  image = tf.cond(tf.image.is_jpeg(compressed_image), decode_jpeg, decode_other)
+  image = tf.image.convert_image_dtype(image, dtype=tf.float32)
+  if image_size is not None:
+    image = tf.image.resize_images(image, size=image_size)
+    image.set_shape(list(image_size) + [num_channels])
+  else:
+    image.set_shape(list(crop_box[2:]) + [num_channels])
   return image
+
+
+def _decode_jpeg_downscaled(compressed_image, num_channels, image_size):
+  """Decode a JPEG image with the largest DCT downscaling ratio keeping it at
+  least as large as `image_size`. Returns a uint8 Tensor."""
+  shape = tf.image.extract_jpeg_shape(compressed_image)
+  def decode(ratio):
+    return lambda: tf.image.decode_jpeg(compressed_image,
+                                        channels=num_channels, ratio=ratio)
+  # The ratio of `decode_jpeg` is an attribute, hence one branch per ratio
+  # (the first true predicate wins)
+  pred_fn_pairs = []
+  for ratio in [8, 4, 2]:
+    fits = tf.logical_and(shape[0] >= image_size[0] * ratio,
+                          shape[1] >= image_size[1] * ratio)
+    pred_fn_pairs.append((fits, decode(ratio)))
+  return tf.case(pred_fn_pairs, default=decode(1), exclusive=False)
+
+
+def file_sha1(path, block_size=1 << 20):
+  """sha1 of the content of a file, as a hexadecimal string."""
+  sha = hashlib.sha1()
+  with open(path, 'rb') as f:
+    for block in iter(lambda: f.read(block_size), b''):
+      sha.update(block)
+  return sha.hexdigest()
+
+
+def get_content_hashes(files, cache_dir):
+  """sha1 of the content of each of `files`.
+
+  Hashing a shard costs a full read, so its hash is stored in
+  `CONTENT_HASHES_FILENAME` in `cache_dir` along with its size and
+  modification time, and only computed again when one of them changes. The
+  stored hashes of files that no longer exist are dropped.
+
+  Returns:
+    a dict {path: sha1}.
+  """
+  index_path = os.path.join(cache_dir, CONTENT_HASHES_FILENAME)
+  try:
+    with open(index_path, 'r') as f:
+      index = json.load(f)
+  except (IOError, ValueError):
+    index = {}
+  hashes = {}
+  changed = False
+  for path in files:
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    entry = index.get(path)
+    if (entry is None or entry['size'] != stat.st_size or
+        entry['mtime'] != stat.st_mtime):
+      entry = {'size': stat.st_size, 'mtime': stat.st_mtime,
+               'sha1': file_sha1(path)}
+      index[path] = entry
+      changed = True
+    hashes[path] = entry['sha1']
+  for path in list(index):
+    if not os.path.exists(path):
+      del index[path]
+      changed = True
+  if changed:
+    # Write to a temporary file first so that concurrent readers never see
+    # a partial index
+    tmp_path = index_path + '.tmp.' + str(os.getpid())
+    with open(tmp_path, 'w') as f:
+      json.dump(index, f)
+    os.rename(tmp_path, index_path)
+  return hashes
+
+
+def get_cache_key(files, metadata_file, parse_options, cache_dir):
+  """Compute a content-based key for the decoded examples of a dataset.
+
+  Args:
+    files: list of paths to the TFRecord shards of the dataset, in the order
+        they are read.
+    metadata_file: path to the `metadata.textproto` file of the dataset.
+    parse_options: dict of the options changing the parsed examples or their
+        order.
+    cache_dir: directory of the cache, where the content hashes of the shards
+        are stored (see `get_content_hashes`).
+  Returns:
+    a hexadecimal string.
+  """
+  sha = hashlib.sha1()
+  hashes = get_content_hashes(files, cache_dir)
+  # The order of the shards is the order of the examples
+  for path in files:
+    sha.update("{} {}\n".format(os.path.basename(path),
+                                hashes[os.path.abspath(path)])\
+               .encode('utf-8'))
+  with open(metadata_file, 'rb') as f:
+    sha.update(f.read())
+  sha.update(repr(sorted(parse_options.items())).encode('utf-8'))
+  return sha.hexdigest()
+
+
+def _get_dir_size(path):
+  size = 0
+  for root, _, filenames in os.walk(path):
+    for filename in filenames:
+      try:
+        size += os.path.getsize(os.path.join(root, filename))
+      except OSError: # Removed in the meantime
+        pass
+  return size
+
+
+def evict_cache_entries(cache_dir, max_size, keep=None):
+  """Remove least recently used entries until `cache_dir` fits in `max_size`.
+
+  Each entry is a sub-directory of `cache_dir` and its modification time is
+  its last use (see `touch_cache_entry`).
+
+  Args:
+    cache_dir: root directory of the cache.
+    max_size: maximum size of the cache in bytes. If None, nothing is evicted.
+    keep: name of an entry never to evict (e.g. the one about to be used).
+  Returns:
+    the list of evicted entries.
+  """
+  if max_size is None or not os.path.isdir(cache_dir):
+    return []
+  entries = []
+  for name in os.listdir(cache_dir):
+    path = os.path.join(cache_dir, name)
+    if os.path.isdir(path):
+      entries.append((os.path.getmtime(path), name, _get_dir_size(path)))
+  total_size = sum(size for _, _, size in entries)
+  evicted = []
+  for _, name, size in sorted(entries):
+    if total_size <= max_size:
+      break
+    if name == keep:
+      continue
+    shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+    total_size -= size
+    evicted.append(name)
+  return evicted
+
+
+def touch_cache_entry(cache_dir, key):
+  """Create the entry `key` of the cache if needed and mark it as just used.
+
+  Returns:
+    the directory of the entry.
+  """
+  entry_dir = os.path.join(cache_dir, key)
+  if not os.path.isdir(entry_dir):
+    os.makedirs(entry_dir)
+  os.utime(entry_dir, None)
+  return entry_dir
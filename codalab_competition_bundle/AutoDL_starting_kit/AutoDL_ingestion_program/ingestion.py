@@ -92,6 +92,45 @@ max_cycle = 1
 max_estimators = 1000
 max_samples = float('Inf')
 
+# Input pipeline
+################
+# Options of the tf.data pipeline built by AutoDLDataset (see dataset.py).
+# None means a sensible default: one reader per shard (up to the number of
+# CPUs) for num_parallel_reads, and autotuning for num_parallel_calls and
+# prefetch_buffer_size. Setting all of them to 1, 1 and 0 gives back the
+# sequential, non-prefetching pipeline.
+num_parallel_reads = None   # number of sample* shards read concurrently
+num_parallel_calls = None   # number of records parsed/decoded in parallel
+prefetch_buffer_size = None # number of examples prefetched for the model
+# Parse records by batches of this size with one parse_sequence_example call
+# (faster for small examples, e.g. tabular). None parses records one by one,
+# as do datasets with examples of variable shape (e.g. speech). Models get the
+# same examples in both cases.
+parse_batch_size = None
+# Give examples of SPARSE bundles as tf.SparseTensor instead of dense tensors.
+# Only for models handling sparse examples (e.g. baseline1_linear).
+keep_sparse = False
+# Interleave the records of the training shards. Faster with many shards, but
+# models then get the training examples in a different order. Examples of the
+# test set always keep their order, which must match that of the solution.
+interleave_train_shards = False
+# Persistent cache of decoded examples, shared by successive runs (e.g. local
+# tests) on the same datasets. None disables the cache.
+cache_dir = None            # e.g. '/tmp/autodl_cache'
+cache_max_size = None # in bytes, least recently used entries evicted
+                      # (None: dataset.DEFAULT_CACHE_MAX_SIZE)
+
+# Predictions
+#############
+# Write predictions in the NumPy .npy binary format (float32) instead of text.
+# Much faster to write and to read, the scoring program detects both formats.
+binary_predictions = False
+# URL of a local scoring service (see scoring_service.py in the scoring
+# program), e.g. 'http://127.0.0.1:8760', to which predictions are also sent
+# to be scored right away (local tests only). If None, the environment variable
+# AUTODL_SCORING_SERVICE is used, if set.
+scoring_service_url = None
+
 # Redirect stardant output to live results page (detailed_results.html)
 # to have live output for debugging
 REDIRECT_STDOUT = False
@@ -139,6 +178,8 @@ import os
 import sys
 from sys import argv, path
 import datetime
+import importlib
+import threading
 the_date = datetime.datetime.now().strftime("%y-%m-%d %H:%M:%S")
 
 def print_log(*content):
@@ -233,11 +274,28 @@ if __name__=="__main__" and debug_mode<4:
     path.append(submission_dir)
     #IG: to allow submitting the starting kit as sample submission
     path.append(submission_dir + '/AutoDL_sample_code_submission')
+    # TensorFlow takes seconds to import: import it in the background while
+    # the data inventory runs. Importing it again below waits for this thread.
+    tf_import_thread = threading.Thread(target=importlib.import_module,
+                                        args=('tensorflow',))
+    tf_import_thread.daemon = True
+    tf_import_thread.start()
     import data_io
     from data_io import vprint
+
+    #### INVENTORY DATA (and sort dataset names alphabetically)
+    datanames = data_io.inventory_data(input_dir)
+    #### Delete zip files and metadata file
+    datanames = [x for x in datanames if x.endswith('.data')]
+
+    tf_import_thread.join()
     import model # participants' model.py
     from model import Model
     from dataset import AutoDLDataset # THE class of AutoDL datasets
+    from dataset import AutoDLMetadata
+    from dataset import DEFAULT_CACHE_MAX_SIZE
+    if cache_max_size is None:
+        cache_max_size = DEFAULT_CACHE_MAX_SIZE
 
     # Clear potentiablly results of previous execution (for local run)
     clean_last_output(output_dir)
@@ -255,11 +313,8 @@ if __name__=="__main__" and debug_mode<4:
     start_filepath = os.path.join(output_dir, start_filename)
     with open(start_filepath, 'w') as f:
       f.write('Started!')
-
-    #### INVENTORY DATA (and sort dataset names alphabetically)
-    datanames = data_io.inventory_data(input_dir)
-    #### Delete zip files and metadata file
-    datanames = [x for x in datanames if x.endswith('.data')]
+    # The scoring program follows the manifest of predictions (see data_io)
+    data_io.append_to_manifest(output_dir, 'start')
 
     #### DEBUG MODE: Show dataset list and STOP
     if debug_mode>=3:
@@ -273,6 +328,23 @@ if __name__=="__main__" and debug_mode<4:
     overall_time_budget = 0
     time_left_over = 0
 
+    # Predictions are written by a background thread, so that training
+    # resumes as soon as they are made
+    scoring_client = None
+    if not scoring_service_url:
+      scoring_service_url = os.environ.get('AUTODL_SCORING_SERVICE')
+    if scoring_service_url:
+      try:
+        scoring_client = data_io.ScoringClient(scoring_service_url)
+        scoring_client.start()
+        print_log("Sending predictions to scoring service " + scoring_service_url)
+      except IOError as e:
+        print_log("Scoring service {} not available: {}"\
+                  .format(scoring_service_url, e))
+        scoring_client = None
+    prediction_writer = data_io.PredictionWriter(binary=binary_predictions,
+                                                 scoring_client=scoring_client)
+
     # Loop over datasets (if several)
     # For AutoDL challenge, there is only 1 dataset for each track, so this loop
     # can actually be ignored. Here basename is e.g. 'adult.data'
@@ -287,12 +359,36 @@ if __name__=="__main__" and debug_mode<4:
         # Keep track of time not to exceed your time budget. Time spent to inventory data neglected.
         start = time.time()
 
+        # ========= Creating a model
+        # The model is created before the datasets so that it can choose how
+        # compressed images are decoded (see below)
+        print_log("Creating model...")
+        ##### Begin creating model #####
+        train_metadata = AutoDLMetadata(os.path.join(input_dir, basename, "train"))
+        M = Model(train_metadata) # The metadata of D_train and D_test only differ in sample_count
+        ###### End creating model ######
+
         # ======== Creating a data object with data, informations about it
         print_log("Reading training set and test set...")
 
         ##### Begin creating training set and test set #####
-        D_train = AutoDLDataset(os.path.join(input_dir, basename, "train"))
-        D_test = AutoDLDataset(os.path.join(input_dir, basename, "test"))
+        pipeline_options = {'num_parallel_reads': num_parallel_reads,
+                             'num_parallel_calls': num_parallel_calls,
+                             'prefetch_buffer_size': prefetch_buffer_size,
+                             'cache_dir': cache_dir,
+                             'cache_max_size': cache_max_size,
+                             'parse_batch_size': parse_batch_size,
+                             'keep_sparse': keep_sparse,
+                             # Optional attributes of the model: size to which
+                             # compressed images are resized on decode, and
+                             # part of them to decode
+                             'image_size': getattr(M, 'decode_image_size', None),
+                             'crop_box': getattr(M, 'decode_crop_box', None)}
+        D_train = AutoDLDataset(os.path.join(input_dir, basename, "train"),
+                                interleave_shards=interleave_train_shards,
+                                **pipeline_options)
+        D_test = AutoDLDataset(os.path.join(input_dir, basename, "test"),
+                               **pipeline_options)
         ##### End creating training set and test set #####
 
         # ======== Keep track of time
@@ -301,17 +397,12 @@ if __name__=="__main__" and debug_mode<4:
         else:
             time_budget = max_time
 
-        # ========= Creating a model
-        print_log("Creating model...")
-        ##### Begin creating model #####
-        M = Model(D_train.get_metadata()) # The metadata of D_train and D_test only differ in sample_count
-        ###### End creating model ######
-
         # Keeping track of how many predictions are made
         prediction_order_number = 0
 
         # Start the CORE PART: train/predict process
         start = time.time()
+        print_log("[+] Time to first train call %5.2f sec" % (start - overall_start))
         while(True):
           remaining_time_budget = start + time_budget - time.time()
           print_log("Training the model...")
@@ -327,8 +418,8 @@ if __name__=="__main__" and debug_mode<4:
           # Prediction files: adult.predict_0, adult.predict_1, ...
           filename_test = basename[:-5] + '.predict_' +\
             str(prediction_order_number)
-          # Write predictions to output_dir
-          data_io.write(os.path.join(output_dir,filename_test), Y_test)
+          # Write predictions to output_dir (in the background)
+          prediction_writer.write(os.path.join(output_dir,filename_test), Y_test)
           prediction_order_number += 1
           print_log("[+] Prediction success, time spent so far %5.2f sec" % (time.time() - start))
           remaining_time_budget = start + time_budget - time.time()
@@ -336,6 +427,9 @@ if __name__=="__main__" and debug_mode<4:
           if remaining_time_budget<=0:
             break
 
+    # Wait for all predictions to be written
+    prediction_writer.close()
+
     # Finishing ingestion program
     overall_time_spent = time.time() - overall_start
 
@@ -349,6 +443,7 @@ if __name__=="__main__" and debug_mode<4:
       f.write(str(overall_time_spent))
       if verbose:
           print_log("Successfully write duration to {}.".format(duration_filename))
+    data_io.append_to_manifest(output_dir, 'end', duration=overall_time_spent)
     if execution_success:
         print_log("[+] Done")
         print_log("[+] Overall time spent %5.2f sec " % overall_time_spent)
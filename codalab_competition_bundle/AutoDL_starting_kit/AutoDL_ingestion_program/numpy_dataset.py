@@ -0,0 +1,404 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""AutoDL datasets as NumPy arrays, without TensorFlow.
+
+Reads data in the Tensorflow AutoDL standard format with Python and NumPy
+only, for tools and models that do not use TensorFlow: no TensorFlow import
+and no tf.Session, and pure-Python parsing is faster than tf.data for the
+small examples of tabular and speech datasets.
+
+Examples are the same as those of `AutoDLDataset.get_dataset()` (see
+dataset.py): a list `[bundle_0, ..., bundle_(N-1), labels]` of float32 arrays
+of shapes
+  [sequence_size, row_count, col_count, num_channels]
+for the bundles and [output_dim] for the labels.
+
+tf.train.SequenceExample is not part of data_pb2, so its few messages are
+decoded directly from the protobuf wire format (see `parse_sequence_example`).
+Images of COMPRESSED bundles are decoded with Pillow, by a pool of threads.
+"""
+
+import concurrent.futures
+import glob
+import io
+import os
+import multiprocessing
+import sys
+import time
+import numpy as np
+import tfrecord_index
+from dataset_metadata import AutoDLMetadata
+from dataset_metadata import dataset_file_pattern
+
+# Wire types of the protobuf encoding
+_VARINT = 0
+_FIXED64 = 1
+_LENGTH_DELIMITED = 2
+_FIXED32 = 5
+
+# Pillow modes of decoded images, by number of channels
+_IMAGE_MODES = {1: 'L', 3: 'RGB', 4: 'RGBA'}
+
+
+def _read_varint(buf, pos):
+  """Returns the varint starting at `buf[pos]` and the position after it."""
+  result = 0
+  shift = 0
+  while True:
+    byte = buf[pos]
+    pos += 1
+    result |= (byte & 0x7F) << shift
+    if not byte & 0x80:
+      return result, pos
+    shift += 7
+
+
+def _iter_fields(buf, start, end):
+  """Yields (field_number, wire_type, value) for the fields of the message
+  `buf[start:end]`. `value` is an int for varints and a pair (start, end) of
+  positions in `buf` for other wire types."""
+  pos = start
+  while pos < end:
+    key, pos = _read_varint(buf, pos)
+    field_number = key >> 3
+    wire_type = key & 7
+    if wire_type == _VARINT:
+      value, pos = _read_varint(buf, pos)
+    elif wire_type == _LENGTH_DELIMITED:
+      length, pos = _read_varint(buf, pos)
+      value = (pos, pos + length)
+      pos += length
+    elif wire_type == _FIXED32:
+      value = (pos, pos + 4)
+      pos += 4
+    elif wire_type == _FIXED64:
+      value = (pos, pos + 8)
+      pos += 8
+    else:
+      raise ValueError("Unsupported protobuf wire type {}.".format(wire_type))
+    yield field_number, wire_type, value
+
+
+def _decode_varints(data):
+  """Decode packed varints (e.g. of an Int64List) into an int64 array."""
+  data = np.frombuffer(data, dtype=np.uint8)
+  is_last = data < 0x80
+  if is_last.all(): # Only values < 128
+    return data.astype(np.int64)
+  ends = np.flatnonzero(is_last)
+  starts = np.concatenate([[0], ends[:-1] + 1])
+  lengths = ends - starts + 1
+  # Position of each byte in its varint, giving its shift
+  positions = np.arange(len(data)) - np.repeat(starts, lengths)
+  chunks = (data & 0x7F).astype(np.uint64) << (7 * positions).astype(np.uint64)
+  return np.bitwise_or.reduceat(chunks, starts).view(np.int64)
+
+
+def _parse_feature(buf, start, end):
+  """Values of the tf.train.Feature `buf[start:end]`: a list of bytes for a
+  BytesList, a float32 array for a FloatList and an int64 array for an
+  Int64List (None for an empty Feature)."""
+  for kind, _, (list_start, list_end) in _iter_fields(buf, start, end):
+    values = []
+    for _, wire_type, value in _iter_fields(buf, list_start, list_end):
+      if kind == 1: # BytesList
+        values.append(buf[value[0]:value[1]])
+      elif kind == 2: # FloatList
+        count = (value[1] - value[0]) // 4
+        values.append(np.frombuffer(buf, dtype='<f4', count=count,
+                                    offset=value[0]))
+      elif kind == 3: # Int64List
+        if wire_type == _LENGTH_DELIMITED: # Packed
+          values.append(_decode_varints(buf[value[0]:value[1]]))
+        else:
+          values.append(np.array([value], dtype=np.uint64).view(np.int64))
+    if kind == 1:
+      return values
+    dtype = np.float32 if kind == 2 else np.int64
+    if not values:
+      return np.zeros(0, dtype=dtype)
+    return np.concatenate(values).astype(dtype, copy=False)
+  return None
+
+
+def _parse_feature_list(buf, start, end):
+  """Values of the features of the tf.train.FeatureList `buf[start:end]`."""
+  return [_parse_feature(buf, s, e)
+          for _, _, (s, e) in _iter_fields(buf, start, end)]
+
+
+def _parse_map(buf, start, end, parse_value):
+  """Parse the `map<string, ...>` field of the message `buf[start:end]`."""
+  result = {}
+  for _, _, (entry_start, entry_end) in _iter_fields(buf, start, end):
+    key = ''
+    value = (0, 0)
+    for field_number, _, (s, e) in _iter_fields(buf, entry_start, entry_end):
+      if field_number == 1:
+        key = buf[s:e].decode('utf-8')
+      elif field_number == 2:
+        value = (s, e)
+    result[key] = parse_value(buf, *value)
+  return result
+
+
+def parse_sequence_example(serialized):
+  """Parse a serialized tf.train.SequenceExample.
+
+  Returns:
+    context: dict mapping the names of the context features to their values.
+    feature_lists: dict mapping the names of the feature lists to the list of
+        the values of their features (one per step of the sequence).
+    Values are as returned by `_parse_feature`.
+  """
+  context = {}
+  feature_lists = {}
+  for field_number, _, (start, end) in _iter_fields(serialized, 0,
+                                                     len(serialized)):
+    if field_number == 1: # Features context
+      context.update(_parse_map(serialized, start, end, _parse_feature))
+    elif field_number == 2: # FeatureLists feature_lists
+      feature_lists.update(_parse_map(serialized, start, end,
+                                      _parse_feature_list))
+  return context, feature_lists
+
+
+def decode_image(encoded_image, num_channels=3, image_size=None,
+                 crop_box=None):
+  """Decode a compressed image into a float32 array of shape
+  [row_count, col_count, num_channels] with values in [0, 1].
+
+  `image_size` and `crop_box` are as in `dataset_utils.decompress_image`: JPEG
+  images resized to `image_size` are decoded with DCT downscaling. Resized
+  images can differ slightly from those of the TensorFlow path.
+  """
+  from PIL import Image # slow to import, only needed for images
+  image = Image.open(io.BytesIO(encoded_image))
+  mode = _IMAGE_MODES[num_channels]
+  if image_size is not None and crop_box is None:
+    # Only has an effect on JPEG images; keeps them at least this large
+    image.draft(mode, (image_size[1], image_size[0]))
+  image = image.convert(mode)
+  if crop_box is not None:
+    offset_row, offset_col, row_count, col_count = crop_box
+    image = image.crop((offset_col, offset_row,
+                        offset_col + col_count, offset_row + row_count))
+  if image_size is not None:
+    image = image.resize((image_size[1], image_size[0]), Image.BILINEAR)
+  array = np.asarray(image, dtype=np.float32) / 255
+  return array.reshape(array.shape[0], array.shape[1], num_channels)
+
+
+class NumpyDataset(object):
+  """AutoDL dataset read with NumPy only.
+
+  The TensorFlow-free counterpart of AutoDLDataset: same metadata, same
+  examples (as NumPy arrays), same order as a sequential read of the shards.
+  """
+
+  def __init__(self, dataset_name, check_crc=None, num_threads=None,
+               image_size=None, crop_box=None, keep_sparse=False):
+    """Construct a NumPy AutoDL Dataset.
+
+    Args:
+      dataset_name: name of the dataset under the 'dataset_dir' flag.
+      check_crc: if True, check the crc of the records read sequentially (see
+          `tfrecord_index.read_tfrecord_file`). Records read by slice are not
+          checked. If None, check them only if a fast crc32c module is
+          installed.
+      num_threads: number of threads decoding images of COMPRESSED bundles.
+          If None, use the number of CPUs.
+      image_size, crop_box: as in AutoDLDataset.
+      keep_sparse: if True, bundles in the SPARSE format are given as
+          scipy.sparse.csr_matrix of shape
+            [1, sequence_size * row_count * col_count]
+          (batches of shape [batch_size, ...]), ready for scikit-learn,
+          instead of dense arrays.
+    """
+    self.dataset_name_ = dataset_name
+    self.metadata_ = AutoDLMetadata(dataset_name)
+    self.files_ = sorted(glob.glob(dataset_file_pattern(dataset_name)))
+    if not self.files_:
+      raise IOError("Unable to find training files. data_pattern='" +
+                    dataset_file_pattern(dataset_name) + "'.")
+    self.check_crc_ = check_crc
+    self.num_threads_ = num_threads or multiprocessing.cpu_count()
+    self.image_size_ = tuple(image_size) if image_size else None
+    self.crop_box_ = tuple(crop_box) if crop_box else None
+    self.keep_sparse_ = keep_sparse
+    self.index_ = None
+    self.pool_ = None
+
+  def get_metadata(self):
+    """Returns an AutoDLMetadata object."""
+    return self.metadata_
+
+  def get_index(self):
+    """Returns the TFRecordIndex of the shards (shared with AutoDLDataset)."""
+    if self.index_ is None:
+      index_path = tfrecord_index.get_index_path(
+          os.path.dirname(self.files_[0]))
+      self.index_ = tfrecord_index.load_index(self.files_, index_path)
+    return self.index_
+
+  def __len__(self):
+    return len(self.get_index())
+
+  def _iter_records(self, start, stop):
+    if start == 0 and stop is None:
+      for path in self.files_:
+        for record in tfrecord_index.read_tfrecord_file(
+            path, check_crc=self.check_crc_):
+          yield record
+    else:
+      for record in self.get_index().read_records(start, stop):
+        yield record
+
+  def _parse_record(self, record):
+    """Parse a record into an example whose COMPRESSED bundles are still
+    lists of encoded images."""
+    context, feature_lists = parse_sequence_example(record)
+    sequence_size = self.metadata_.get_sequence_size()
+    example = []
+    for i in range(self.metadata_.get_bundle_size()):
+      row_count, col_count = self.metadata_.get_matrix_size(i)
+      num_channels = self.metadata_.get_num_channels(i)
+      if self.metadata_.is_compressed(i):
+        frames = feature_lists.get("{}_compressed".format(i), [])
+        example.append([frame[0] for frame in frames])
+      elif self.metadata_.is_sparse(i):
+        example.append(self._sparse_bundle(
+            feature_lists, i, sequence_size, row_count, col_count))
+      else:
+        frames = feature_lists.get("{}_dense_input".format(i), [])
+        values = np.concatenate(frames) if frames else np.zeros(0, np.float32)
+        example.append(values.reshape(
+            sequence_size if sequence_size > 0 else -1,
+            row_count, col_count, num_channels))
+    labels = np.zeros(self.metadata_.get_output_size(), dtype=np.float32)
+    label_index = context.get("label_index")
+    if label_index is not None:
+      labels[label_index] = context["label_score"]
+    example.append(labels)
+    return example
+
+  def _sparse_bundle(self, feature_lists, i, sequence_size, row_count,
+                     col_count):
+    values = feature_lists.get("{}_sparse_value".format(i), [])
+    rows = feature_lists.get("{}_sparse_row_index".format(i), [])
+    cols = feature_lists.get("{}_sparse_col_index".format(i), [])
+    if sequence_size <= 0:
+      sequence_size = len(values)
+    steps = np.repeat(np.arange(len(values)), [len(v) for v in values])
+    if values:
+      values = np.concatenate(values)
+      rows = np.concatenate(rows)
+      cols = np.concatenate(cols)
+    else:
+      values = np.zeros(0, np.float32)
+      rows = cols = np.zeros(0, np.int64)
+    if self.keep_sparse_:
+      import scipy.sparse
+      flat_index = (steps * row_count + rows) * col_count + cols
+      return scipy.sparse.csr_matrix(
+          (values, (np.zeros_like(flat_index), flat_index)),
+          shape=(1, sequence_size * row_count * col_count))
+    tensor = np.zeros((sequence_size, row_count, col_count, 1),
+                      dtype=np.float32)
+    tensor[steps, rows, cols, 0] = values
+    return tensor
+
+  def _decode_images(self, examples):
+    """Decode (in place) the images of COMPRESSED bundles of `examples`."""
+    compressed = [i for i in range(self.metadata_.get_bundle_size())
+                  if self.metadata_.is_compressed(i)]
+    if not compressed:
+      return
+    if self.pool_ is None:
+      self.pool_ = concurrent.futures.ThreadPoolExecutor(self.num_threads_)
+    for i in compressed:
+      num_channels = self.metadata_.get_num_channels(i)
+      decode = lambda x: decode_image(x, num_channels=num_channels,
+                                      image_size=self.image_size_,
+                                      crop_box=self.crop_box_)
+      encoded = [image for example in examples for image in example[i]]
+      images = iter(self.pool_.map(decode, encoded))
+      for example in examples:
+        frames = [next(images) for _ in example[i]]
+        example[i] = np.stack(frames)
+
+  def _iter_chunks(self, chunk_size, start, stop):
+    """Yields lists of at most `chunk_size` parsed and decoded examples."""
+    chunk = []
+    for record in self._iter_records(start, stop):
+      chunk.append(self._parse_record(record))
+      if len(chunk) == chunk_size:
+        self._decode_images(chunk)
+        yield chunk
+        chunk = []
+    if chunk:
+      self._decode_images(chunk)
+      yield chunk
+
+  def iter_examples(self, start=0, stop=None, chunk_size=64):
+    """Yields the examples `start` (included) to `stop` (excluded).
+
+    Examples are parsed by chunks of `chunk_size`, whose images are decoded
+    in parallel.
+    """
+    for chunk in self._iter_chunks(chunk_size, start, stop):
+      for example in chunk:
+        yield example
+
+  def iter_batches(self, batch_size=256, start=0, stop=None):
+    """Yields batches `[bundle_0, ..., bundle_(N-1), labels]` of the examples
+    `start` (included) to `stop` (excluded), stacked along a new first axis.
+
+    Examples of a batch must have the same shape (for images of variable
+    size, give an `image_size`).
+    """
+    for chunk in self._iter_chunks(batch_size, start, stop):
+      batch = []
+      for arrays in zip(*chunk):
+        if self.keep_sparse_ and hasattr(arrays[0], 'tocsr'):
+          import scipy.sparse
+          batch.append(scipy.sparse.vstack(arrays, format='csr'))
+        else:
+          try:
+            batch.append(np.stack(arrays))
+          except ValueError:
+            raise ValueError("Cannot stack examples of different shapes {}."\
+                             .format(sorted(set(x.shape for x in arrays))))
+      yield batch
+
+
+def main(argv):
+  """Read a whole dataset and report the reading speed."""
+  if len(argv) < 2:
+    print("Usage: python numpy_dataset.py dataset_dir [batch_size]")
+    return
+  batch_size = int(argv[2]) if len(argv) > 2 else 256
+  begin = time.time()
+  dataset = NumpyDataset(argv[1])
+  count = 0
+  for batch in dataset.iter_batches(batch_size=batch_size):
+    count += batch[-1].shape[0]
+  duration = time.time() - begin
+  print("Read {} examples in {:.3f} sec ({:.1f} examples/sec)."\
+        .format(count, duration, count / max(duration, 1e-9)))
+
+
+if __name__ == "__main__":
+  main(sys.argv)
@@ -0,0 +1,267 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Reading and indexing the records of TFRecord files, for random access.
+
+Each record of a TFRecord file is framed as
+  uint64 length
+  uint32 masked crc32c of length
+  byte   data[length]
+  uint32 masked crc32c of data
+(integers are little-endian). Scanning these headers once gives the offset and
+the length of every record. The index is saved in a cache directory (never
+in the dataset directory, which may be read-only or shared) so that counting
+records, reading the n-th record or reading a slice of records never
+needs to iterate over the files again. `read_tfrecord_file` reads all records
+of a file sequentially, checking their crc if asked to.
+
+This module does not depend on TensorFlow.
+"""
+
+import hashlib
+import os
+import struct
+import tempfile
+import numpy as np
+
+# Optional fast implementations of crc32c. Without them, checking the crc of
+# records is done in pure Python, which is orders of magnitude slower than
+# reading them: crc are then not checked unless asked for explicitly.
+try:
+  from crc32c import crc32c as _crc32c
+except ImportError:
+  try:
+    from google_crc32c import value as _crc32c
+  except ImportError:
+    _crc32c = None
+
+HAS_FAST_CRC32C = _crc32c is not None
+
+INDEX_FILENAME = "tfrecord_index.npz"
+
+# Size of the length and of its crc before the data of a record
+HEADER_SIZE = 12
+# Size of the crc after the data of a record
+FOOTER_SIZE = 4
+
+
+_CRC32C_TABLE = []
+
+
+def _crc32c_python(data):
+  """crc32c (Castagnoli) of `data`, in pure Python."""
+  if not _CRC32C_TABLE:
+    for byte in range(256):
+      crc = byte
+      for _ in range(8):
+        crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+      _CRC32C_TABLE.append(crc)
+  table = _CRC32C_TABLE
+  crc = 0xFFFFFFFF
+  for byte in bytearray(data):
+    crc = table[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+  return crc ^ 0xFFFFFFFF
+
+
+def masked_crc32c(data):
+  """Masked crc32c of `data`, as stored in TFRecord files."""
+  crc = _crc32c(data) if _crc32c is not None else _crc32c_python(data)
+  return (((crc >> 15) | (crc << 17)) + 0xA282EAD8) & 0xFFFFFFFF
+
+
+def read_tfrecord_file(path, check_crc=None):
+  """Yields the data of the records of a TFRecord file, in order.
+
+  Args:
+    path: path to a TFRecord file (not compressed).
+    check_crc: if True, check the crc of the length and of the data of each
+        record and raise an IOError on mismatch. If None, check them only if
+        a fast crc32c module (`crc32c` or `google_crc32c`) is installed.
+  """
+  if check_crc is None:
+    check_crc = HAS_FAST_CRC32C
+  with open(path, 'rb') as f:
+    while True:
+      header = f.read(HEADER_SIZE)
+      if not header:
+        return
+      if len(header) < HEADER_SIZE:
+        raise IOError("Truncated record in TFRecord file {}.".format(path))
+      length, length_crc = struct.unpack('<QI', header)
+      data = f.read(length)
+      footer = f.read(FOOTER_SIZE)
+      if len(data) < length or len(footer) < FOOTER_SIZE:
+        raise IOError("Truncated record in TFRecord file {}.".format(path))
+      if check_crc:
+        data_crc, = struct.unpack('<I', footer)
+        if (masked_crc32c(header[:8]) != length_crc or
+            masked_crc32c(data) != data_crc):
+          raise IOError("Corrupted record in TFRecord file {}.".format(path))
+      yield data
+
+
+def scan_tfrecord_file(path):
+  """Scan the record headers of a TFRecord file.
+
+  Returns:
+    offsets: numpy.ndarray of the offsets (in bytes) of the data of records.
+    lengths: numpy.ndarray of the lengths (in bytes) of the data of records.
+  """
+  offsets = []
+  lengths = []
+  size = os.path.getsize(path)
+  position = 0
+  with open(path, 'rb') as f:
+    while position < size:
+      header = f.read(HEADER_SIZE)
+      if len(header) < HEADER_SIZE:
+        break
+      length, = struct.unpack('<Q', header[:8])
+      offsets.append(position + HEADER_SIZE)
+      lengths.append(length)
+      position += HEADER_SIZE + length + FOOTER_SIZE
+      f.seek(position)
+  if position != size:
+    raise IOError("Truncated record in TFRecord file {}.".format(path))
+  return np.array(offsets, dtype=np.uint64), np.array(lengths, dtype=np.uint32)
+
+
+def get_index_path(dataset_dir, cache_dir=None):
+  """Path of the index of a dataset directory.
+
+  The index is stored in `cache_dir` (by default a directory of the temporary
+  directory), under a name derived from the path of `dataset_dir`.
+  """
+  if cache_dir is None:
+    cache_dir = os.path.join(tempfile.gettempdir(), 'autodl_index')
+  dir_hash = hashlib.sha1(
+      os.path.abspath(dataset_dir).encode('utf-8')).hexdigest()
+  return os.path.join(cache_dir, dir_hash + '_' + INDEX_FILENAME)
+
+
+class TFRecordIndex(object):
+  """Offsets and lengths of all records of a list of TFRecord files.
+
+  Records are numbered in the order of the files, then in the order of the
+  records in each file (i.e. the order of a sequential read).
+  """
+
+  def __init__(self, files, shard_counts, offsets, lengths):
+    self.files_ = list(files)
+    self.shard_counts_ = np.asarray(shard_counts, dtype=np.int64)
+    # Number of records before each shard
+    self.shard_starts_ = np.concatenate([[0], np.cumsum(self.shard_counts_)])
+    self.offsets_ = offsets
+    self.lengths_ = lengths
+
+  def __len__(self):
+    return int(self.shard_starts_[-1])
+
+  def get_files(self):
+    return self.files_
+
+  def locate(self, num):
+    """Returns (file, offset, length) of the data of the `num`-th record."""
+    if num < 0:
+      num += len(self)
+    if not 0 <= num < len(self):
+      raise IndexError("Record index {} out of range for {} records."\
+                       .format(num, len(self)))
+    shard = np.searchsorted(self.shard_starts_, num, side='right') - 1
+    return (self.files_[shard], int(self.offsets_[num]),
+            int(self.lengths_[num]))
+
+  def read_record(self, num):
+    """Returns the data (serialized proto) of the `num`-th record."""
+    path, offset, length = self.locate(num)
+    with open(path, 'rb') as f:
+      f.seek(offset)
+      return f.read(length)
+
+  def read_records(self, start=0, stop=None):
+    """Yields the data of records `start` (included) to `stop` (excluded)."""
+    start, stop, _ = slice(start, stop).indices(len(self))
+    f = None
+    current_path = None
+    try:
+      for num in range(start, stop):
+        path, offset, length = self.locate(num)
+        if path != current_path:
+          if f is not None:
+            f.close()
+          f = open(path, 'rb')
+          current_path = path
+        f.seek(offset)
+        yield f.read(length)
+    finally:
+      if f is not None:
+        f.close()
+
+  def get_shard_range(self, num_shards, shard_index):
+    """Returns (start, stop) of the `shard_index`-th of `num_shards` contiguous
+    slices of the records, e.g. to split them across worker processes."""
+    if not 0 <= shard_index < num_shards:
+      raise ValueError("Invalid shard {} of {}.".format(shard_index,
+                                                        num_shards))
+    start = len(self) * shard_index // num_shards
+    stop = len(self) * (shard_index + 1) // num_shards
+    return start, stop
+
+
+def _files_signature(files):
+  sizes = np.array([os.path.getsize(f) for f in files], dtype=np.int64)
+  mtimes = np.array([os.path.getmtime(f) for f in files], dtype=np.float64)
+  return sizes, mtimes
+
+
+def build_index(files, index_path=None):
+  """Scan `files` and return their TFRecordIndex, saved to `index_path` if
+  given."""
+  scans = [scan_tfrecord_file(f) for f in files]
+  shard_counts = [len(offsets) for offsets, _ in scans]
+  offsets = np.concatenate([np.zeros(0, dtype=np.uint64)] +
+                           [o for o, _ in scans])
+  lengths = np.concatenate([np.zeros(0, dtype=np.uint32)] +
+                           [l for _, l in scans])
+  if index_path:
+    sizes, mtimes = _files_signature(files)
+    index_dir = os.path.dirname(index_path)
+    if index_dir and not os.path.isdir(index_dir):
+      os.makedirs(index_dir)
+    # Write to a temporary file first so that concurrent readers never see
+    # a partial index
+    tmp_path = index_path + '.tmp.' + str(os.getpid())
+    with open(tmp_path, 'wb') as f:
+      np.savez(f, files=np.array([os.path.basename(x) for x in files]),
+               sizes=sizes, mtimes=mtimes, shard_counts=shard_counts,
+               offsets=offsets, lengths=lengths)
+    os.rename(tmp_path, index_path)
+  return TFRecordIndex(files, shard_counts, offsets, lengths)
+
+
+def load_index(files, index_path):
+  """Load the index at `index_path` if it is up to date with `files`, and
+  (re)build it otherwise."""
+  if os.path.isfile(index_path):
+    try:
+      with np.load(index_path) as data:
+        sizes, mtimes = _files_signature(files)
+        if (list(data['files']) == [os.path.basename(x) for x in files] and
+            np.array_equal(data['sizes'], sizes) and
+            np.array_equal(data['mtimes'], mtimes)):
+          return TFRecordIndex(files, data['shard_counts'], data['offsets'],
+                               data['lengths'])
+    except (IOError, ValueError, KeyError):
+      pass # Corrupted index, build it again
+  return build_index(files, index_path)
@@ -25,23 +25,16 @@ from sys import stderr
 from sys import version
 
 import numpy as np
-import scipy as sp
-from sklearn import metrics
-from sklearn.preprocessing import *
+# sklearn, pip and psutil are slow to import and only needed by a few
+# functions (sklearn comparisons, show_version, show_platform), which import
+# them on first use.
 
 swrite = stderr.write
 from os import getcwd as pwd
 
-# get_installed_distributions has gone from pip v10
-try:
-    from pip._internal.utils.misc import get_installed_distributions as lib
-except ImportError:  # pip < 10
-    from pip import get_installed_distributions as lib
-
 from glob import glob
 import platform
-import psutil
-from functools import reduce
+from itertools import islice
 
 if (os.name == "nt"):
     filesep = '\\'
@@ -51,19 +44,78 @@ else:
 
 # ========= Useful functions ==============
 
+# Magic string at the beginning of files in the NumPy .npy (binary) format
+NPY_MAGIC = b'\x93NUMPY'
+
+
+def is_npy_file(filename):
+    ''' True if the file is in the NumPy .npy format, whatever its name'''
+    with open(filename, 'rb') as f:
+        return f.read(len(NPY_MAGIC)) == NPY_MAGIC
+
+
 def read_array(filename):
-    ''' Read array and convert to 2d np arrays '''
-    array = np.loadtxt(filename)
+    ''' Read array and convert to 2d np arrays. Files in the NumPy .npy format
+    (see data_io.write_npy in the ingestion program) are memory-mapped, other
+    files are parsed as text.'''
+    if is_npy_file(filename):
+        array = np.load(filename, mmap_mode='r')
+    else:
+        array = np.loadtxt(filename)
     if len(array.shape) == 1:
         array = array.reshape(-1, 1)
     return array
 
 
+# Default number of rows of the chunks read by the streaming functions
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def iter_array_chunks(filename, chunk_size=DEFAULT_CHUNK_SIZE):
+    ''' Read a 2d array by chunks of (at most) chunk_size rows, as float64
+    numpy arrays, without loading the whole file in memory. Same formats as
+    read_array (NumPy .npy or text).'''
+    if is_npy_file(filename):
+        array = read_array(filename)
+        for begin in range(0, array.shape[0], chunk_size):
+            yield np.array(array[begin:begin + chunk_size], dtype=np.float64)
+        return
+    with open(filename, 'r') as f:
+        lines = (line for line in f if line.strip())  # Skip empty lines
+        while True:
+            chunk_lines = list(islice(lines, chunk_size))
+            if not chunk_lines:
+                return
+            yield np.loadtxt(chunk_lines, ndmin=2)
+
+
+def iter_aligned_chunks(solution_file, prediction_file,
+                        chunk_size=DEFAULT_CHUNK_SIZE):
+    ''' Yield aligned chunks (solution, prediction) of rows of a solution file
+    and of a prediction file. Raise ValueError if their shapes differ.'''
+    solution_chunks = iter_array_chunks(solution_file, chunk_size)
+    prediction_chunks = iter_array_chunks(prediction_file, chunk_size)
+    while True:
+        solution = next(solution_chunks, None)
+        prediction = next(prediction_chunks, None)
+        if solution is None and prediction is None:
+            return
+        if solution is None or prediction is None or\
+           solution.shape != prediction.shape:
+            raise ValueError("Solution and prediction files {} and {} "
+                             "have different shapes.".format(solution_file,
+                                                             prediction_file))
+        yield solution, prediction
+
+
 def sanitize_array(array):
-    ''' Replace NaN and Inf (there should not be any!)'''
+    ''' Replace NaN and Inf (there should not be any!), in place'''
+    # maxi and mini are the max and min of the masks (x != inf) and
+    # (x != -inf), i.e. +Inf becomes 1 (0 if all values are +Inf), -Inf
+    # becomes 0 and NaN becomes 0.5: the scores depend on these values
     a = np.ravel(array)
-    maxi = np.nanmax((list(map(lambda x: x != float('inf'), a))))  # Max except NaN and Inf
-    mini = np.nanmin((list(map(lambda x: x != float('-inf'), a))))  # Mini except NaN and Inf
+    maxi = np.nanmax(a != float('inf'))  # Max except NaN and Inf
+    mini = np.nanmin(a != float('-inf'))  # Mini except NaN and Inf
     array[array == float('inf')] = maxi
     array[array == float('-inf')] = mini
     mid = (maxi + mini) / 2
@@ -78,9 +130,11 @@ def normalize_array(solution, prediction):
     In principle, this should not do anything to properly formatted
     classification inputs and outputs.'''
     # Binarize solution
+    # As in sanitize_array, maxi and mini are the max and min of masks, so
+    # that finite solutions and predictions are returned unchanged
     sol = np.ravel(solution)  # convert to 1-d array
-    maxi = np.nanmax((list(map(lambda x: x != float('inf'), sol))))  # Max except NaN and Inf
-    mini = np.nanmin((list(map(lambda x: x != float('-inf'), sol))))  # Mini except NaN and Inf
+    maxi = np.nanmax(sol != float('inf'))  # Max except NaN and Inf
+    mini = np.nanmin(sol != float('-inf'))  # Mini except NaN and Inf
     if maxi == mini:
         print('Warning, cannot normalize')
         return [solution, prediction]
@@ -98,33 +152,61 @@ def normalize_array(solution, prediction):
     return [new_solution, new_prediction]
 
 
-def binarize_predictions(array, task='binary.classification'):
+def binarize_predictions(array, task='binary.classification',
+                         dtype=np.float64):
     ''' Turn predictions into decisions {0,1} by selecting the class with largest
-    score for multiclass problems and thresholding at 0.5 for other cases.'''
+    score for multiclass problems and thresholding at 0.5 for other cases.
+    Use dtype=bool for a compact boolean matrix (accepted by acc_stat and
+    ConfusionStatistics).'''
     # add a very small random value as tie breaker (a bit bad because this changes the score every time)
     # so to make sure we get the same result every time, we seed it
     # eps = 1e-15
     # np.random.seed(sum(array.shape))
     # array = array + eps*np.random.rand(array.shape[0],array.shape[1])
-    bin_array = np.zeros(array.shape)
     if (task != 'multiclass.classification') or (array.shape[1] == 1):
-        bin_array[array >= 0.5] = 1
-    else:
-        sample_num = array.shape[0]
-        for i in range(sample_num):
-            j = np.argmax(array[i, :])
-            bin_array[i, j] = 1
+        return (array >= 0.5).astype(dtype)
+    bin_array = np.zeros(array.shape, dtype=dtype)
+    sample_num = array.shape[0]
+    bin_array[np.arange(sample_num), np.argmax(array, axis=1)] = 1
     return bin_array
 
 
+def as_boolean_if_binary(array):
+    ''' Return array as a boolean array if all its values are 0 or 1 (e.g. a
+    classification solution), array itself otherwise.'''
+    array = np.asarray(array)
+    if array.dtype != bool and np.all((array == 0) | (array == 1)):
+        return array.astype(bool)
+    return array
+
+
+def complement(array):
+    ''' 1 - array, also for boolean arrays (NOT array).'''
+    return ~array if array.dtype == bool else 1 - array
+
+
 def acc_stat(solution, prediction):
     ''' Return accuracy statistics TN, FP, TP, FN
-     Assumes that solution and prediction are binary 0/1 vectors.'''
+     Assumes that solution and prediction are binary 0/1 vectors, possibly
+     boolean arrays (see binarize_predictions and as_boolean_if_binary).'''
     # This uses floats so the results are floats
-    TN = sum(np.multiply((1 - solution), (1 - prediction)))
-    FN = sum(np.multiply(solution, (1 - prediction)))
-    TP = sum(np.multiply(solution, prediction))
-    FP = sum(np.multiply((1 - solution), prediction))
+    # (the values are 0 or 1, so the sums are exact)
+    solution = np.asarray(solution)
+    prediction = np.asarray(prediction)
+    if solution.dtype == bool and prediction.dtype == bool:
+        # Count, without float temporaries
+        def count(array):
+            return np.count_nonzero(array, axis=0).astype(np.float64)
+        not_solution = ~solution
+        not_prediction = ~prediction
+        return (count(not_solution & not_prediction),
+                count(not_solution & prediction),
+                count(solution & prediction),
+                count(solution & not_prediction))
+    TN = np.sum(np.multiply(complement(solution), complement(prediction)), axis=0)
+    FN = np.sum(np.multiply(solution, complement(prediction)), axis=0)
+    TP = np.sum(np.multiply(solution, prediction), axis=0)
+    FP = np.sum(np.multiply(complement(solution), prediction), axis=0)
     # print "TN =",TN
     # print "FP =",FP
     # print "TP =",TP
@@ -132,49 +214,145 @@ def acc_stat(solution, prediction):
     return (TN, FP, TP, FN)
 
 
+class ConfusionStatistics(object):
+    ''' Per-class confusion statistics TN, FP, TP, FN (see acc_stat) and
+    accuracy, accumulated over chunks of rows of the solution and of the
+    prediction. Memory use is O(chunk size x number of classes).
+    Each statistic is the column sum of an elementwise product, as in
+    acc_stat, and the rows of all chunks are added in order, so that the
+    results are the same as those of acc_stat on all rows at once.'''
+
+    def __init__(self, dtype=np.float64, compute_accuracy=False):
+        ''' dtype: type of the solution and prediction chunks, e.g.
+        np.float32 to avoid upcasting float32 predictions (products and sums
+        are computed in float64). compute_accuracy: if True, also accumulate
+        the accuracy.'''
+        self.dtype = dtype
+        self.compute_accuracy = compute_accuracy
+        self.sample_num = 0
+        self.tn = 0
+        self.fp = 0
+        self.tp = 0
+        self.fn = 0
+        self.accuracy_sum = 0
+
+    def update(self, solution, prediction):
+        ''' Add a chunk of rows of the solution and of the prediction. If both
+        are boolean arrays, the statistics are counted (same results).'''
+        solution = np.asarray(solution)
+        prediction = np.asarray(prediction)
+        if solution.dtype == bool and prediction.dtype == bool:
+            self._update_counts(solution, prediction)
+            return
+        solution = np.asarray(solution, dtype=self.dtype)
+        prediction = np.asarray(prediction, dtype=self.dtype)
+        not_solution = 1 - solution
+        not_prediction = 1 - prediction
+        # Products are written after a first row holding the statistic of the
+        # previous chunks: np.sum along axis 0 then adds all rows in order
+        buffer = np.empty((solution.shape[0] + 1, solution.shape[1]))
+        product = buffer[1:]
+
+        def add_column_sums(total):
+            buffer[0] = total
+            if buffer.shape[1] == 1:
+                # A single column is summed along the fast axis in memory,
+                # with pairwise summation: accumulate (in place) instead
+                return np.add.accumulate(buffer, axis=0, out=buffer)[-1].copy()
+            return np.sum(buffer, axis=0)
+
+        np.multiply(solution, prediction, out=product)
+        if self.compute_accuracy:
+            # Accuracy of predictions normalized to sum to 1 on each row
+            epsilon = 1e-15
+            row_norms = np.sum(np.abs(prediction), axis=1, dtype=np.float64)
+            self.accuracy_sum += np.sum(np.sum(product, axis=1) /
+                                        (row_norms + epsilon))
+        self.tp = add_column_sums(self.tp)
+        np.multiply(not_solution, not_prediction, out=product)
+        self.tn = add_column_sums(self.tn)
+        np.multiply(solution, not_prediction, out=product)
+        self.fn = add_column_sums(self.fn)
+        np.multiply(not_solution, prediction, out=product)
+        self.fp = add_column_sums(self.fp)
+        self.sample_num += solution.shape[0]
+
+    def _update_counts(self, solution, prediction):
+        ''' update for boolean solution and prediction.'''
+        tn, fp, tp, fn = acc_stat(solution, prediction)
+        self.tn = self.tn + tn
+        self.fp = self.fp + fp
+        self.tp = self.tp + tp
+        self.fn = self.fn + fn
+        if self.compute_accuracy:
+            epsilon = 1e-15
+            row_norms = np.count_nonzero(prediction, axis=1).astype(np.float64)
+            self.accuracy_sum += np.sum(
+                np.count_nonzero(solution & prediction, axis=1) /
+                (row_norms + epsilon))
+        self.sample_num += solution.shape[0]
+
+    def acc_stat(self):
+        ''' Return accuracy statistics TN, FP, TP, FN, like acc_stat.'''
+        return (self.tn, self.fp, self.tp, self.fn)
+
+    def accuracy(self):
+        ''' Accuracy, assuming one-hot solutions (multiclass).'''
+        if not self.compute_accuracy:
+            raise ValueError("Accuracy was not computed.")
+        return self.accuracy_sum / max(self.sample_num, 1)
+
+
 def tiedrank(a):
     ''' Return the ranks (with base 1) of a list resolving ties by averaging.
      This works for numpy arrays.'''
-    m = len(a)
-    # Sort a in ascending order (sa=sorted vals, i=indices)
-    i = a.argsort()
-    sa = a[i]
-    # Find unique values
-    uval = np.unique(a)
-    # Test whether there are ties
-    R = np.arange(m, dtype=float) + 1  # Ranks with base 1
-    if len(uval) != m:
-        # Average the ranks for the ties
-        oldval = sa[0]
-        newval = sa[0]
-        k0 = 0
-        for k in range(1, m):
-            newval = sa[k]
-            if newval == oldval:
-                # moving average
-                R[k0:k + 1] = R[k - 1] * (k - k0) / (k - k0 + 1) + R[k] / (k - k0 + 1)
-            else:
-                k0 = k;
-                oldval = newval
-    # Invert the index
-    S = np.empty(m)
-    S[i] = R
-    return S
+    # Each unique value gets the average of the ranks of its occurrences:
+    # ranks from (number of smaller values + 1) to (that + its count)
+    uval, inverse, counts = np.unique(a, return_inverse=True,
+                                      return_counts=True)
+    last_ranks = np.cumsum(counts)
+    average_ranks = last_ranks - (counts - 1) / 2.
+    return average_ranks[inverse.ravel()]
+
+
+def tiedrank_2d(A):
+    ''' Return the ranks (with base 1) of the values of each column of a 2d
+    array, resolving ties by averaging (same as tiedrank on each column, but
+    all columns at once).'''
+    # Work on rows of the transpose, contiguous in memory
+    At = np.ascontiguousarray(np.asarray(A).T)
+    n, m = At.shape
+    if m == 0:
+        return np.empty((m, n))
+    order = np.argsort(At, axis=1, kind='mergesort')
+    rows = np.arange(n).reshape(-1, 1)
+    sorted_At = At[rows, order]
+    positions = np.arange(m)
+    # First and last position (in sorted order) of the group of ties of each
+    # value
+    is_first = np.ones((n, m), dtype=bool)
+    is_first[:, 1:] = sorted_At[:, 1:] != sorted_At[:, :-1]
+    first = np.maximum.accumulate(np.where(is_first, positions, 0), axis=1)
+    is_last = np.ones((n, m), dtype=bool)
+    is_last[:, :-1] = is_first[:, 1:]
+    last = np.minimum.accumulate(np.where(is_last, positions, m - 1)[:, ::-1],
+                                 axis=1)[:, ::-1]
+    Rt = np.empty((n, m))
+    Rt[rows, order] = (first + last) / 2. + 1
+    return Rt.T
 
 
 def mvmean(R, axis=0):
-    ''' Moving average to avoid rounding errors. A bit slow, but...
+    ''' Mean computed with pairwise summation to avoid rounding errors.
     Computes the mean along the given axis, except if this is a vector, in which case the mean is returned.
     Does NOT flatten.'''
-    if len(R.shape) == 0: return R
-    average = lambda x: reduce(lambda i, j: (0, (j[0] / (j[0] + 1.)) * i[1] + (1. / (j[0] + 1)) * j[1]), enumerate(x))[
-        1]
-    R = np.array(R)
-    if len(R.shape) == 1: return average(R)
-    if axis == 1:
-        return np.array(map(average, R))
-    else:
-        return np.array(map(average, R.transpose()))
+    if len(np.shape(R)) == 0: return R
+    R = np.asarray(R, dtype=np.float64)
+    if len(R.shape) > 1:
+        # numpy sums with pairwise summation (error O(log n) instead of O(n)
+        # ulps) along a contiguous axis only: move the axis last and copy
+        R = np.ascontiguousarray(np.moveaxis(R, axis, -1))
+    return np.sum(R, axis=-1) / R.shape[-1]
 
 
 # ======= Default metrics ========
@@ -246,17 +424,23 @@ def bac_metric(solution, prediction, task='binary.classification'):
     ''' Compute the normalized balanced accuracy. The binarization and
     the normalization differ for the multi-label and multi-class case. '''
     label_num = solution.shape[1]
-    score = np.zeros(label_num)
-    bin_prediction = binarize_predictions(prediction, task)
-    [tn, fp, tp, fn] = acc_stat(solution, bin_prediction)
+    bin_prediction = binarize_predictions(prediction, task, dtype=bool)
+    return bac_from_acc_stat(acc_stat(solution, bin_prediction), label_num,
+                             task)
+
+
+def bac_from_acc_stat(stats, label_num, task='binary.classification'):
+    ''' Normalized balanced accuracy from the accuracy statistics
+    (TN, FP, TP, FN) of binarized predictions, see bac_metric.'''
+    [tn, fp, tp, fn] = stats
     # Bounding to avoid division by 0
     eps = 1e-15
-    tp = sp.maximum(eps, tp)
-    pos_num = sp.maximum(eps, tp + fn)
+    tp = np.maximum(eps, tp)
+    pos_num = np.maximum(eps, tp + fn)
     tpr = tp / pos_num  # true positive rate (sensitivity)
     if (task != 'multiclass.classification') or (label_num == 1):
-        tn = sp.maximum(eps, tn)
-        neg_num = sp.maximum(eps, tn + fp)
+        tn = np.maximum(eps, tn)
+        neg_num = np.maximum(eps, tn + fp)
         tnr = tn / neg_num  # true negative rate (specificity)
         bac = 0.5 * (tpr + tnr)
         base_bac = 0.5  # random predictions for binary case
@@ -265,7 +449,7 @@ def bac_metric(solution, prediction, task='binary.classification'):
         base_bac = 1. / label_num  # random predictions for multiclass case
     bac = mvmean(bac)  # average over all classes
     # Normalize: 0 for random, 1 for perfect
-    score = (bac - base_bac) / sp.maximum(eps, (1 - base_bac))
+    score = (bac - base_bac) / np.maximum(eps, (1 - base_bac))
     return score
 
 
@@ -293,13 +477,20 @@ def pac_metric(solution, prediction, task='binary.classification'):
         if len(diff.shape) > 0: diff = max(diff)
         if (diff) > 1e-10:
             print('Arrggh {} != {}'.format(the_base_log_loss, base_log_loss))
+    return pac_from_log_loss(the_log_loss, the_base_log_loss)
+
+
+def pac_from_log_loss(the_log_loss, the_base_log_loss):
+    ''' Normalized probabilistic accuracy from the log loss of the prediction
+    and the log loss of the prior probabilities, see pac_metric.'''
+    eps = 1e-15
     # Exponentiate to turn into an accuracy-like score.
     # In the multi-label case, we need to average AFTER taking the exp
     # because it is an NL operation
     pac = mvmean(np.exp(-the_log_loss))
     base_pac = mvmean(np.exp(-the_base_log_loss))
     # Normalize: 0 for random, 1 for perfect
-    score = (pac - base_pac) / sp.maximum(eps, (1 - base_pac))
+    score = (pac - base_pac) / np.maximum(eps, (1 - base_pac))
     return score
 
 
@@ -309,17 +500,23 @@ def f1_metric(solution, prediction, task='binary.classification'):
         A non-weighted average over classes is taken.
         The score is normalized.'''
     label_num = solution.shape[1]
-    score = np.zeros(label_num)
-    bin_prediction = binarize_predictions(prediction, task)
-    [tn, fp, tp, fn] = acc_stat(solution, bin_prediction)
+    bin_prediction = binarize_predictions(prediction, task, dtype=bool)
+    return f1_from_acc_stat(acc_stat(solution, bin_prediction), label_num,
+                            task)
+
+
+def f1_from_acc_stat(stats, label_num, task='binary.classification'):
+    ''' Normalized f1 measure from the accuracy statistics (TN, FP, TP, FN)
+    of binarized predictions, see f1_metric.'''
+    [tn, fp, tp, fn] = stats
     # Bounding to avoid division by 0
     eps = 1e-15
-    true_pos_num = sp.maximum(eps, tp + fn)
-    found_pos_num = sp.maximum(eps, tp + fp)
-    tp = sp.maximum(eps, tp)
+    true_pos_num = np.maximum(eps, tp + fn)
+    found_pos_num = np.maximum(eps, tp + fp)
+    tp = np.maximum(eps, tp)
     tpr = tp / true_pos_num  # true positive rate (recall)
     ppv = tp / found_pos_num  # positive predictive value (precision)
-    arithmetic_mean = 0.5 * sp.maximum(eps, tpr + ppv)
+    arithmetic_mean = 0.5 * np.maximum(eps, tpr + ppv)
     # Harmonic mean:
     f1 = tpr * ppv / arithmetic_mean
     # Average over all classes
@@ -344,33 +541,104 @@ def f1_metric(solution, prediction, task='binary.classification'):
     # tpr=ppv=frac_pos, where frac_pos=1/label_num
     else:
         base_f1 = 1. / label_num
-    score = (f1 - base_f1) / sp.maximum(eps, (1 - base_f1))
+    score = (f1 - base_f1) / np.maximum(eps, (1 - base_f1))
     return score
 
 
-def auc_metric(solution, prediction, task='binary.classification'):
+def auc_metric(solution, prediction, task='binary.classification',
+               num_threads=None):
     ''' Normarlized Area under ROC curve (AUC).
     Return Gini index = 2*AUC-1 for  binary classification problems.
     Should work for a vector of binary 0/1 (or -1/1)"solution" and any discriminant values
     for the predictions. If solution and prediction are not vectors, the AUC
     of the columns of the matrices are computed and averaged (with no weight).
     The same for all classification problems (in fact it treats well only the
-    binary and multilabel classification problems).'''
+    binary and multilabel classification problems).
+    num_threads: if given, columns are shared between this number of threads.'''
     # auc = metrics.roc_auc_score(solution, prediction, average=None)
     # There is a bug in metrics.roc_auc_score: auc([1,0,0],[1e-10,0,0]) incorrect
+    solution = np.asarray(solution)
+    prediction = np.asarray(prediction)
     label_num = solution.shape[1]
-    auc = np.empty(label_num)
-    for k in range(label_num):
-        r_ = tiedrank(prediction[:, k])
-        s_ = solution[:, k]
-        if sum(s_) == 0: print('WARNING: no positive class example in class {}'.format(k + 1))
-        npos = sum(s_ == 1)
-        nneg = sum(s_ < 1)
-        auc[k] = (sum(r_[s_ == 1]) - npos * (npos + 1) / 2) / (nneg * npos)
-        # print('AUC[%d]=' % k + '%5.2f' % auc[k])
+    warn_no_positive(solution)
+    if num_threads and num_threads > 1 and label_num > 1:
+        # Shard the columns across threads (sorting releases the GIL)
+        from multiprocessing.pool import ThreadPool
+        bounds = np.linspace(0, label_num, min(num_threads, label_num) + 1)
+        bounds = bounds.astype(int)
+        pool = ThreadPool(len(bounds) - 1)
+        try:
+            aucs = pool.map(lambda b: auc_columns(solution[:, b[0]:b[1]],
+                                                  prediction[:, b[0]:b[1]]),
+                            list(zip(bounds[:-1], bounds[1:])))
+        finally:
+            pool.close()
+        auc = np.concatenate(aucs)
+    else:
+        auc = auc_columns(solution, prediction)
     return 2 * mvmean(auc) - 1
 
 
+def warn_no_positive(solution):
+    ''' Print a warning listing the classes without positive example.'''
+    no_positive = np.flatnonzero(np.sum(solution, axis=0) == 0)
+    if len(no_positive) > 0:
+        print('WARNING: no positive class example in class(es) {}'.format(
+            ', '.join(str(k + 1) for k in no_positive)))
+
+
+def auc_columns(solution, prediction, ranks=None):
+    ''' AUC of each column, from the ranks of the predictions (all columns
+    ranked at once, see tiedrank_2d, unless given): the sum of the ranks of
+    the positive examples, minus its minimum, divided by the number of
+    (positive, negative) pairs. NaN or Inf for columns without positive or
+    negative examples.'''
+    if ranks is None:
+        ranks = tiedrank_2d(prediction)
+    positive = (solution == 1)
+    npos = np.sum(positive, axis=0)
+    nneg = np.sum(solution < 1, axis=0)
+    rank_sum = np.sum(np.where(positive, ranks, 0), axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (rank_sum - npos * (npos + 1) / 2) / (nneg * npos)
+
+
+### STREAMING CLASSIFICATION METRICS (work on files, by chunks of rows)
+# Same results as the metrics above, for solutions and predictions that do not
+# fit in memory. AUC and PAC need all rows at once and are not available.
+
+def stream_acc_stat(solution_file, prediction_file,
+                    task='binary.classification', chunk_size=DEFAULT_CHUNK_SIZE):
+    ''' Return the ConfusionStatistics of the binarized predictions of a
+    prediction file, and the number of classes.'''
+    stats = ConfusionStatistics()
+    label_num = 0
+    for solution, prediction in iter_aligned_chunks(solution_file,
+                                                    prediction_file,
+                                                    chunk_size):
+        stats.update(as_boolean_if_binary(solution),
+                     binarize_predictions(prediction, task, dtype=bool))
+        label_num = solution.shape[1]
+    return stats, label_num
+
+
+def bac_metric_streaming(solution_file, prediction_file,
+                         task='binary.classification',
+                         chunk_size=DEFAULT_CHUNK_SIZE):
+    ''' bac_metric of a prediction file, computed by chunks of rows.'''
+    stats, label_num = stream_acc_stat(solution_file, prediction_file, task,
+                                       chunk_size)
+    return bac_from_acc_stat(stats.acc_stat(), label_num, task)
+
+
+def f1_metric_streaming(solution_file, prediction_file,
+                        task='binary.classification',
+                        chunk_size=DEFAULT_CHUNK_SIZE):
+    ''' f1_metric of a prediction file, computed by chunks of rows.'''
+    stats, label_num = stream_acc_stat(solution_file, prediction_file, task,
+                                       chunk_size)
+    return f1_from_acc_stat(stats.acc_stat(), label_num, task)
+
 ### END CLASSIFICATION METRICS
 
 # ======= Specialized scores ========
@@ -417,13 +685,13 @@ def log_loss(solution, prediction, task='binary.classification'):
         # Make sure the lines add up to one for multi-class classification
         norma = np.sum(prediction, axis=1)
         for k in range(sample_num):
-            pred[k, :] /= sp.maximum(norma[k], eps)
+            pred[k, :] /= np.maximum(norma[k], eps)
             # Make sure there is a single label active per line for multi-class classification
         sol = binarize_predictions(solution, task='multiclass.classification')
         # For the base prediction, this solution is ridiculous in the multi-label case
 
     # Bounding of predictions to avoid log(0),1/0,...
-    pred = sp.minimum(1 - eps, sp.maximum(eps, pred))
+    pred = np.minimum(1 - eps, np.maximum(eps, pred))
     # Compute the log loss
     pos_class_log_loss = - mvmean(sol * np.log(pred), axis=0)
     if (task != 'multiclass.classification') or (label_num == 1):
@@ -449,10 +717,10 @@ def log_loss(solution, prediction, task='binary.classification'):
 def prior_log_loss(frac_pos, task='binary.classification'):
     ''' Baseline log loss. For multiplr classes ot labels return the volues for each column'''
     eps = 1e-15
-    frac_pos_ = sp.maximum(eps, frac_pos)
+    frac_pos_ = np.maximum(eps, frac_pos)
     if (task != 'multiclass.classification'):  # binary case
         frac_neg = 1 - frac_pos
-        frac_neg_ = sp.maximum(eps, frac_neg)
+        frac_neg_ = np.maximum(eps, frac_neg)
         pos_class_log_loss_ = - frac_pos * np.log(frac_pos_)
         neg_class_log_loss_ = - frac_neg * np.log(frac_neg_)
         base_log_loss = pos_class_log_loss_ + neg_class_log_loss_
@@ -470,19 +738,23 @@ def prior_log_loss(frac_pos, task='binary.classification'):
 
 # sklearn implementations for comparison
 def log_loss_(solution, prediction):
+    from sklearn import metrics
     return metrics.log_loss(solution, prediction)
 
 
 def r2_score_(solution, prediction):
+    from sklearn import metrics
     return metrics.r2_score(solution, prediction)
 
 
 def a_score_(solution, prediction):
+    from sklearn import metrics
     mad = float(mvmean(abs(solution - mvmean(solution))))
     return 1 - metrics.mean_absolute_error(solution, prediction) / mad
 
 
 def auc_score_(solution, prediction):
+    from sklearn import metrics
     auc = metrics.roc_auc_score(solution, prediction, average=None)
     return mvmean(auc)
 
@@ -568,12 +840,18 @@ def show_version(scoring_version):
     swrite("Python version: " + version + "\n\n")
     # Give information on the version installed
     swrite("Versions of libraries installed:\n")
+    # get_installed_distributions has gone from pip v10
+    try:
+        from pip._internal.utils.misc import get_installed_distributions as lib
+    except ImportError:  # pip < 10
+        from pip import get_installed_distributions as lib
     map(swrite, sorted(["%s==%s\n" % (i.key, i.version) for i in lib()]))
 
 
 def show_platform():
     ''' Show information on platform'''
     swrite('\n=== SYSTEM ===\n\n')
+    import psutil
     try:
         linux_distribution = platform.linux_distribution()
     except:
@@ -603,32 +881,110 @@ def show_platform():
     ))
 
 
+class MetricEngine(object):
+    ''' Compute the classification scores of one (solution, prediction) pair,
+    computing each intermediate result they share only once, on first use:
+    binarized predictions and accuracy statistics (BAC and F1), ranks of the
+    columns of the prediction (AUC), class priors and log losses (PAC).
+    Scores are the same as those of bac_metric, f1_metric, auc_metric and
+    pac_metric. The solution and the prediction are assumed normalized (see
+    normalize_array).'''
+
+    def __init__(self, solution, prediction):
+        self.solution = np.asarray(solution)
+        self.prediction = np.asarray(prediction)
+        [self.sample_num, self.label_num] = self.solution.shape
+        self.cache = {}
+
+    def _cached(self, key, function, *args):
+        if key not in self.cache:
+            self.cache[key] = function(*args)
+        return self.cache[key]
+
+    def _binarization(self, task):
+        ''' binarize_predictions treats all tasks as binary.classification,
+        except multiclass.classification with several columns.'''
+        if task == 'multiclass.classification' and self.label_num > 1:
+            return task
+        return 'binary.classification'
+
+    def bin_prediction(self, task='binary.classification'):
+        task = self._binarization(task)
+        return self._cached(('bin_prediction', task), binarize_predictions,
+                            self.prediction, task, bool)
+
+    def binary_solution(self):
+        ''' The solution as a boolean array if it is binary, so that acc_stat
+        counts instead of multiplying floats.'''
+        return self._cached('binary_solution', as_boolean_if_binary,
+                            self.solution)
+
+    def acc_stat(self, task='binary.classification'):
+        task = self._binarization(task)
+        return self._cached(('acc_stat', task), acc_stat,
+                            self.binary_solution(), self.bin_prediction(task))
+
+    def ranks(self):
+        return self._cached('ranks', tiedrank_2d, self.prediction)
+
+    def frac_pos(self):
+        ''' Prior probability of the positive class of each column.'''
+        return self._cached('frac_pos', lambda: 1. * np.sum(self.solution,
+                                                            axis=0) /
+                                                self.sample_num)
+
+    def log_loss(self, task='binary.classification'):
+        task = self._binarization(task)
+        return self._cached(('log_loss', task), log_loss, self.solution,
+                            self.prediction, task)
+
+    def prior_log_loss(self, task='binary.classification'):
+        task = self._binarization(task)
+        return self._cached(('prior_log_loss', task), prior_log_loss,
+                            self.frac_pos(), task)
+
+    def bac(self, task='binary.classification'):
+        return bac_from_acc_stat(self.acc_stat(task), self.label_num, task)
+
+    def f1(self, task='binary.classification'):
+        return f1_from_acc_stat(self.acc_stat(task), self.label_num, task)
+
+    def auc(self):
+        warn_no_positive(self.solution)
+        return 2 * mvmean(auc_columns(self.solution, self.prediction,
+                                      ranks=self.ranks())) - 1
+
+    def pac(self, task='binary.classification'):
+        return pac_from_log_loss(self.log_loss(task),
+                                 self.prior_log_loss(task))
+
+
 def compute_all_scores(solution, prediction):
     ''' Compute all the scores and return them as a dist'''
     missing_score = -0.999999
-    scoring = {'BAC (multilabel)': nbac_binary_score,
-               'BAC (multiclass)': nbac_multiclass_score,
-               'F1  (multilabel)': f1_binary_score,
-               'F1  (multiclass)': f1_multiclass_score,
-               'Regression ABS  ': a_metric,
-               'Regression R2   ': r2_metric,
-               'AUC (multilabel)': auc_metric,
-               'PAC (multilabel)': npac_binary_score,
-               'PAC (multiclass)': npac_multiclass_score}
     # Normalize/sanitize inputs
     [csolution, cprediction] = normalize_array(solution, prediction)
     solution = sanitize_array(solution);
     prediction = sanitize_array(prediction)
+    # Classification scores share their intermediate results
+    engine = MetricEngine(csolution, cprediction)
+    binary = 'binary.classification'
+    multiclass = 'multiclass.classification'
+    scoring = {'BAC (multilabel)': lambda: engine.bac(binary),
+               'BAC (multiclass)': lambda: engine.bac(multiclass),
+               'F1  (multilabel)': lambda: engine.f1(binary),
+               'F1  (multiclass)': lambda: engine.f1(multiclass),
+               'Regression ABS  ': lambda: a_metric(solution, prediction),
+               'Regression R2   ': lambda: r2_metric(solution, prediction),
+               'AUC (multilabel)': engine.auc,
+               'PAC (multilabel)': lambda: engine.pac(binary),
+               'PAC (multiclass)': lambda: engine.pac(multiclass)}
     # Compute all scores
     score_names = sorted(scoring.keys())
     scores = {}
     for key in score_names:
-        scoring_func = scoring[key]
         try:
-            if key == 'Regression R2   ' or key == 'Regression ABS  ':
-                scores[key] = scoring_func(solution, prediction)
-            else:
-                scores[key] = scoring_func(csolution, cprediction)
+            scores[key] = scoring[key]()
         except:
             scores[key] = missing_score
     return scores
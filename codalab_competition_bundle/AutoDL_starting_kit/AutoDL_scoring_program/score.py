@@ -18,29 +18,35 @@
 # program in parallel. So we need to know how long ingestion program will run.
 TIME_BUDGET = 7200
 
+# If set, the solution and the predictions are read and scored by chunks of
+# this number of rows (streaming), so that memory use does not grow with the
+# number of test examples. Useful for test sets that do not fit in memory.
+SCORING_CHUNK_SIZE = None
+
 # Some libraries and options
 import os
 import sys
 from sys import argv
 from os import getcwd as pwd
 import shutil
+import io
+import json
+import select
+import struct
+import threading
+from fnmatch import fnmatch
+import time
+overall_start = time.time()         # <== Mark starting time
 
-# Solve the Tkinter display issue of matplotlib.pyplot
-import matplotlib
-matplotlib.use('Agg')
-
-import matplotlib.pyplot as plt
+# matplotlib (to draw learning curves) and base64 (to show images in
+# scores.html) are imported on first use: they are slow to import and not
+# needed before the first prediction is found.
 import numpy as np
-import time
 import datetime
 
-# To compute area under learning curve
-from sklearn.metrics import auc
-
-from libscores import read_array, sp, ls, mvmean
-
-# Convert images to Base64 to show in scores.html
-import base64
+from libscores import read_array, ls, mvmean, iter_array_chunks,\
+                      iter_aligned_chunks, ConfusionStatistics,\
+                      DEFAULT_CHUNK_SIZE
 
 # Libraries for reconstructing the model
 
@@ -71,41 +77,51 @@ missing_score = -0.999999
 scoring_version = 1.0
 
 # Metric used to compute the score of a point on the learning curve
-def autodl_bac(solution, prediction):
+def autodl_bac(solution, prediction, dtype=np.float64,
+               chunk_size=DEFAULT_CHUNK_SIZE):
   """Compute the normalized balanced accuracy.
 
+  The confusion matrix statistics of each class are the column sums of the
+  elementwise products of the solution and of the prediction (and of their
+  complements), written one at a time in a single temporary, see
+  libscores.ConfusionStatistics. The rows are added in order, by chunks or
+  not, so that the score is exactly that of the sums over all rows.
+
   Args:
     solution: numpy.ndarray of shape (num_examples, num_classes), in this first
         edition of AutoDL challenge, all entries will be 0 or 1.
     prediction: numpy.ndarray of shape (num_examples, num_classes). Prediction
         made by Model.test(). All entries should be between 0 and 1.
+    dtype: type of the solution and of the prediction, e.g. np.float32 for
+        predictions stored in float32 (see data_io.write_npy), to avoid
+        upcasting them. Products and sums are always computed in float64.
+    chunk_size: number of rows processed at a time, to bound memory use (all
+        rows at once if None). The score does not depend on it.
   Returns:
     score: a float representing the normalized balanced accuracy, i.e. 2*BAC - 1
         where BAC is the balanced accuracy ( (TPR+TNR)/2 ) over all classes.
   """
-  label_num = solution.shape[1]
-  score = np.zeros(label_num)
-  binarize=False
-  if binarize:
-    # Binarize prediction by thresholding at 0.5 (assumes predictions are like probabilities; we can also threshold at 0 if we want but we need to let the participants know)
-    bin_prediction = np.zeros(prediction.shape)
-    threshold = 0.5
-    bin_prediction[prediction >= threshold] = 1
-  else:
-    # Participant's prediction is already binary (or at least in [0,1])
-    bin_prediction = prediction
-  # Compute the confusion matrix statistics
-  tn = sum(np.multiply((1 - solution), (1 - bin_prediction)))
-  fn = sum(np.multiply(solution, (1 - bin_prediction)))
-  tp = sum(np.multiply(solution, bin_prediction))
-  fp = sum(np.multiply((1 - solution), bin_prediction))
+  num_examples = solution.shape[0]
+  if not chunk_size:
+    chunk_size = max(num_examples, 1)
+  # Participant's prediction is used as is (should be binary or in [0,1])
+  stats = ConfusionStatistics(dtype=dtype)
+  for begin in range(0, num_examples, chunk_size):
+    stats.update(solution[begin:begin + chunk_size],
+                 prediction[begin:begin + chunk_size])
+  return autodl_bac_from_stats(stats)
+
+def autodl_bac_from_stats(stats):
+  """Compute the normalized balanced accuracy from the confusion statistics
+  accumulated in a libscores.ConfusionStatistics object, see autodl_bac."""
+  tn, fp, tp, fn = stats.acc_stat()
   # Bounding to avoid division by 0
   eps = 1e-15
-  tp = sp.maximum(eps, tp)
-  pos_num = sp.maximum(eps, tp + fn)
+  tp = np.maximum(eps, tp)
+  pos_num = np.maximum(eps, tp + fn)
   tpr = tp / pos_num  # true positive rate (sensitivity)
-  tn = sp.maximum(eps, tn)
-  neg_num = sp.maximum(eps, tn + fp)
+  tn = np.maximum(eps, tn)
+  neg_num = np.maximum(eps, tn + fp)
   tnr = tn / neg_num  # true negative rate (specificity)
   # Compute bac
   bac = 0.5 * (tpr + tnr)
@@ -114,6 +130,22 @@ def autodl_bac(solution, prediction):
   score = 2*bac - 1
   return score
 
+def score_by_chunks(solution_file, prediction_file, is_multiclass_task,
+                    chunk_size):
+  """Compute autodl_bac (and the accuracy for multi-class tasks) of a
+  prediction file, reading it and the solution file by chunks of rows.
+
+  Returns:
+    (score, accuracy), accuracy being None if not `is_multiclass_task`.
+  """
+  stats = ConfusionStatistics(compute_accuracy=is_multiclass_task)
+  for solution, prediction in iter_aligned_chunks(solution_file,
+                                                  prediction_file,
+                                                  chunk_size):
+    stats.update(solution, prediction)
+  acc = stats.accuracy() if is_multiclass_task else None
+  return autodl_bac_from_stats(stats), acc
+
 def is_one_hot_vector(x, axis=None, keepdims=False):
   norm_1 = np.linalg.norm(x, ord=1, axis=axis, keepdims=keepdims)
   norm_inf = np.linalg.norm(x, ord=np.inf, axis=axis, keepdims=keepdims)
@@ -128,6 +160,11 @@ def is_multiclass(solution):
   """
   return all(is_one_hot_vector(solution, axis=1))
 
+def is_multiclass_file(solution_file, chunk_size):
+  """Same as is_multiclass, reading the solution file by chunks of rows."""
+  return all(is_multiclass(solution)
+             for solution in iter_array_chunks(solution_file, chunk_size))
+
 def accuracy(solution, prediction):
   # assert(is_multiclass(solution))
   epsilon = 1e-15
@@ -146,6 +183,115 @@ def get_prediction_files(prediction_dir, basename, start):
   prediction_files = [f for f in prediction_files if os.path.getmtime(f)> start]
   return prediction_files
 
+# Manifest of predictions appended by the ingestion program (see
+# data_io.append_to_manifest): one JSON line per event ('start', 'prediction'
+# with the file name, timestamps and shape, or 'end')
+MANIFEST_FILENAME = 'manifest.jsonl'
+
+def _load_inotify():
+  """Returns the C library if it provides inotify (Linux), None otherwise."""
+  if not sys.platform.startswith('linux'):
+    return None
+  try:
+    import ctypes
+    libc = ctypes.CDLL(None, use_errno=True)
+    libc.inotify_init1
+    libc.inotify_add_watch
+    return libc
+  except (OSError, AttributeError):
+    return None
+
+class DirectoryWatcher(object):
+  """Wait for changes in a directory, with inotify where available (Linux)
+  and by short sleeps otherwise (or while the directory does not exist)."""
+
+  # inotify events
+  IN_MODIFY = 0x2
+  IN_CLOSE_WRITE = 0x8
+  IN_MOVED_TO = 0x80
+  IN_CREATE = 0x100
+  IN_IGNORED = 0x8000 # The watch was removed, e.g. directory deleted
+
+  def __init__(self, directory, poll_interval=0.05):
+    self.directory = directory
+    self.poll_interval = poll_interval
+    self.libc = _load_inotify()
+    self.fd = None
+
+  def _add_watch(self):
+    if self.fd is not None or self.libc is None or\
+       not os.path.isdir(self.directory):
+      return
+    fd = self.libc.inotify_init1(os.O_NONBLOCK)
+    if fd < 0:
+      self.libc = None
+      return
+    mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO |\
+           self.IN_CREATE
+    if self.libc.inotify_add_watch(fd, self.directory.encode(), mask) < 0:
+      os.close(fd)
+      return
+    self.fd = fd
+
+  def wait(self, timeout):
+    """Return when the directory changes or after `timeout` seconds (or
+    after `poll_interval` seconds without inotify)."""
+    self._add_watch()
+    if self.fd is None:
+      time.sleep(min(timeout, self.poll_interval))
+      return
+    readable, _, _ = select.select([self.fd], [], [], timeout)
+    if not readable:
+      return
+    try:
+      events = os.read(self.fd, 65536)
+    except OSError:
+      events = b''
+    # Each event is a struct inotify_event: wd, mask, cookie, len, name[len]
+    offset = 0
+    while offset + 16 <= len(events):
+      _, mask, _, name_length = struct.unpack_from('iIII', events, offset)
+      if mask & self.IN_IGNORED:
+        # Watch it again once the directory is created again
+        os.close(self.fd)
+        self.fd = None
+        break
+      offset += 16 + name_length
+
+class ManifestFollower(object):
+  """Read the entries appended to the manifest of predictions of the
+  ingestion program, as they come."""
+
+  def __init__(self, prediction_dir):
+    self.path = os.path.join(prediction_dir, MANIFEST_FILENAME)
+    self.inode = None
+    self.offset = 0
+    self.partial_line = b''
+
+  def exists(self):
+    return os.path.isfile(self.path)
+
+  def read_new_entries(self):
+    """Returns the list of the entries (dicts) appended since last call."""
+    try:
+      stat = os.stat(self.path)
+    except OSError:
+      return []
+    if stat.st_ino != self.inode or stat.st_size < self.offset:
+      # New manifest (e.g. new run of the ingestion program)
+      self.inode = stat.st_ino
+      self.offset = 0
+      self.partial_line = b''
+    if stat.st_size == self.offset:
+      return []
+    with open(self.path, 'rb') as f:
+      f.seek(self.offset)
+      data = f.read()
+    self.offset += len(data)
+    lines = (self.partial_line + data).split(b'\n')
+    self.partial_line = lines.pop() # Incomplete line, if any
+    return [json.loads(line.decode('utf-8')) for line in lines if line.strip()]
+
 def get_fig_name(basename):
   fig_name = "learning-curve-" + basename + ".png"
   return fig_name
@@ -159,82 +305,297 @@ def get_basename(solution_file):
   """
   return solution_file.split(os.sep)[-1].split('.')[0]
 
-# TODO: change this function to avoid repeated computing
-def draw_learning_curve(solution_file, prediction_files,
-                        scoring_function, output_dir,
-                        basename, start, is_multiclass_task):
-  """Draw learning curve for one task."""
-  solution = read_array(solution_file) # numpy array
-  scores = []
-  timestamps = []
-  if is_multiclass_task:
-    accuracy_scores = []
-  for prediction_file in prediction_files:
-    timestamp = os.path.getmtime(prediction_file)
-    prediction = read_array(prediction_file) # numpy array
-    if (solution.shape != prediction.shape): raise ValueError(
+def transform_time(t, T=TIME_BUDGET):
+  """Log-scale transformation of a time `t` (in seconds, counted from 1) to
+  [0, 1], as used for the x-axis of the learning curve."""
+  return np.log(t + 1) / np.log(T + 1)
+
+class LearningCurve(object):
+  """Learning curve of one task, updated incrementally.
+
+  The solution is read once (unless `chunk_size` is given: the solution and
+  the predictions are then read by chunks of rows for each prediction and
+  `scoring_function` is autodl_bac, see score_by_chunks). The scores (BAC and
+  accuracy) of each prediction file are cached with the key (path, size, mtime), so that each prediction is
+  read and scored only once. Points are expected to come in time order: the
+  area under the learning curve (ALC) is then updated in O(1) per new point
+  (it is recomputed from scratch if a point comes out of order or if a
+  prediction file is rewritten).
+  """
+
+  def __init__(self, solution, scoring_function, start, is_multiclass_task,
+               time_budget=TIME_BUDGET, chunk_size=None):
+    """
+    Args:
+      solution: numpy.ndarray of shape (num_examples, num_classes), or path
+          to the solution file if `chunk_size` is given.
+      scoring_function: function(solution, prediction) used for the y-axis.
+      start: start time (in seconds since epoch) of the scoring program.
+      is_multiclass_task: boolean, if True also compute the accuracy.
+      time_budget: time (in seconds) at which the curve is truncated.
+      chunk_size: if given, score by chunks of this number of rows.
+    """
+    self.solution = solution
+    self.chunk_size = chunk_size
+    self.scoring_function = scoring_function
+    self.start = start
+    self.is_multiclass_task = is_multiclass_task
+    self.time_budget = time_budget
+    # (path, size, mtime), or (path, timestamp) for the files announced in
+    # the manifest -> (score, accuracy)
+    self.score_cache = {}
+    self.point_keys = {} # path -> key of the point on the curve
+    # Points (timestamp, score, accuracy) of the curve, sorted by timestamp
+    self.points = []
+    # Area under the curve up to the last point, i.e. without the final
+    # horizontal segment from the last point to the time budget
+    self.area = 0
+    self.last_x = transform_time(1, time_budget) # Origin of the curve
+    self.last_y = 0
+
+  def __len__(self):
+    return len(self.points)
+
+  def score_prediction(self, prediction_file, key):
+    """Returns (score, accuracy) of a prediction file, from the cache if
+    possible."""
+    if key not in self.score_cache and self.chunk_size:
+      self.score_cache[key] = score_by_chunks(self.solution, prediction_file,
+                                              self.is_multiclass_task,
+                                              self.chunk_size)
+    if key not in self.score_cache:
+      prediction = read_array(prediction_file) # numpy array
+      if (self.solution.shape != prediction.shape): raise ValueError(
+          "Bad prediction shape {}".format(prediction.shape))
+      score = self.scoring_function(self.solution, prediction)
+      acc = accuracy(self.solution, prediction) if self.is_multiclass_task\
+            else None
+      self.score_cache[key] = (score, acc)
+    return self.score_cache[key]
+
+  def update(self, prediction_files):
+    """Add the new points of the curve among `prediction_files`, listed in
+    the prediction directory (see `add_prediction_file` when following the
+    manifest). The time of each prediction is the modification time of its
+    file. Returns the number of new or changed points.
+    """
+    num_new = 0
+    recompute = False
+    for prediction_file in prediction_files:
+      stat = os.stat(prediction_file)
+      key = (prediction_file, stat.st_size, stat.st_mtime)
+      old_key = self.point_keys.get(prediction_file)
+      if old_key == key:
+        continue
+      timestamp = stat.st_mtime
+      score, acc = self.score_prediction(prediction_file, key)
+      if old_key is not None: # Rewritten prediction file
+        self.points = [p for p in self.points if p[3] != prediction_file]
+        recompute = True
+      elif self.points and timestamp < self.points[-1][0]:
+        recompute = True
+      self.point_keys[prediction_file] = key
+      point = (timestamp, score, acc, prediction_file)
+      self.points.append(point)
+      if not recompute:
+        self._add_area(timestamp, score)
+      num_new += 1
+    if recompute:
+      self.points.sort(key=lambda p: p[:2])
+      self._recompute_area()
+    return num_new
+
+  def add_prediction_file(self, prediction_file, timestamp):
+    """Add the point of a prediction file announced in the manifest, at
+    `timestamp`, without looking at the file system. A file announced again
+    (i.e. rewritten) replaces its previous point.
+
+    Returns:
+      (score, accuracy), accuracy being None if not a multi-class task.
+    """
+    key = (prediction_file, timestamp)
+    if self.point_keys.get(prediction_file) == key:
+      return self.score_cache[key]
+    score, acc = self.score_prediction(prediction_file, key)
+    rewritten = prediction_file in self.point_keys
+    if rewritten:
+      self.points = [p for p in self.points if p[3] != prediction_file]
+    self.point_keys[prediction_file] = key
+    self._append_point((timestamp, score, acc, prediction_file),
+                       recompute=rewritten)
+    return score, acc
+
+  def add_prediction(self, prediction, timestamp, name):
+    """Add the point of a prediction given as a numpy array (e.g. received by
+    the scoring service) instead of a file, `name` identifying it.
+
+    Returns:
+      (score, accuracy), accuracy being None if not a multi-class task.
+    """
+    if (self.solution.shape != prediction.shape): raise ValueError(
         "Bad prediction shape {}".format(prediction.shape))
-    score = scoring_function(solution, prediction)
-    scores.append(score)
-    timestamps.append(timestamp)
-    if is_multiclass_task:
-      acc = accuracy(solution, prediction)
-      accuracy_scores.append(acc)
-  # Sort two lists according to timestamps
-  sorted_pairs = sorted(zip(timestamps, scores))
-  if len(timestamps) > 0:
-    latest_bac = sorted_pairs[-1][1]
-    print_log("BAC of the latest prediction is {:.4f}."\
-              .format(latest_bac))
-    if is_multiclass_task:
-      sorted_pairs_acc = sorted(zip(timestamps, accuracy_scores))
-      latest_acc = sorted_pairs_acc[-1][1]
-      print_log("Accuracy of the latest prediction is {:.4f}."\
-                .format(latest_acc))
-  X = [t - start + 1 for t,_ in sorted_pairs] # Since X on log scale, set first x=1
-  Y = [s for _,s in sorted_pairs]
-  # Add origin as the first point of the curve
-  X.insert(0, 1) # X starts from 1 to use log
-  Y.insert(0, 0)
-  # Truncate X using X_max
-  X_max = TIME_BUDGET
-  Y_max = 1
-  log_X = [np.log(x+1)/np.log(X_max+1) for x in X if x <= X_max] # log_X \in [0, 1]
-  log_X_max = 1
-  X = X[:len(log_X)]
-  Y = Y[:len(log_X)]
-  # Draw learning curve
-  plt.clf()
-  fig, ax = plt.subplots(figsize=(7, 7.07)) #Have a small area of negative score
+    score = self.scoring_function(self.solution, prediction)
+    acc = accuracy(self.solution, prediction) if self.is_multiclass_task\
+          else None
+    self._append_point((timestamp, score, acc, name))
+    return score, acc
+
+  def _append_point(self, point, recompute=False):
+    """Add a point (timestamp, score, accuracy, name) to the curve. The area
+    is updated in O(1) if the point comes last in time order, and recomputed
+    otherwise (or if `recompute`)."""
+    if self.points and point[0] < self.points[-1][0]:
+      recompute = True
+    self.points.append(point)
+    if recompute:
+      self.points.sort(key=lambda p: p[:2])
+      self._recompute_area()
+    else:
+      self._add_area(point[0], point[1])
+
+  def _add_area(self, timestamp, score):
+    """Add the trapezoid between the last point and a new point."""
+    t = timestamp - self.start + 1 # Since X on log scale, set first x=1
+    if t > self.time_budget: # Truncate at the time budget
+      return
+    x = transform_time(t, self.time_budget)
+    self.area += (x - self.last_x) * (score + self.last_y) / 2
+    self.last_x = x
+    self.last_y = score
+
+  def _recompute_area(self):
+    self.area = 0
+    self.last_x = transform_time(1, self.time_budget)
+    self.last_y = 0
+    for timestamp, score, _, _ in self.points:
+      self._add_area(timestamp, score)
+
+  def get_alc(self):
+    """Normalized area under the learning curve, the last score being kept
+    until the time budget."""
+    if not self.points:
+      return 0
+    return self.area + (1 - self.last_x) * self.last_y
+
+  def get_curve(self):
+    """Returns the lists X (times) and Y (scores) of the curve, starting at the
+    origin (1, 0) and truncated at the time budget."""
+    X = [1] # X starts from 1 to use log
+    Y = [0]
+    for timestamp, score, _, _ in self.points:
+      t = timestamp - self.start + 1
+      if t > self.time_budget:
+        break
+      X.append(t)
+      Y.append(score)
+    return X, Y
+
+  def get_latest_scores(self):
+    """Returns (score, accuracy) of the latest prediction."""
+    return self.points[-1][1:3]
+
+def draw_learning_curve(figure, X, Y, alc, basename, X_max=TIME_BUDGET):
+  """Draw learning curve for one task on a matplotlib figure (cleared first).
+
+  Args:
+    figure: matplotlib.figure.Figure.
+    X, Y: lists of times and scores of the curve, from LearningCurve.get_curve.
+    alc: area under the learning curve, shown in the title.
+  """
+  X = list(X)
+  Y = list(Y)
+  figure.clf()
+  ax = figure.add_subplot(111)
   ax.plot(X, Y, marker="o", label="Test score", markersize=3)
   # ax.step(X, Y, marker="o", label="Test score", markersize=3, where='post')
   # Add a point on the final line using last prediction
-  X.append(TIME_BUDGET)
+  X.append(X_max)
   Y.append(Y[-1])
-  log_X.append(1)
-  if len(log_X) >= 2:
-    alc = area_under_learning_curve(log_X,Y)
-  else:
-    alc = 0
   ax.fill_between(X, Y, color='cyan')
   # ax.fill_between(X, Y, color='cyan', step='post')
   ax.text(X[-1], Y[-1], "{:.4f}".format(Y[-1])) # Show the latest/final score
   ax.plot(X[-2:], Y[-2:], '--') # Draw a dotted line from last prediction
-  plt.title("Task: " + basename + " - Current normalized ALC: " + format(alc, '.4f'))
-  plt.xlabel('time/second (log scale)')
-  plt.xlim(left=1, right=X_max)
-  plt.xscale('log')
-  plt.ylabel('score (2*BAC - 1)')
-  plt.ylim(bottom=-0.01, top=1)
+  ax.set_title("Task: " + basename + " - Current normalized ALC: " + format(alc, '.4f'))
+  ax.set_xlabel('time/second (log scale)')
+  ax.set_xlim(left=1, right=X_max)
+  ax.set_xscale('log')
+  ax.set_ylabel('score (2*BAC - 1)')
+  ax.set_ylim(bottom=-0.01, top=1)
   ax.grid(True, zorder=5)
-  plt.legend()
-  fig_name = get_fig_name(basename)
-  path_to_fig = os.path.join(output_dir, fig_name)
-  plt.savefig(path_to_fig)
-  return alc
+  ax.legend()
+
+class LearningCurveRenderer(object):
+  """Render learning curves and update detailed_results.html in a background
+  thread, so that scoring never waits on matplotlib.
+
+  Only the latest submitted curve is rendered (intermediate ones are skipped)
+  and at most once every `min_interval` seconds. A single figure and Agg
+  canvas are reused for all renderings, so memory does not grow with the
+  number of predictions.
+  """
 
-def area_under_learning_curve(X,Y):
-  return auc(X,Y)
+  def __init__(self, output_dir, min_interval=2.0):
+    self.output_dir = output_dir
+    self.min_interval = min_interval
+    self.pending = None # Latest curve not rendered yet
+    self.condition = threading.Condition()
+    self.closed = False
+    self.figure = None
+    self.canvas = None
+    self.thread = threading.Thread(target=self._run)
+    self.thread.daemon = True
+    self.thread.start()
+
+  def submit(self, learning_curve, basename):
+    """Schedule the rendering of the current state of `learning_curve`."""
+    X, Y = learning_curve.get_curve()
+    with self.condition:
+      self.pending = (X, Y, learning_curve.get_alc(), basename,
+                      learning_curve.time_budget)
+      self.condition.notify()
+
+  def close(self):
+    """Render the last submitted curve, if any, and stop the thread."""
+    with self.condition:
+      self.closed = True
+      self.condition.notify()
+    self.thread.join()
+
+  def _run(self):
+    last_render = 0
+    while True:
+      with self.condition:
+        while self.pending is None and not self.closed:
+          self.condition.wait()
+        if self.pending is None: # Closed
+          return
+        # Throttle, unless closing
+        delay = last_render + self.min_interval - time.time()
+        if delay > 0 and not self.closed:
+          self.condition.wait(delay)
+          continue
+        curve = self.pending
+        self.pending = None
+      try:
+        self._render(*curve)
+      except Exception as e: # Keep scoring even if rendering fails
+        print_log("Failed to render learning curve: {}".format(e))
+      last_render = time.time()
+
+  def _render(self, X, Y, alc, basename, X_max):
+    if self.figure is None:
+      # Object-oriented matplotlib API with the Agg backend: no GUI and no
+      # global state in pyplot
+      from matplotlib.figure import Figure
+      from matplotlib.backends.backend_agg import FigureCanvasAgg
+      self.figure = Figure(figsize=(7, 7.07)) #Have a small area of negative score
+      self.canvas = FigureCanvasAgg(self.figure)
+    draw_learning_curve(self.figure, X, Y, alc, basename, X_max=X_max)
+    buffer = io.BytesIO()
+    self.canvas.print_png(buffer)
+    path_to_fig = os.path.join(self.output_dir, get_fig_name(basename))
+    write_image(path_to_fig, buffer.getvalue())
+    write_scores_html(self.output_dir)
 
 def init_scores_html(detailed_results_filepath):
   html_head = """<html><head> <meta http-equiv="refresh" content="5"> </head><body><pre>"""
@@ -244,6 +605,34 @@ def init_scores_html(detailed_results_filepath):
     html_file.write("Starting training process... <br> Please be patient. Learning curves will be generated when first predictions are made.")
     html_file.write(html_end)
 
+# Base64 encoding of images, by path: (size, mtime, encoded string)
+_encoded_images = {}
+
+def write_image(image_path, data):
+  """Write (atomically) an image and cache its base64 encoding."""
+  import base64
+  tmp_path = os.path.join(os.path.dirname(image_path),
+                          '.' + os.path.basename(image_path) + '.tmp')
+  with open(tmp_path, 'wb') as image_file:
+    image_file.write(data)
+  os.rename(tmp_path, image_path)
+  stat = os.stat(image_path)
+  _encoded_images[image_path] = (stat.st_size, stat.st_mtime,
+                                 base64.b64encode(data).decode('utf-8'))
+
+def encode_image(image_path):
+  """Base64 encoding of an image, read only if it changed since last call."""
+  stat = os.stat(image_path)
+  cached = _encoded_images.get(image_path)
+  if cached is None or cached[:2] != (stat.st_size, stat.st_mtime):
+    # Convert images to Base64 to show in scores.html
+    import base64
+    with open(image_path, "rb") as image_file:
+      encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
+    cached = (stat.st_size, stat.st_mtime, encoded_string)
+    _encoded_images[image_path] = cached
+  return cached[2]
+
 def write_scores_html(score_dir, auto_refresh=True):
   filename = 'detailed_results.html'
   image_paths = sorted(ls(os.path.join(score_dir, '*.png')))
@@ -256,11 +645,9 @@ def write_scores_html(score_dir, auto_refresh=True):
       # Automatic refreshing the page on file change using Live.js
       html_file.write(html_head)
       for image_path in image_paths:
-        with open(image_path, "rb") as image_file:
-          encoded_string = base64.b64encode(image_file.read())
-          encoded_string = encoded_string.decode('utf-8')
-          s = '<img src="data:image/png;charset=utf-8;base64,%s"/>'%encoded_string
-          html_file.write(s + '<br>')
+        encoded_string = encode_image(image_path)
+        s = '<img src="data:image/png;charset=utf-8;base64,%s"/>'%encoded_string
+        html_file.write(s + '<br>')
       html_file.write(html_end)
 
 def append_to_detailed_results_page(detailed_results_filepath, content):
@@ -352,10 +739,14 @@ if __name__ == "__main__":
     detailed_results_filepath = os.path.join(score_dir, 'detailed_results.html')
     # Initialize detailed_results.html
     init_scores_html(detailed_results_filepath)
+    print_log("Scoring program ready after {:.2f} sec."\
+              .format(time.time() - overall_start))
 
+    # Wake up as soon as prediction_dir changes, instead of polling it
+    watcher = DirectoryWatcher(prediction_dir)
     # Check if ingestion program is ready before starting
     while(not is_started(prediction_dir)):
-      time.sleep(0.5)
+      watcher.wait(0.5)
 
     # Use the timestamp of 'detailed_results.html' as start time
     # This is more robust than using start = time.time()
@@ -373,63 +764,92 @@ if __name__ == "__main__":
     if len(solution_names) > 1: # Assert only one file is found
       raise ValueError("Multiple solution files found: {}!".format(solution_names))
     solution_file = solution_names[0]
-    solution = read_array(solution_file)
-    is_multiclass_task = is_multiclass(solution)
+    if SCORING_CHUNK_SIZE:
+      # Solution is read by chunks for each prediction (streaming)
+      solution = solution_file
+      is_multiclass_task = is_multiclass_file(solution_file, SCORING_CHUNK_SIZE)
+    else:
+      solution = read_array(solution_file)
+      is_multiclass_task = is_multiclass(solution)
     # Extract the dataset name from the file name
     basename = get_basename(solution_file)
-    nb_preds = {x:0 for x in solution_names}
     scores = {x:0 for x in solution_names}
+    # Solution is kept in memory (unless streaming) and each prediction is
+    # scored only once
+    learning_curve = LearningCurve(solution=solution,
+                                   scoring_function=scoring_function,
+                                   start=start,
+                                   is_multiclass_task=is_multiclass_task,
+                                   chunk_size=SCORING_CHUNK_SIZE)
 
     # Use 'duration.txt' file to detect if ingestion program exits early
     duration_filepath =  os.path.join(prediction_dir, 'duration.txt')
 
+    # Follow the manifest of predictions if the ingestion program writes one,
+    # otherwise list prediction files and use 'duration.txt' as end signal
+    manifest = ManifestFollower(prediction_dir)
+    duration = None
+
+    renderer = LearningCurveRenderer(score_dir)
+
     # Begin scoring process, along with ingestion program
     # Moniter training processes while time budget is not attained
-    known_prediction_files = {}
     while(time.time() < start + TIME_BUDGET):
-      time.sleep(0.5)
-      # Give list of prediction files
-      prediction_files = get_prediction_files(prediction_dir, basename, start)
-      nb_preds_old = nb_preds[solution_file]
-      nb_preds_new = len(prediction_files)
-      if(nb_preds_new > nb_preds_old):
-        now = datetime.datetime.now().strftime("%y-%m-%d %H:%M:%S")
-        print_log("[+] New prediction found. Now number of predictions made =", nb_preds_new)
-        alc = 0
-        alc = draw_learning_curve(solution_file=solution_file,
-                                  prediction_files=prediction_files,
-                                  scoring_function=scoring_function,
-                                  output_dir=score_dir,
-                                  basename=basename,
-                                  start=start,
-                                  is_multiclass_task=is_multiclass_task)
-        nb_preds[solution_file] = nb_preds_new
-        scores[solution_file] = alc
+      # Use 'duration.txt' file to detect if ingestion program exits early.
+      # Checked before listing predictions so that none is missed
+      ingestion_ended = os.path.isfile(duration_filepath)
+      num_new = 0
+      if manifest.exists():
+        # Only the entries appended since the last wake-up are processed
+        for entry in manifest.read_new_entries():
+          if entry['event'] == 'prediction' and entry['wall'] > start and\
+             fnmatch(entry['file'], basename + '*.predict_*'):
+            learning_curve.add_prediction_file(
+                os.path.join(prediction_dir, entry['file']), entry['wall'])
+            num_new += 1
+          elif entry['event'] == 'end':
+            ingestion_ended = True
+            duration = entry.get('duration')
+      else:
+        # Give list of prediction files
+        prediction_files = get_prediction_files(prediction_dir, basename, start)
+        num_new = learning_curve.update(prediction_files)
+      if num_new > 0:
+        print_log("[+] New prediction found. Now number of predictions made =", len(learning_curve))
+        latest_bac, latest_acc = learning_curve.get_latest_scores()
+        print_log("BAC of the latest prediction is {:.4f}.".format(latest_bac))
+        if is_multiclass_task:
+          print_log("Accuracy of the latest prediction is {:.4f}."\
+                    .format(latest_acc))
+        scores[solution_file] = learning_curve.get_alc()
         print_log("Current area under learning curve for {}: {:.4f}".format(basename, scores[solution_file]))
-        # Update scores.html
-        write_scores_html(score_dir)
-      # Use 'duration.txt' file to detect if ingestion program exits early
-      if os.path.isfile(duration_filepath):
+        # Draw learning curve and update scores.html in the background
+        renderer.submit(learning_curve, basename)
+      if ingestion_ended:
         print_log("Detected early stop of ingestion program. Stop scoring now.")
         break
+      watcher.wait(0.5)
 
-    # Write one last time the detailed results page without auto-refreshing
+    # Draw the final learning curve, then write one last time the detailed
+    # results page without auto-refreshing
+    renderer.close()
     write_scores_html(score_dir, auto_refresh=False)
 
     # Read the execution time and add it to score_file (scores.txt)
-    # Spend 30 seconds to search for a duration.txt file
-    duration = None
+    # Spend 30 seconds to search for a duration.txt file (unless it was
+    # already given by the manifest)
     max_loop = 30
     n_loop = 0
-    while n_loop < max_loop:
-        time.sleep(1)
+    while duration is None and n_loop < max_loop:
         if os.path.isfile(duration_filepath):
             with open(duration_filepath, 'r') as f:
               duration = float(f.read())
-            str_temp = "Duration: %0.6f\n" % duration
-            score_file.write(str_temp)
             break
+        time.sleep(1)
         n_loop += 1
+    if duration is not None:
+        str_temp = "Duration: %0.6f\n" % duration
+        score_file.write(str_temp)
 
     score = scores[solution_file]
     score_file.write("score: {:.12f}\n".format(score))
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+# Local scoring service for the AutoDL challenge
+
+# ALL INFORMATION, SOFTWARE, DOCUMENTATION, AND DATA ARE PROVIDED "AS-IS".
+# ISABELLE GUYON, CHALEARN, AND/OR OTHER ORGANIZERS OR CODE AUTHORS DISCLAIM
+# ANY EXPRESSED OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR ANY PARTICULAR PURPOSE, AND THE
+# WARRANTY OF NON-INFRINGEMENT OF ANY THIRD PARTY'S INTELLECTUAL PROPERTY RIGHTS.
+# IN NO EVENT SHALL ISABELLE GUYON AND/OR OTHER ORGANIZERS BE LIABLE FOR ANY SPECIAL,
+# INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER ARISING OUT OF OR IN
+# CONNECTION WITH THE USE OR PERFORMANCE OF SOFTWARE, DOCUMENTS, MATERIALS,
+# PUBLICATIONS, OR INFORMATION MADE AVAILABLE FOR THE CHALLENGE.
+
+"""Local scoring service, scoring predictions sent over localhost HTTP.
+
+The solution is read once and the learning curve is kept in memory, so that
+predictions are scored as soon as they are received, without going through
+prediction files (written, listed, read and parsed by score.py). This is meant
+for local tests and hyperparameter sweeps: on CodaLab, the ingestion and
+scoring programs still communicate through files only.
+
+Run
+```
+python scoring_service.py ../AutoDL_sample_data/ 8760
+```
+(the solution directory and the port, both optional) and give the URL of the
+service to the ingestion program with the environment variable
+AUTODL_SCORING_SERVICE (e.g. http://127.0.0.1:8760), see
+data_io.ScoringClient. `run_local_test.py -scoring_service` does both.
+
+API (all responses are JSON objects):
+  POST /start?timestamp=T
+      Start a new learning curve, starting at time T (seconds since epoch,
+      default: now). Each run of the ingestion program starts one.
+  POST /predict?name=N&timestamp=T
+      Score a prediction made at time T, sent in the body of the request as
+      raw float32 values (C order) of shape (num_examples, num_classes).
+      Returns its BAC (2*BAC - 1, as score.py) and accuracy (multi-class
+      tasks only) and the current ALC.
+  GET /scores
+      Current ALC and points of the learning curve.
+  POST /shutdown
+      Stop the service.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+
+from libscores import read_array, ls
+from score import LearningCurve, autodl_bac, is_multiclass, print_log,\
+                  TIME_BUDGET
+
+DEFAULT_PORT = 8760
+
+class ScoringService(object):
+  """Scores predictions of one task, keeping the solution and the learning
+  curve in memory."""
+
+  def __init__(self, solution_file, time_budget=TIME_BUDGET):
+    self.solution_file = solution_file
+    self.solution = np.asarray(read_array(solution_file))
+    self.is_multiclass_task = is_multiclass(self.solution)
+    self.time_budget = time_budget
+    self.learning_curve = None
+    # Requests are handled one at a time, but keep the state consistent if
+    # the server is made multi-threaded
+    self.lock = threading.Lock()
+
+  def start(self, timestamp=None):
+    """Start a new learning curve (e.g. for a new run of ingestion)."""
+    with self.lock:
+      self._start(timestamp)
+      return {'start': self.learning_curve.start}
+
+  def _start(self, timestamp=None):
+    # Called with the lock held
+    self.learning_curve = LearningCurve(
+        solution=self.solution, scoring_function=autodl_bac,
+        start=timestamp or time.time(),
+        is_multiclass_task=self.is_multiclass_task,
+        time_budget=self.time_budget)
+
+  def predict(self, data, name=None, timestamp=None):
+    """Score a prediction given as raw float32 values."""
+    num_classes = self.solution.shape[1]
+    prediction = np.frombuffer(data, dtype=np.float32)
+    if prediction.size % num_classes:
+      raise ValueError("Received {} values, not a multiple of the number of "
+                       "classes {}.".format(prediction.size, num_classes))
+    prediction = prediction.reshape(-1, num_classes)
+    with self.lock:
+      if self.learning_curve is None:
+        self._start()
+      timestamp = timestamp or time.time()
+      if name is None:
+        name = 'prediction_{}'.format(len(self.learning_curve))
+      score, acc = self.learning_curve.add_prediction(prediction, timestamp,
+                                                      name)
+      return {'name': name, 'bac': score, 'accuracy': acc,
+              'alc': self.learning_curve.get_alc(),
+              'num_predictions': len(self.learning_curve)}
+
+  def scores(self):
+    """Current ALC and points (timestamp, score, accuracy, name) of the
+    learning curve."""
+    with self.lock:
+      if self.learning_curve is None:
+        return {'alc': 0, 'start': None, 'points': []}
+      return {'alc': self.learning_curve.get_alc(),
+              'start': self.learning_curve.start,
+              'points': [list(p) for p in self.learning_curve.points]}
+
+class ScoringRequestHandler(BaseHTTPRequestHandler):
+  """HTTP API of a ScoringService (`self.server.service`)."""
+
+  def do_GET(self):
+    url = urlparse(self.path)
+    if url.path == '/scores':
+      self._send_json(self.server.service.scores())
+    else:
+      self._send_json({'error': 'Unknown path ' + url.path}, status=404)
+
+  def do_POST(self):
+    url = urlparse(self.path)
+    params = {k: v[0] for k, v in parse_qs(url.query).items()}
+    length = int(self.headers.get('Content-Length') or 0)
+    data = self.rfile.read(length)
+    service = self.server.service
+    timestamp = float(params['timestamp']) if 'timestamp' in params else None
+    try:
+      if url.path == '/predict':
+        self._send_json(service.predict(data, params.get('name'), timestamp))
+      elif url.path == '/start':
+        self._send_json(service.start(timestamp))
+      elif url.path == '/shutdown':
+        self._send_json({'shutdown': True})
+        # shutdown() waits for serve_forever() to return: call it from
+        # another thread
+        threading.Thread(target=self.server.shutdown).start()
+      else:
+        self._send_json({'error': 'Unknown path ' + url.path}, status=404)
+    except ValueError as e:
+      self._send_json({'error': str(e)}, status=400)
+
+  def _send_json(self, content, status=200):
+    body = json.dumps(content).encode('utf-8')
+    self.send_response(status)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, format, *args):
+    pass # One line per request would flood the logs
+
+def make_server(solution_file, port=DEFAULT_PORT, host='127.0.0.1'):
+  """Returns an HTTPServer of the scoring service of `solution_file`, not
+  started yet (port 0 picks a free port, see `server.server_port`)."""
+  server = HTTPServer((host, port), ScoringRequestHandler)
+  server.service = ScoringService(solution_file)
+  return server
+
+def serve(solution_file, port=DEFAULT_PORT, host='127.0.0.1'):
+  """Run the scoring service until it is shut down (POST /shutdown)."""
+  server = make_server(solution_file, port=port, host=host)
+  print_log("Scoring service for {} listening on http://{}:{}"\
+            .format(solution_file, host, server.server_port))
+  try:
+    server.serve_forever()
+  finally:
+    server.server_close()
+
+if __name__ == "__main__":
+  root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                          os.pardir))
+  solution_dir = sys.argv[1] if len(sys.argv) > 1 else\
+                 os.path.join(root_dir, "AutoDL_sample_data")
+  port = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PORT
+  solution_names = sorted(ls(os.path.join(solution_dir, '*.solution')))
+  if len(solution_names) != 1: # Assert only one file is found
+    raise ValueError("Expected one solution file, found: {}!"\
+                     .format(solution_names))
+  serve(solution_names[0], port=port)
@@ -0,0 +1,93 @@
+"""Benchmark of the metric `autodl_bac` of the scoring program.
+
+Compares the current implementation of `score.autodl_bac` (products written in
+one temporary, by chunks of rows or not, optionally from float32 inputs) with
+the previous one (four full-size temporaries reduced row by row with the
+built-in `sum`), on random multilabel solutions and predictions. Reports the
+time, the peak memory allocated by NumPy (with tracemalloc) and the difference
+of score with the previous implementation (0 in float64).
+
+Run
+```
+python benchmark_autodl_bac.py -shapes 10000x100,50000x2000
+```
+in the starting kit directory.
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+def _HERE(*args):
+    h = os.path.dirname(os.path.realpath(__file__))
+    return os.path.join(h, *args)
+
+sys.path.append(_HERE('AutoDL_scoring_program'))
+from libscores import mvmean
+from score import autodl_bac
+
+def previous_autodl_bac(solution, prediction):
+  """Previous implementation of `score.autodl_bac`, for reference."""
+  tn = sum(np.multiply((1 - solution), (1 - prediction)))
+  fn = sum(np.multiply(solution, (1 - prediction)))
+  tp = sum(np.multiply(solution, prediction))
+  fp = sum(np.multiply((1 - solution), prediction))
+  eps = 1e-15
+  tp = np.maximum(eps, tp)
+  pos_num = np.maximum(eps, tp + fn)
+  tpr = tp / pos_num
+  tn = np.maximum(eps, tn)
+  neg_num = np.maximum(eps, tn + fp)
+  tnr = tn / neg_num
+  bac = 0.5 * (tpr + tnr)
+  bac = mvmean(bac)
+  return 2*bac - 1
+
+def measure(function, *args, **kwargs):
+  """Returns (time, peak memory in MB, result) of a call."""
+  tracemalloc.start()
+  begin = time.time()
+  result = function(*args, **kwargs)
+  duration = time.time() - begin
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return duration, peak / 1024.0**2, result
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+  parser.add_argument('-shapes', default='10000x100,50000x2000',
+                      help="Comma-separated shapes (num_examples x "
+                           "num_classes) of the solution.")
+  parser.add_argument('-chunk_size', type=int, default=4096,
+                      help="Number of rows per chunk for the chunked runs.")
+  args = parser.parse_args()
+  shapes = [tuple(int(x) for x in shape.split('x'))
+            for shape in args.shapes.split(',')]
+  variants = [
+    ('previous', previous_autodl_bac, {}),
+    ('float64', autodl_bac, {'chunk_size': None}),
+    ('float32', autodl_bac, {'dtype': np.float32, 'chunk_size': None}),
+    ('float64/chunked', autodl_bac, {'chunk_size': args.chunk_size}),
+    ('float32/chunked', autodl_bac, {'dtype': np.float32,
+                                     'chunk_size': args.chunk_size}),
+  ]
+  print("{:<12} {:<16} {:>9} {:>12} {:>12}".format(
+      'shape', 'version', 'time (s)', 'peak (MB)', 'score diff'))
+  for shape in shapes:
+    random_state = np.random.RandomState(0)
+    solution = (random_state.rand(*shape) < 0.1).astype(np.float64)
+    prediction = random_state.rand(*shape)
+    reference = None
+    for name, function, kwargs in variants:
+      duration, peak, score = measure(function, solution, prediction, **kwargs)
+      if reference is None:
+        reference = score
+      print("{:<12} {:<16} {:>9.3f} {:>12.1f} {:>12.2e}".format(
+          'x'.join(str(x) for x in shape), name, duration, peak,
+          abs(score - reference)))
+
+if __name__ == '__main__':
+  main()
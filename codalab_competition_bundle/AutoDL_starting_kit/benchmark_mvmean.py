@@ -0,0 +1,90 @@
+"""Benchmark of `libscores.mvmean`, the mean used by the metrics of libscores
+and of the scoring program.
+
+Compares the current implementation (vectorized, pairwise summation) with the
+previous one (moving average with functools.reduce, one Python call per
+element), for vectors and along both axes of matrices. Reports the time of
+both and their largest error relative to the exactly rounded mean
+(math.fsum).
+
+Run
+```
+python benchmark_mvmean.py -sizes 100,10000,1000000
+```
+in the starting kit directory.
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+from functools import reduce
+import numpy as np
+
+def _HERE(*args):
+    h = os.path.dirname(os.path.realpath(__file__))
+    return os.path.join(h, *args)
+
+sys.path.append(_HERE('AutoDL_scoring_program'))
+from libscores import mvmean
+
+def previous_mvmean(R, axis=0):
+  """Previous implementation of `libscores.mvmean` (the axis branches fixed
+  for Python 3 with list(map(...))), for reference."""
+  if len(R.shape) == 0: return R
+  average = lambda x: reduce(lambda i, j: (0, (j[0] / (j[0] + 1.)) * i[1] +
+                                          (1. / (j[0] + 1)) * j[1]),
+                             enumerate(x))[1]
+  R = np.array(R)
+  if len(R.shape) == 1: return average(R)
+  if axis == 1:
+    return np.array(list(map(average, R)))
+  else:
+    return np.array(list(map(average, R.transpose())))
+
+def exact_mean(R, axis=0):
+  """Mean rounded from the exact sum (math.fsum)."""
+  if R.ndim == 1:
+    return math.fsum(R) / len(R)
+  R = np.moveaxis(R, axis, -1)
+  return np.array([math.fsum(r) / len(r) for r in R])
+
+def relative_error(mean, reference):
+  return np.max(np.abs(np.asarray(mean) - reference) /
+                np.maximum(np.abs(reference), 1e-300))
+
+def timed(function, *args):
+  begin = time.time()
+  result = function(*args)
+  return time.time() - begin, result
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+  parser.add_argument('-sizes', default='100,10000,1000000',
+                      help="Comma-separated numbers of values to average.")
+  args = parser.parse_args()
+  random_state = np.random.RandomState(0)
+  print("{:<24} {:<9} {:>10} {:>12}".format('input', 'version', 'time (s)',
+                                            'rel. error'))
+  for size in [int(x) for x in args.sizes.split(',')]:
+    # Values of very different magnitudes, which make rounding errors visible
+    vector = random_state.rand(size) * 10.0**random_state.randint(-8, 8, size)
+    num_columns = 100
+    matrix = vector[:size // num_columns * num_columns]\
+             .reshape(-1, num_columns)
+    inputs = [('vector {}'.format(size), vector, 0),
+              ('matrix {}x{} axis=0'.format(*matrix.shape), matrix, 0),
+              ('matrix {}x{} axis=1'.format(*matrix.shape), matrix, 1)]
+    for name, R, axis in inputs:
+      if R.size == 0:
+        continue
+      reference = exact_mean(R, axis)
+      for version, function in [('previous', previous_mvmean),
+                                ('current', mvmean)]:
+        duration, mean = timed(function, R, axis)
+        print("{:<24} {:<9} {:>10.4f} {:>12.2e}".format(
+            name, version, duration, relative_error(mean, reference)))
+
+if __name__ == '__main__':
+  main()
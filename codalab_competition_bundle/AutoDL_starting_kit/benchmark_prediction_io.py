@@ -0,0 +1,73 @@
+"""Benchmark of the formats of the predictions handed from the ingestion program
+to the scoring program.
+
+For predictions of typical shapes, this script reports the time to write them
+(data_io.write for text, data_io.write_npy for the NumPy .npy binary format)
+and to read them back as the scoring program does (libscores.read_array,
+touching all values), and the size of the files.
+
+Run
+```
+python benchmark_prediction_io.py -shapes 1000x10,10000x100,20000x1000
+```
+in the starting kit directory.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+def _HERE(*args):
+    h = os.path.dirname(os.path.realpath(__file__))
+    return os.path.join(h, *args)
+
+sys.path.append(_HERE('AutoDL_ingestion_program'))
+sys.path.append(_HERE('AutoDL_scoring_program'))
+import data_io
+from libscores import read_array
+
+def timed(function, *args):
+  begin = time.time()
+  result = function(*args)
+  return time.time() - begin, result
+
+def benchmark_shape(shape, tmp_dir):
+  """Returns {format: (write time, read time, file size)}."""
+  predictions = np.random.rand(*shape)
+  results = {}
+  for name, write in [('text', data_io.write), ('npy', data_io.write_npy)]:
+    path = os.path.join(tmp_dir, 'bench.predict_' + name)
+    write_time, _ = timed(write, path, predictions)
+    # Sum to read all values, also from a memory-mapped file
+    read_time, _ = timed(lambda: np.asarray(read_array(path)).sum())
+    results[name] = (write_time, read_time, os.path.getsize(path))
+  return results
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+  parser.add_argument('-shapes', default='1000x10,10000x100,20000x1000',
+                      help="Comma-separated shapes (num_examples x "
+                           "num_classes) of the predictions.")
+  args = parser.parse_args()
+  shapes = [tuple(int(x) for x in shape.split('x'))
+            for shape in args.shapes.split(',')]
+  tmp_dir = tempfile.mkdtemp(prefix='benchmark_prediction_io_')
+  try:
+    print("{:<12} {:<6} {:>10} {:>10} {:>12}".format(
+        'shape', 'format', 'write (s)', 'read (s)', 'size (MB)'))
+    for shape in shapes:
+      results = benchmark_shape(shape, tmp_dir)
+      for name in ['text', 'npy']:
+        write_time, read_time, size = results[name]
+        print("{:<12} {:<6} {:>10.3f} {:>10.3f} {:>12.2f}".format(
+            'x'.join(str(x) for x in shape), name, write_time, read_time,
+            size / 1024.0**2))
+  finally:
+    shutil.rmtree(tmp_dir)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,138 @@
+"""Benchmark of the helpers of libscores preparing solutions and predictions
+for the metrics: `binarize_predictions`, `sanitize_array` and
+`normalize_array`.
+
+Compares the current (vectorized) implementations with the previous ones (one
+Python call per row or per value), on classification solutions of several
+shapes with predictions in [0, 1], unnormalized scores and scores containing
+NaN and Inf, and checks that both give the same outputs.
+
+Run
+```
+python benchmark_preprocessing.py -shapes 1000x10,10000x100,100000x100
+```
+in the starting kit directory.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import numpy as np
+
+def _HERE(*args):
+    h = os.path.dirname(os.path.realpath(__file__))
+    return os.path.join(h, *args)
+
+sys.path.append(_HERE('AutoDL_scoring_program'))
+import libscores
+
+# Previous implementations, for reference
+
+def previous_binarize_predictions(array, task='binary.classification'):
+  bin_array = np.zeros(array.shape)
+  if (task != 'multiclass.classification') or (array.shape[1] == 1):
+    bin_array[array >= 0.5] = 1
+  else:
+    sample_num = array.shape[0]
+    for i in range(sample_num):
+      j = np.argmax(array[i, :])
+      bin_array[i, j] = 1
+  return bin_array
+
+def previous_sanitize_array(array):
+  a = np.ravel(array)
+  maxi = np.nanmax((list(map(lambda x: x != float('inf'), a))))
+  mini = np.nanmin((list(map(lambda x: x != float('-inf'), a))))
+  array[array == float('inf')] = maxi
+  array[array == float('-inf')] = mini
+  mid = (maxi + mini) / 2
+  array[np.isnan(array)] = mid
+  return array
+
+def previous_normalize_array(solution, prediction):
+  sol = np.ravel(solution)
+  maxi = np.nanmax((list(map(lambda x: x != float('inf'), sol))))
+  mini = np.nanmin((list(map(lambda x: x != float('-inf'), sol))))
+  if maxi == mini:
+    print('Warning, cannot normalize')
+    return [solution, prediction]
+  diff = maxi - mini
+  mid = (maxi + mini) / 2.
+  new_solution = np.copy(solution)
+  new_solution[solution >= mid] = 1
+  new_solution[solution < mid] = 0
+  new_prediction = (np.copy(prediction) - float(mini)) / float(diff)
+  new_prediction[new_prediction > 1] = 1
+  new_prediction[new_prediction < 0] = 0
+  return [new_solution, new_prediction]
+
+def timed(function, *args):
+  # The previous normalize_array prints a warning for every call
+  with contextlib.redirect_stdout(io.StringIO()):
+    begin = time.time()
+    result = function(*args)
+    return time.time() - begin, result
+
+def same(x, y):
+  if isinstance(x, list):
+    return all(same(a, b) for a, b in zip(x, y))
+  return np.array_equal(x, y, equal_nan=True)
+
+def get_cases(shape, random_state):
+  """Returns [(name, solution, prediction)] for a one-hot solution of the
+  given shape."""
+  solution = np.eye(shape[1])[random_state.randint(0, shape[1], shape[0])]
+  scores = random_state.randn(*shape) * 3
+  # NaN and Inf in the prediction, NaN in the solution
+  non_finite = scores.copy()
+  mask = random_state.rand(*shape)
+  non_finite[mask < 0.01] = np.nan
+  non_finite[(mask >= 0.01) & (mask < 0.02)] = np.inf
+  non_finite[(mask >= 0.02) & (mask < 0.03)] = -np.inf
+  non_finite_solution = solution.copy()
+  non_finite_solution[random_state.rand(*shape) < 0.01] = np.nan
+  return [('[0, 1]', solution, random_state.rand(*shape)),
+          ('unnormalized', solution, scores),
+          ('non-finite', non_finite_solution, non_finite)]
+
+def benchmark_case(shape, case, solution, prediction):
+  benchmarks = [
+    ('binarize (binary)', previous_binarize_predictions,
+     libscores.binarize_predictions, (prediction, 'binary.classification')),
+    ('binarize (multiclass)', previous_binarize_predictions,
+     libscores.binarize_predictions,
+     (prediction, 'multiclass.classification')),
+    ('sanitize_array', lambda a: previous_sanitize_array(a.copy()),
+     lambda a: libscores.sanitize_array(a.copy()), (prediction,)),
+    ('normalize_array', previous_normalize_array,
+     libscores.normalize_array, (solution, prediction)),
+  ]
+  for name, previous, current, function_args in benchmarks:
+    previous_time, previous_result = timed(previous, *function_args)
+    current_time, current_result = timed(current, *function_args)
+    print("{:<12} {:<13} {:<22} {:>10.4f} {:>10.4f} {:>8.0f}x {:>5}".format(
+        'x'.join(str(x) for x in shape), case, name, previous_time,
+        current_time, previous_time / max(current_time, 1e-9),
+        str(same(previous_result, current_result))))
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+  parser.add_argument('-shapes', default='1000x10,10000x100,100000x100',
+                      help="Comma-separated shapes (num_examples x "
+                           "num_classes) of the solution.")
+  args = parser.parse_args()
+  shapes = [tuple(int(x) for x in shape.split('x'))
+            for shape in args.shapes.split(',')]
+  print("{:<12} {:<13} {:<22} {:>10} {:>10} {:>9} {:>5}".format(
+      'shape', 'prediction', 'function', 'prev. (s)', 'curr. (s)', 'speedup',
+      'same'))
+  for shape in shapes:
+    for case, solution, prediction in get_cases(shape,
+                                                np.random.RandomState(0)):
+      benchmark_case(shape, case, solution, prediction)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,86 @@
+"""Benchmark of the startup time of the ingestion and scoring programs.
+
+Every second spent before the first prediction costs area under the learning
+curve (time axis is in log scale). This script reports:
+  - the time to import the modules of both programs, each in a fresh Python
+    interpreter (median over several runs);
+  - the time-to-first-train-call of the ingestion program, i.e. the time from
+    its start to the first call of `Model.train` (as logged by ingestion.py).
+    The ingestion program is stopped as soon as this time is known.
+
+Run
+```
+python benchmark_startup.py -dataset_dir='./AutoDL_sample_data/' -code_dir='./AutoDL_sample_code_submission/'
+```
+in the starting kit directory.
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+def _HERE(*args):
+    h = os.path.dirname(os.path.realpath(__file__))
+    return os.path.join(h, *args)
+
+# Modules imported by each program before any real work is done
+STARTUP_IMPORTS = {
+  'AutoDL_scoring_program': ['libscores', 'score'],
+  'AutoDL_ingestion_program': ['data_io', 'dataset'],
+}
+
+def time_import(program_dir, module_name):
+  """Time (in seconds) to import `module_name` in a fresh interpreter."""
+  code = ("import sys, time; sys.path.insert(0, {!r}); t = time.time(); "
+          "import {}; print(time.time() - t)").format(program_dir, module_name)
+  output = subprocess.check_output([sys.executable, '-c', code])
+  return float(output.decode('utf-8').strip().splitlines()[-1])
+
+def time_to_first_train_call(dataset_dir, code_dir, timeout=600):
+  """Run the ingestion program until it logs its first train call, then stop
+  it. Returns (time logged by ingestion.py, wall time seen from outside)."""
+  path_ingestion = _HERE('AutoDL_ingestion_program', 'ingestion.py')
+  pattern = re.compile(r'Time to first train call\s+([0-9.]+) sec')
+  begin = time.time()
+  process = subprocess.Popen([sys.executable, '-u', path_ingestion,
+                              dataset_dir, code_dir],
+                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+  try:
+    for line in iter(process.stdout.readline, b''):
+      match = pattern.search(line.decode('utf-8', 'replace'))
+      if match:
+        return float(match.group(1)), time.time() - begin
+      if time.time() - begin > timeout:
+        break
+  finally:
+    process.kill()
+    process.wait()
+  raise RuntimeError("Ingestion program did not reach its first train call.")
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+  parser.add_argument('-dataset_dir', default=_HERE('AutoDL_sample_data'))
+  parser.add_argument('-code_dir', default=_HERE('AutoDL_sample_code_submission'))
+  parser.add_argument('-repeat', type=int, default=5,
+                      help="Number of runs of each import measure.")
+  args = parser.parse_args()
+
+  print("=== Import time (median of {} runs) ===".format(args.repeat))
+  for program, modules in sorted(STARTUP_IMPORTS.items()):
+    for module_name in modules:
+      times = sorted(time_import(_HERE(program), module_name)
+                     for _ in range(args.repeat))
+      print("{:<26} {:<10} {:6.3f} sec".format(program, module_name,
+                                              times[len(times) // 2]))
+
+  print("=== Ingestion program ===")
+  logged, wall = time_to_first_train_call(os.path.abspath(args.dataset_dir),
+                                          os.path.abspath(args.code_dir))
+  print("Time to first train call: {:.2f} sec (wall time {:.2f} sec)"\
+        .format(logged, wall))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,127 @@
+"""Benchmark of the throughput of the TensorFlow-free TFRecord reader.
+
+This script reports the time to read all records of TFRecord files, and the
+resulting throughput, with:
+  - tfrecord_index.read_tfrecord_file, without checking the crc of the records;
+  - tfrecord_index.read_tfrecord_file, checking the crc (with the fast crc32c
+    module if one is installed, in pure Python otherwise);
+  - tf.data.TFRecordDataset (if TensorFlow is installed), which checks the crc.
+By default the files are synthetic (random records); use -files to read the
+shards of a real dataset.
+
+Run
+```
+python benchmark_tfrecord_reader.py -num_records=20000 -record_size=4096
+python benchmark_tfrecord_reader.py -files='./AutoDL_sample_data/miniciao.data/*/*.tfrecord'
+```
+in the starting kit directory.
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import numpy as np
+
+def _HERE(*args):
+    h = os.path.dirname(os.path.realpath(__file__))
+    return os.path.join(h, *args)
+
+sys.path.append(_HERE('AutoDL_ingestion_program'))
+import tfrecord_index
+
+def write_tfrecord_file(path, records):
+  """Write `records` (bytes) to a TFRecord file, as TensorFlow does."""
+  with open(path, 'wb') as f:
+    for data in records:
+      length = struct.pack('<Q', len(data))
+      f.write(length)
+      f.write(struct.pack('<I', tfrecord_index.masked_crc32c(length)))
+      f.write(data)
+      f.write(struct.pack('<I', tfrecord_index.masked_crc32c(data)))
+
+def read_python(files, check_crc):
+  """Returns the number of records of `files` read by tfrecord_index."""
+  count = 0
+  for path in files:
+    for _ in tfrecord_index.read_tfrecord_file(path, check_crc=check_crc):
+      count += 1
+  return count
+
+def read_tensorflow(files):
+  """Returns the number of records of `files` read by tf.data."""
+  import tensorflow as tf
+  next_element = tf.data.TFRecordDataset(files)\
+                   .make_one_shot_iterator().get_next()
+  count = 0
+  with tf.Session() as sess:
+    try:
+      while True:
+        sess.run(next_element)
+        count += 1
+    except tf.errors.OutOfRangeError:
+      pass
+  return count
+
+def get_readers():
+  """Returns a list of (name, function of the list of files)."""
+  crc_name = 'crc (C)' if tfrecord_index.HAS_FAST_CRC32C else 'crc (Python)'
+  readers = [('tfrecord_index, no crc',
+              lambda files: read_python(files, False)),
+             ('tfrecord_index, ' + crc_name,
+              lambda files: read_python(files, True))]
+  try:
+    import tensorflow
+    readers.append(('tf.data.TFRecordDataset', read_tensorflow))
+  except ImportError:
+    print("TensorFlow is not installed: tf.data is not benchmarked.")
+  return readers
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+  parser.add_argument('-files', default=None,
+                      help="Glob pattern of TFRecord files to read. If not "
+                           "given, synthetic files are written.")
+  parser.add_argument('-num_records', type=int, default=20000,
+                      help="Number of synthetic records.")
+  parser.add_argument('-record_size', type=int, default=4096,
+                      help="Size in bytes of the synthetic records.")
+  parser.add_argument('-num_files', type=int, default=4,
+                      help="Number of synthetic files.")
+  args = parser.parse_args()
+  tmp_dir = None
+  try:
+    if args.files:
+      files = sorted(glob.glob(args.files))
+    else:
+      tmp_dir = tempfile.mkdtemp(prefix='benchmark_tfrecord_reader_')
+      random_state = np.random.RandomState(0)
+      files = []
+      for i in range(args.num_files):
+        path = os.path.join(tmp_dir, 'sample-{:05d}.tfrecord'.format(i))
+        num_records = args.num_records // args.num_files
+        write_tfrecord_file(
+            path, (random_state.bytes(args.record_size)
+                   for _ in range(num_records)))
+        files.append(path)
+    size = sum(os.path.getsize(path) for path in files)
+    print("{} files, {:.2f} MB".format(len(files), size / 1024.0**2))
+    readers = get_readers()
+    print("{:<36} {:>10} {:>10} {:>12}".format(
+        'reader', 'records', 'time (s)', 'MB/s'))
+    for name, read in readers:
+      begin = time.time()
+      count = read(files)
+      duration = time.time() - begin
+      print("{:<36} {:>10} {:>10.3f} {:>12.1f}".format(
+          name, count, duration, size / 1024.0**2 / duration))
+  finally:
+    if tmp_dir is not None:
+      shutil.rmtree(tmp_dir)
+
+if __name__ == '__main__':
+  main()
@@ -15,13 +15,25 @@ run
 ```
 python run_local_test.py
 ```
+
+With `-scoring_service`, predictions are scored by a local scoring service
+(AutoDL_scoring_program/scoring_service.py) to which the ingestion program
+sends them directly, instead of by the scoring program reading prediction
+files. Useful e.g. for hyperparameter sweeps. No learning curve is drawn in
+this mode.
 """
 
 import tensorflow as tf
+import json
 import os
+import socket
+import sys
 import time
+import subprocess
 import webbrowser
+from contextlib import closing
 from multiprocessing import Process
+from urllib.request import urlopen
 
 def _HERE(*args):
     h = os.path.dirname(os.path.realpath(__file__))
@@ -36,6 +48,46 @@ def get_path_to_scoring_program(starting_kit_dir):
                       'AutoDL_scoring_program', 'score.py')
 
 
+def get_path_to_scoring_service(starting_kit_dir):
+  return os.path.join(starting_kit_dir,
+                      'AutoDL_scoring_program', 'scoring_service.py')
+
+def get_free_port():
+  """Returns a TCP port of localhost that no process is listening to."""
+  with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as s:
+    s.bind(('127.0.0.1', 0))
+    return s.getsockname()[1]
+
+def run_with_scoring_service(dataset_dir, code_dir):
+  """Run ingestion with a local scoring service instead of the scoring
+  program, and print the final ALC."""
+  starting_kit_dir = os.path.dirname(os.path.realpath(__file__))
+  path_ingestion = get_path_to_ingestion_program(starting_kit_dir)
+  path_service = get_path_to_scoring_service(starting_kit_dir)
+  port = get_free_port()
+  url = 'http://127.0.0.1:{}'.format(port)
+  service_process = subprocess.Popen([sys.executable, path_service,
+                                      dataset_dir, str(port)])
+  try:
+    # Wait until the service is ready
+    for i in range(30):
+      try:
+        urlopen(url + '/scores').close()
+        break
+      except IOError:
+        time.sleep(1)
+    # The ingestion program finds the service with this environment variable
+    env = dict(os.environ, AUTODL_SCORING_SERVICE=url)
+    subprocess.call([sys.executable, path_ingestion, dataset_dir, code_dir],
+                    env=env)
+    with closing(urlopen(url + '/scores')) as response:
+      scores = json.loads(response.read().decode('utf-8'))
+    print("Area under learning curve: {:.4f} ({} predictions)"\
+          .format(scores['alc'], len(scores['points'])))
+  finally:
+    service_process.terminate()
+    service_process.wait()
+
 def run_baseline(dataset_dir, code_dir):
     # Current directory containing this script
     starting_kit_dir = os.path.dirname(os.path.realpath(__file__))
@@ -83,7 +135,15 @@ if __name__ == '__main__':
                           "Directory containing a `model.py` file. Specify this "
                           "argument if you want to test on a different algorithm.")
 
+    tf.flags.DEFINE_boolean('scoring_service', False,
+                            "Score predictions with a local scoring service "
+                            "(see scoring_service.py) instead of the scoring "
+                            "program.")
+
     FLAGS = tf.flags.FLAGS
     dataset_dir = FLAGS.dataset_dir
     code_dir = FLAGS.code_dir
-    run_baseline(dataset_dir, code_dir)
+    if FLAGS.scoring_service:
+      run_with_scoring_service(dataset_dir, code_dir)
+    else:
+      run_baseline(dataset_dir, code_dir)
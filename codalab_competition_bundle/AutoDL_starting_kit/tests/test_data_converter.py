@@ -0,0 +1,113 @@
+"""file_to_libsvm builds the same csr matrices as the previous implementation,
+which rewrote the file to a temporary libsvm file read by scikit-learn.
+
+Run
+```
+python -m pytest tests
+```
+in the starting kit directory.
+"""
+
+import os
+import sys
+import numpy as np
+import pytest
+
+def _HERE(*args):
+  h = os.path.dirname(os.path.realpath(__file__))
+  return os.path.join(h, *args)
+
+sys.path.append(_HERE(os.pardir, 'AutoDL_ingestion_program'))
+import data_converter
+
+def previous_file_to_libsvm(filename, data_binary, n_features):
+  from sklearn.datasets import load_svmlight_file
+  with open(filename, "r") as data_file:
+    lines = data_file.readlines()
+    with open('tmp.txt', 'w') as f:
+      for l in lines:
+        tmp = l.strip().split()
+        f.write("0 ")
+        for i in range(len(tmp)):
+          if(data_binary):
+            f.write(tmp[i]+":1 ")
+          else:
+            f.write(tmp[i]+" ")
+        f.write("\n")
+  l = load_svmlight_file('tmp.txt', zero_based=False, n_features=n_features)
+  os.remove("tmp.txt")
+  return l[0]
+
+def dense_from_lines(lines, data_binary, n_features):
+  """Reference dense matrix, parsing each token in Python."""
+  dense = np.zeros((len(lines), n_features))
+  for row, line in enumerate(lines):
+    for token in line.split():
+      if data_binary:
+        dense[row, int(token) - 1] = 1
+      else:
+        index, value = token.split(':')
+        dense[row, int(index) - 1] = float(value)
+  return dense
+
+def make_lines(data_binary, num_lines=50, n_features=20, seed=0):
+  random_state = np.random.RandomState(seed)
+  lines = []
+  for row in range(num_lines):
+    # Some patterns without any nonzero feature
+    num_nonzero = random_state.randint(0, 6) if row % 10 else 0
+    features = np.sort(random_state.choice(n_features, num_nonzero,
+                                           replace=False)) + 1
+    if data_binary:
+      tokens = [str(i) for i in features]
+    else:
+      tokens = ['{}:{}'.format(i, random_state.choice([0.5, -2, 1e-3, 7]))
+                for i in features]
+    lines.append(' '.join(tokens) + (' ' if row % 3 else ''))
+  return lines
+
+def write_lines(tmp_path, lines):
+  path = str(tmp_path / 'sample.data')
+  with open(path, 'w') as f:
+    f.write('\n'.join(lines) + '\n')
+  return path
+
+@pytest.mark.parametrize('data_binary', [False, True])
+@pytest.mark.parametrize('chunk_lines', [1, 7, 10000])
+def test_file_to_libsvm(tmp_path, data_binary, chunk_lines):
+  lines = make_lines(data_binary)
+  path = write_lines(tmp_path, lines)
+  matrix = data_converter.file_to_libsvm(path, data_binary, 20,
+                                         chunk_lines=chunk_lines)
+  assert matrix.shape == (len(lines), 20)
+  np.testing.assert_array_equal(matrix.toarray(),
+                                dense_from_lines(lines, data_binary, 20))
+  assert not os.path.exists('tmp.txt')
+
+@pytest.mark.parametrize('data_binary', [False, True])
+def test_file_to_libsvm_equals_previous(tmp_path, monkeypatch, data_binary):
+  pytest.importorskip('sklearn')
+  monkeypatch.chdir(tmp_path) # The previous version writes tmp.txt here
+  path = write_lines(tmp_path, make_lines(data_binary))
+  matrix = data_converter.file_to_libsvm(path, data_binary, 20)
+  expected = previous_file_to_libsvm(path, data_binary, 20)
+  assert matrix.shape == expected.shape
+  np.testing.assert_array_equal(matrix.toarray(), expected.toarray())
+
+def test_file_to_libsvm_errors(tmp_path):
+  path = write_lines(tmp_path, ['1:1 25:2'])
+  with pytest.raises(ValueError):
+    data_converter.file_to_libsvm(path, False, 20) # Index above n_features
+  path = write_lines(tmp_path, ['1:1 3:x'])
+  with pytest.raises(ValueError):
+    data_converter.file_to_libsvm(path, False, 20)
+  # Indices that are not integers, which would be truncated
+  path = write_lines(tmp_path, ['1:1 3.7:2'])
+  with pytest.raises(ValueError):
+    data_converter.file_to_libsvm(path, False, 20)
+  path = write_lines(tmp_path, ['1 3.7'])
+  with pytest.raises(ValueError):
+    data_converter.file_to_libsvm(path, True, 20)
+  path = write_lines(tmp_path, ['1 x'])
+  with pytest.raises(ValueError):
+    data_converter.file_to_libsvm(path, True, 20)
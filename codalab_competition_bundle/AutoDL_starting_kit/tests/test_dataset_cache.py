@@ -0,0 +1,61 @@
+"""The cache of decoded examples of AutoDLDataset can be read by iterators
+stopped before the end of the data, as those of the models' train() and
+test() are.
+
+Needs TensorFlow. Run
+```
+python -m pytest tests
+```
+in the starting kit directory.
+"""
+
+import os
+import sys
+import numpy as np
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+
+def _HERE(*args):
+  h = os.path.dirname(os.path.realpath(__file__))
+  return os.path.join(h, *args)
+
+sys.path.append(_HERE(os.pardir, 'AutoDL_ingestion_program'))
+from dataset import AutoDLDataset
+
+DATASET_NAME = _HERE(os.pardir, 'AutoDL_sample_data', 'miniciao.data', 'train')
+
+def read_examples(dataset, max_examples=None):
+  """Returns the first `max_examples` examples of `dataset` (all if None),
+  read with a new iterator."""
+  next_element = dataset.make_one_shot_iterator().get_next()
+  examples = []
+  with tf.Session() as sess:
+    try:
+      while max_examples is None or len(examples) < max_examples:
+        examples.append(sess.run(next_element))
+    except tf.errors.OutOfRangeError:
+      pass
+  return examples
+
+@pytest.mark.parametrize('parse_batch_size', [None, 4])
+def test_cache_after_partial_reads(tmp_path, parse_batch_size):
+  with tf.Graph().as_default():
+    expected = read_examples(
+        AutoDLDataset(DATASET_NAME, parse_batch_size=parse_batch_size)\
+          .get_dataset())
+  assert len(expected) > 3
+  cache_dir = str(tmp_path / 'cache')
+  for _ in range(2): # Writes the cache entry, then reads it
+    with tf.Graph().as_default():
+      dataset = AutoDLDataset(DATASET_NAME, cache_dir=cache_dir,
+                              parse_batch_size=parse_batch_size)
+      assert dataset.is_cached()
+      # Stopped before the end, then read again by new iterators
+      assert len(read_examples(dataset.get_dataset(), 3)) == 3
+      assert len(read_examples(dataset.get_dataset(), 1)) == 1
+      examples = read_examples(dataset.get_dataset())
+    assert len(examples) == len(expected)
+    for example, expected_example in zip(examples, expected):
+      for value, expected_value in zip(example, expected_example):
+        np.testing.assert_array_equal(value, expected_value)
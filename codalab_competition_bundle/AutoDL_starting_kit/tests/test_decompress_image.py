@@ -0,0 +1,85 @@
+"""dataset_utils.decompress_image gives images of the requested shape, with
+the values of the full-size image cropped and resized, for JPEG and PNG.
+
+Needs TensorFlow. Run
+```
+python -m pytest tests
+```
+in the starting kit directory.
+"""
+
+import os
+import sys
+import numpy as np
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+
+def _HERE(*args):
+  h = os.path.dirname(os.path.realpath(__file__))
+  return os.path.join(h, *args)
+
+sys.path.append(_HERE(os.pardir, 'AutoDL_ingestion_program'))
+import dataset_utils
+
+HEIGHT, WIDTH = 64, 48
+
+def make_image():
+  """A smooth RGB image (uint8), so that JPEG artifacts and DCT downscaling
+  change its values only slightly."""
+  rows, cols = np.mgrid[0:HEIGHT, 0:WIDTH]
+  image = np.stack([rows * 255. / HEIGHT, cols * 255. / WIDTH,
+                    (rows + cols) * 255. / (HEIGHT + WIDTH)], axis=-1)
+  return image.astype(np.uint8)
+
+def run(tensor):
+  with tf.Session() as sess:
+    return sess.run(tensor)
+
+def encode(image, image_format):
+  if image_format == 'jpeg':
+    return run(tf.image.encode_jpeg(image, quality=100))
+  return run(tf.image.encode_png(image))
+
+def expected_image(full_image, image_size, crop_box):
+  """The full-size decoded image, cropped then resized."""
+  image = tf.constant(full_image)
+  if crop_box is not None:
+    image = tf.image.crop_to_bounding_box(image, *crop_box)
+  if image_size is not None:
+    image = tf.image.resize_images(image, size=image_size)
+  return run(image)
+
+@pytest.mark.parametrize('image_format', ['jpeg', 'png'])
+@pytest.mark.parametrize('image_size,crop_box', [
+    (None, None),
+    (None, (8, 4, 32, 24)),
+    ((16, 12), None),
+    ((20, 10), None), # Not a multiple of the image size
+    ((16, 12), (8, 4, 32, 24)),
+])
+def test_decompress_image(image_format, image_size, crop_box):
+  with tf.Graph().as_default():
+    compressed_image = encode(make_image(), image_format)
+    full_image = run(dataset_utils.decompress_image(compressed_image))
+    image_tensor = dataset_utils.decompress_image(
+        compressed_image, image_size=image_size, crop_box=crop_box)
+    image = run(image_tensor)
+    expected = expected_image(full_image, image_size, crop_box)
+  if image_size is not None:
+    shape = tuple(image_size) + (3,)
+  elif crop_box is not None:
+    shape = tuple(crop_box[2:]) + (3,)
+  else:
+    shape = (HEIGHT, WIDTH, 3)
+  assert image.shape == shape
+  if image_size is not None or crop_box is not None:
+    assert tuple(image_tensor.shape.as_list()) == shape # Static shape
+  assert image.dtype == np.float32
+  assert 0 <= image.min() and image.max() <= 1
+  if image_format == 'png':
+    # Decoded fully, then cropped and resized: the same operations
+    np.testing.assert_allclose(image, expected, atol=1e-6)
+  else:
+    # JPEG images are decoded at a reduced size (DCT downscaling)
+    np.testing.assert_allclose(image, expected, atol=0.05)
@@ -0,0 +1,137 @@
+"""The learning curve built from the manifest of predictions is the one built
+from the prediction files, and its area (ALC), updated point by point, is the
+one previously computed from the whole curve.
+
+Run
+```
+python -m pytest tests
+```
+in the starting kit directory.
+"""
+
+import json
+import os
+import sys
+import numpy as np
+import pytest
+
+def _HERE(*args):
+  h = os.path.dirname(os.path.realpath(__file__))
+  return os.path.join(h, *args)
+
+sys.path.append(_HERE(os.pardir, 'AutoDL_scoring_program'))
+import score
+
+START = 1000000.
+
+def make_solution(num_examples=100, num_classes=4, seed=0):
+  random_state = np.random.RandomState(seed)
+  return np.eye(num_classes)[random_state.randint(num_classes,
+                                                  size=num_examples)]
+
+def new_learning_curve(solution):
+  return score.LearningCurve(solution=solution,
+                             scoring_function=score.autodl_bac, start=START,
+                             is_multiclass_task=True)
+
+def write_prediction(prediction_dir, name, solution, timestamp, seed):
+  """Write a prediction file and announce it in the manifest, as the
+  ingestion program does."""
+  random_state = np.random.RandomState(seed)
+  prediction = solution * random_state.rand() + random_state.rand(
+      *solution.shape)
+  path = os.path.join(prediction_dir, name)
+  np.savetxt(path, prediction)
+  os.utime(path, (timestamp, timestamp))
+  with open(os.path.join(prediction_dir, score.MANIFEST_FILENAME), 'a') as f:
+    f.write(json.dumps({'event': 'prediction', 'file': name,
+                        'wall': timestamp}) + '\n')
+  return path
+
+def follow(manifest, learning_curve, prediction_dir):
+  """Process the new entries of the manifest, as the scoring program does.
+  Returns the number of new entries."""
+  entries = manifest.read_new_entries()
+  for entry in entries:
+    learning_curve.add_prediction_file(
+        os.path.join(prediction_dir, entry['file']), entry['wall'])
+  return len(entries)
+
+def test_manifest_gives_the_curve_of_the_files(tmp_path):
+  prediction_dir = str(tmp_path)
+  solution = make_solution()
+  manifest = score.ManifestFollower(prediction_dir)
+  from_manifest = new_learning_curve(solution)
+  paths = []
+  # Written in two batches, the last prediction before the previous ones
+  for i, timestamp in enumerate([START + 3, START + 40, START + 20]):
+    paths.append(write_prediction(prediction_dir, 'mini.predict_{}'.format(i),
+                                  solution, timestamp, seed=i))
+    if i == 1:
+      assert follow(manifest, from_manifest, prediction_dir) == 2
+  assert follow(manifest, from_manifest, prediction_dir) == 1
+  assert follow(manifest, from_manifest, prediction_dir) == 0 # No new entry
+  from_files = new_learning_curve(solution)
+  assert from_files.update(paths) == 3
+  assert len(from_manifest) == len(from_files) == 3
+  assert from_manifest.get_curve() == from_files.get_curve()
+  assert from_manifest.get_alc() == pytest.approx(from_files.get_alc(),
+                                                  rel=1e-12)
+
+  # A rewritten prediction, announced again, replaces its point
+  write_prediction(prediction_dir, 'mini.predict_0', solution, START + 60,
+                   seed=10)
+  assert follow(manifest, from_manifest, prediction_dir) == 1
+  assert from_files.update(paths) == 1
+  assert len(from_manifest) == len(from_files) == 3
+  assert from_manifest.get_curve() == from_files.get_curve()
+  assert from_manifest.get_alc() == pytest.approx(from_files.get_alc(),
+                                                  rel=1e-12)
+
+def previous_alc(timestamps, scores, start, X_max=score.TIME_BUDGET):
+  """ALC as computed by the previous draw_learning_curve, with sklearn's auc
+  on the whole curve."""
+  from sklearn.metrics import auc
+  sorted_pairs = sorted(zip(timestamps, scores))
+  X = [t - start + 1 for t,_ in sorted_pairs] # Since X on log scale, set first x=1
+  Y = [s for _,s in sorted_pairs]
+  # Add origin as the first point of the curve
+  X.insert(0, 1) # X starts from 1 to use log
+  Y.insert(0, 0)
+  # Truncate X using X_max
+  log_X = [np.log(x+1)/np.log(X_max+1) for x in X if x <= X_max] # log_X \in [0, 1]
+  X = X[:len(log_X)]
+  Y = Y[:len(log_X)]
+  # Add a point on the final line using last prediction
+  X.append(X_max)
+  Y.append(Y[-1])
+  log_X.append(1)
+  if len(log_X) >= 2:
+    alc = auc(log_X,Y)
+  else:
+    alc = 0
+  return alc
+
+@pytest.mark.parametrize('time_budget', [score.TIME_BUDGET, 100])
+@pytest.mark.parametrize('in_order', [True, False])
+def test_incremental_alc_equals_previous_alc(time_budget, in_order):
+  pytest.importorskip('sklearn')
+  random_state = np.random.RandomState(0)
+  # Some predictions after the time budget, which truncates the curve
+  timestamps = START + random_state.uniform(0, 1.5 * time_budget, size=30)
+  if in_order:
+    timestamps.sort()
+  scores = random_state.uniform(-0.2, 1, size=30)
+  # Each prediction is its score (as a 1x1 array)
+  learning_curve = score.LearningCurve(
+      solution=np.zeros((1, 1)),
+      scoring_function=lambda solution, prediction: prediction[0, 0],
+      start=START, is_multiclass_task=False, time_budget=time_budget)
+  assert learning_curve.get_alc() == 0
+  for i, (timestamp, y) in enumerate(zip(timestamps, scores)):
+    learning_curve.add_prediction(np.array([[y]]), timestamp,
+                                  'prediction_{}'.format(i))
+    # Including the final horizontal segment to the time budget
+    assert learning_curve.get_alc() == pytest.approx(
+        previous_alc(timestamps[:i + 1], scores[:i + 1], START, time_budget),
+        rel=1e-9, abs=1e-12)
@@ -0,0 +1,320 @@
+"""The vectorized helpers and metrics of libscores give the same results as
+their previous implementations (copied below, with the `previous_` prefix).
+
+Run
+```
+python -m pytest tests
+```
+in the starting kit directory.
+"""
+
+import os
+import sys
+import numpy as np
+import pytest
+
+def _HERE(*args):
+  h = os.path.dirname(os.path.realpath(__file__))
+  return os.path.join(h, *args)
+
+sys.path.append(_HERE(os.pardir, 'AutoDL_scoring_program'))
+import libscores
+
+def previous_tiedrank(a):
+  ''' Return the ranks (with base 1) of a list resolving ties by averaging.
+   This works for numpy arrays.'''
+  m = len(a)
+  # Sort a in ascending order (sa=sorted vals, i=indices)
+  i = a.argsort()
+  sa = a[i]
+  # Find unique values
+  uval = np.unique(a)
+  # Test whether there are ties
+  R = np.arange(m, dtype=float) + 1  # Ranks with base 1
+  if len(uval) != m:
+    # Average the ranks for the ties
+    oldval = sa[0]
+    newval = sa[0]
+    k0 = 0
+    for k in range(1, m):
+      newval = sa[k]
+      if newval == oldval:
+        # moving average
+        R[k0:k + 1] = R[k - 1] * (k - k0) / (k - k0 + 1) + R[k] / (k - k0 + 1)
+      else:
+        k0 = k;
+        oldval = newval
+  # Invert the index
+  S = np.empty(m)
+  S[i] = R
+  return S
+
+def previous_auc(solution, prediction):
+  ''' AUC of each column, ranking the columns one at a time.'''
+  label_num = solution.shape[1]
+  auc = np.empty(label_num)
+  for k in range(label_num):
+    r_ = previous_tiedrank(prediction[:, k])
+    s_ = solution[:, k]
+    npos = sum(s_ == 1)
+    nneg = sum(s_ < 1)
+    auc[k] = (sum(r_[s_ == 1]) - npos * (npos + 1) / 2) / (nneg * npos)
+  return auc
+
+def get_predictions(shape, seed=0):
+  """Predictions without ties, with many ties and with saturated values."""
+  random_state = np.random.RandomState(seed)
+  return {'distinct': random_state.rand(*shape),
+          'ties': random_state.randint(4, size=shape) / 4.,
+          'saturated': np.clip(random_state.randn(*shape), 0, 1),
+          'constant': np.zeros(shape)}
+
+@pytest.mark.parametrize('num_examples', [1, 2, 10, 1000])
+def test_tiedrank(num_examples):
+  for name, prediction in get_predictions((num_examples,)).items():
+    np.testing.assert_allclose(libscores.tiedrank(prediction),
+                               previous_tiedrank(prediction), rtol=1e-12,
+                               err_msg=name)
+
+@pytest.mark.parametrize('shape', [(1, 1), (10, 3), (1000, 7), (5, 0)])
+def test_tiedrank_2d(shape):
+  for name, prediction in get_predictions(shape).items():
+    expected = np.empty(shape)
+    for k in range(shape[1]):
+      expected[:, k] = previous_tiedrank(prediction[:, k])
+    np.testing.assert_allclose(libscores.tiedrank_2d(prediction), expected,
+                               rtol=1e-12, err_msg=name)
+
+@pytest.mark.parametrize('num_threads', [None, 3])
+def test_auc_metric(num_threads):
+  random_state = np.random.RandomState(1)
+  solution = (random_state.rand(500, 6) < 0.4) * 1.
+  for name, prediction in get_predictions(solution.shape).items():
+    expected = 2 * libscores.mvmean(previous_auc(solution, prediction)) - 1
+    assert libscores.auc_metric(solution, prediction,
+                                num_threads=num_threads) ==\
+        pytest.approx(expected, rel=1e-12), name
+
+def previous_compute_all_scores(solution, prediction):
+  ''' compute_all_scores running each metric independently.'''
+  missing_score = -0.999999
+  scoring = {'BAC (multilabel)': libscores.nbac_binary_score,
+             'BAC (multiclass)': libscores.nbac_multiclass_score,
+             'F1  (multilabel)': libscores.f1_binary_score,
+             'F1  (multiclass)': libscores.f1_multiclass_score,
+             'Regression ABS  ': libscores.a_metric,
+             'Regression R2   ': libscores.r2_metric,
+             'AUC (multilabel)': libscores.auc_metric,
+             'PAC (multilabel)': libscores.npac_binary_score,
+             'PAC (multiclass)': libscores.npac_multiclass_score}
+  # Normalize/sanitize inputs
+  [csolution, cprediction] = libscores.normalize_array(solution, prediction)
+  solution = libscores.sanitize_array(solution);
+  prediction = libscores.sanitize_array(prediction)
+  # Compute all scores
+  score_names = sorted(scoring.keys())
+  scores = {}
+  for key in score_names:
+    scoring_func = scoring[key]
+    try:
+      if key == 'Regression R2   ' or key == 'Regression ABS  ':
+        scores[key] = scoring_func(solution, prediction)
+      else:
+        scores[key] = scoring_func(csolution, cprediction)
+    except:
+      scores[key] = missing_score
+  return scores
+
+def get_classification_cases(seed=2):
+  """(solution, prediction) pairs of multilabel, multiclass and binary tasks,
+  with a class without positive example."""
+  random_state = np.random.RandomState(seed)
+  multilabel = (random_state.rand(300, 6) < 0.3) * 1.
+  multilabel[:, 2] = 0
+  multiclass = np.eye(4)[random_state.randint(4, size=300)]
+  binary = (random_state.rand(300, 1) < 0.5) * 1.
+  cases = {}
+  for task, solution in [('multilabel', multilabel),
+                         ('multiclass', multiclass), ('binary', binary)]:
+    for name, prediction in get_predictions(solution.shape, seed).items():
+      cases[task + ', ' + name] = (solution, prediction)
+  return cases
+
+def test_compute_all_scores():
+  for name, (solution, prediction) in get_classification_cases().items():
+    scores = libscores.compute_all_scores(solution.copy(), prediction.copy())
+    expected = previous_compute_all_scores(solution.copy(),
+                                           prediction.copy())
+    assert sorted(scores) == sorted(expected)
+    for key in ['BAC (multilabel)', 'F1  (multilabel)', 'PAC (multilabel)']:
+      assert scores[key] != -0.999999, name + ': ' + key # Not missing
+    for key in expected:
+      np.testing.assert_allclose(scores[key], expected[key], rtol=1e-12,
+                                 err_msg=name + ': ' + key)
+
+def test_metric_engine():
+  for name, (solution, prediction) in get_classification_cases().items():
+    engine = libscores.MetricEngine(solution, prediction)
+    for task in ['binary.classification', 'multiclass.classification']:
+      assert engine.bac(task) ==\
+          libscores.bac_metric(solution, prediction, task), name
+      assert engine.f1(task) ==\
+          libscores.f1_metric(solution, prediction, task), name
+      np.testing.assert_allclose(
+          engine.pac(task), libscores.pac_metric(solution, prediction, task),
+          rtol=1e-12, err_msg=name)
+    np.testing.assert_allclose(engine.auc(),
+                               libscores.auc_metric(solution, prediction),
+                               rtol=1e-12, err_msg=name)
+
+def previous_acc_stat(solution, prediction):
+  TN = sum(np.multiply((1 - solution), (1 - prediction)))
+  FN = sum(np.multiply(solution, (1 - prediction)))
+  TP = sum(np.multiply(solution, prediction))
+  FP = sum(np.multiply((1 - solution), prediction))
+  return (TN, FP, TP, FN)
+
+# Previous binarize_predictions, sanitize_array and normalize_array, and the
+# cases of benchmark_preprocessing.py
+
+def previous_binarize_predictions(array, task='binary.classification'):
+  bin_array = np.zeros(array.shape)
+  if (task != 'multiclass.classification') or (array.shape[1] == 1):
+    bin_array[array >= 0.5] = 1
+  else:
+    sample_num = array.shape[0]
+    for i in range(sample_num):
+      j = np.argmax(array[i, :])
+      bin_array[i, j] = 1
+  return bin_array
+
+def previous_sanitize_array(array):
+  a = np.ravel(array)
+  maxi = np.nanmax((list(map(lambda x: x != float('inf'), a))))
+  mini = np.nanmin((list(map(lambda x: x != float('-inf'), a))))
+  array[array == float('inf')] = maxi
+  array[array == float('-inf')] = mini
+  mid = (maxi + mini) / 2
+  array[np.isnan(array)] = mid
+  return array
+
+def previous_normalize_array(solution, prediction):
+  sol = np.ravel(solution)
+  maxi = np.nanmax((list(map(lambda x: x != float('inf'), sol))))
+  mini = np.nanmin((list(map(lambda x: x != float('-inf'), sol))))
+  if maxi == mini:
+    print('Warning, cannot normalize')
+    return [solution, prediction]
+  diff = maxi - mini
+  mid = (maxi + mini) / 2.
+  new_solution = np.copy(solution)
+  new_solution[solution >= mid] = 1
+  new_solution[solution < mid] = 0
+  new_prediction = (np.copy(prediction) - float(mini)) / float(diff)
+  new_prediction[new_prediction > 1] = 1
+  new_prediction[new_prediction < 0] = 0
+  return [new_solution, new_prediction]
+
+def same(x, y):
+  if isinstance(x, list):
+    return all(same(a, b) for a, b in zip(x, y))
+  return np.array_equal(x, y, equal_nan=True)
+
+def get_cases(shape, random_state):
+  """Returns [(name, solution, prediction)] for a one-hot solution of the
+  given shape."""
+  solution = np.eye(shape[1])[random_state.randint(0, shape[1], shape[0])]
+  scores = random_state.randn(*shape) * 3
+  # NaN and Inf in the prediction, NaN in the solution
+  non_finite = scores.copy()
+  mask = random_state.rand(*shape)
+  non_finite[mask < 0.01] = np.nan
+  non_finite[(mask >= 0.01) & (mask < 0.02)] = np.inf
+  non_finite[(mask >= 0.02) & (mask < 0.03)] = -np.inf
+  non_finite_solution = solution.copy()
+  non_finite_solution[random_state.rand(*shape) < 0.01] = np.nan
+  return [('[0, 1]', solution, random_state.rand(*shape)),
+          ('unnormalized', solution, scores),
+          ('non-finite', non_finite_solution, non_finite)]
+
+PREPROCESSING_SHAPES = [(1, 1), (50, 1), (200, 7)]
+
+@pytest.mark.parametrize('shape', PREPROCESSING_SHAPES)
+def test_binarize_predictions(shape):
+  for case, _, prediction in get_cases(shape, np.random.RandomState(0)):
+    for task in ['binary.classification', 'multiclass.classification']:
+      expected = previous_binarize_predictions(prediction, task)
+      assert same(libscores.binarize_predictions(prediction, task),
+                  expected), case
+      assert same(libscores.binarize_predictions(prediction, task,
+                                                 dtype=bool),
+                  expected.astype(bool)), case
+
+@pytest.mark.parametrize('shape', PREPROCESSING_SHAPES)
+def test_sanitize_array(shape):
+  for case, solution, prediction in get_cases(shape,
+                                              np.random.RandomState(0)):
+    for array in [solution, prediction]:
+      copy = array.copy()
+      result = libscores.sanitize_array(copy)
+      assert result is copy # In place
+      assert same(result, previous_sanitize_array(array.copy())), case
+
+@pytest.mark.parametrize('shape', PREPROCESSING_SHAPES)
+def test_normalize_array_of_binary_solutions(shape):
+  for case, solution, prediction in get_cases(shape,
+                                              np.random.RandomState(0)):
+    assert same(libscores.normalize_array(solution, prediction),
+                previous_normalize_array(solution, prediction)), case
+
+def get_non_binary_cases(shape, random_state):
+  """Returns [(name, solution, prediction)] for solutions not in {0, 1}."""
+  prediction = random_state.randn(*shape) * 3
+  continuous = random_state.randn(*shape) * 10
+  integers = 2. * random_state.randint(0, 3, shape) # In {0, 2, 4}
+  non_finite = continuous.copy()
+  mask = random_state.rand(*shape)
+  non_finite[mask < 0.1] = np.nan
+  non_finite[(mask >= 0.1) & (mask < 0.2)] = np.inf
+  return [('continuous', continuous, prediction),
+          ('{0, 2, 4}', integers, prediction),
+          ('NaN and Inf', non_finite, prediction),
+          ('constant', np.full(shape, 3.), prediction)]
+
+@pytest.mark.parametrize('shape', PREPROCESSING_SHAPES)
+def test_normalize_array_of_non_binary_solutions(shape):
+  for case, solution, prediction in get_non_binary_cases(
+      shape, np.random.RandomState(0)):
+    assert same(libscores.normalize_array(solution, prediction),
+                previous_normalize_array(solution, prediction)), case
+
+def test_normalize_array_of_solution_with_minus_inf():
+  # As the previous version, fails on the max and min of the boolean masks
+  solution = np.array([[0.], [2.], [-np.inf], [4.]])
+  prediction = np.array([[-1.], [1.], [3.], [5.]])
+  with pytest.raises(TypeError):
+    previous_normalize_array(solution, prediction)
+  with pytest.raises(TypeError):
+    libscores.normalize_array(solution, prediction)
+
+@pytest.mark.parametrize('shape', PREPROCESSING_SHAPES)
+def test_acc_stat_of_boolean_arrays(shape):
+  for case, solution, prediction in get_cases(shape,
+                                              np.random.RandomState(0)):
+    solution = np.nan_to_num(solution)
+    bin_prediction = previous_binarize_predictions(prediction)
+    expected = previous_acc_stat(solution, bin_prediction)
+    results = [
+        libscores.acc_stat(solution, bin_prediction),
+        libscores.acc_stat(solution.astype(bool), bin_prediction.astype(bool)),
+    ]
+    for chunk_size in [1, 7]:
+      stats = libscores.ConfusionStatistics()
+      for begin in range(0, shape[0], chunk_size):
+        end = begin + chunk_size
+        stats.update(solution[begin:end].astype(bool),
+                     bin_prediction[begin:end].astype(bool))
+      results.append(stats.acc_stat())
+    for result in results:
+      for value, expected_value in zip(result, expected):
+        np.testing.assert_array_equal(value, expected_value, err_msg=case)
@@ -0,0 +1,80 @@
+"""The local scoring service scores predictions sent by data_io.ScoringClient
+as score.py does.
+
+Run
+```
+python -m pytest tests
+```
+in the starting kit directory.
+"""
+
+import os
+import sys
+import threading
+from urllib.error import HTTPError
+import numpy as np
+import pytest
+
+def _HERE(*args):
+  h = os.path.dirname(os.path.realpath(__file__))
+  return os.path.join(h, *args)
+
+sys.path.append(_HERE(os.pardir, 'AutoDL_scoring_program'))
+sys.path.append(_HERE(os.pardir, 'AutoDL_ingestion_program'))
+import score
+import scoring_service
+from data_io import ScoringClient
+
+START = 1000000.
+
+@pytest.fixture
+def service(tmp_path):
+  """Returns (client, solution) of a scoring service on a free port."""
+  random_state = np.random.RandomState(0)
+  solution = np.eye(4)[random_state.randint(4, size=100)]
+  solution_file = str(tmp_path / 'mini.solution')
+  np.savetxt(solution_file, solution, fmt='%d')
+  server = scoring_service.make_server(solution_file, port=0)
+  thread = threading.Thread(target=server.serve_forever)
+  thread.daemon = True
+  thread.start()
+  client = ScoringClient('http://127.0.0.1:{}'.format(server.server_port),
+                         timeout=10)
+  yield client, solution
+  client.shutdown()
+  thread.join(10)
+  server.server_close()
+
+def test_scores_of_the_service(service):
+  client, solution = service
+  assert client.scores() == {'alc': 0, 'start': None, 'points': []}
+  assert client.start(timestamp=START) == {'start': START}
+  random_state = np.random.RandomState(1)
+  learning_curve = score.LearningCurve(solution=solution,
+                                       scoring_function=score.autodl_bac,
+                                       start=START, is_multiclass_task=True)
+  for i, timestamp in enumerate([START + 5, START + 60]):
+    prediction = random_state.rand(*solution.shape).astype(np.float32)
+    name = 'mini.predict_{}'.format(i)
+    result = client.score(name, prediction, timestamp=timestamp)
+    bac, acc = learning_curve.add_prediction(prediction, timestamp, name)
+    assert result['name'] == name
+    assert result['bac'] == pytest.approx(
+        score.autodl_bac(solution, prediction), rel=1e-12)
+    assert result['bac'] == pytest.approx(bac, rel=1e-12)
+    assert result['accuracy'] == pytest.approx(acc, rel=1e-12)
+    assert result['num_predictions'] == i + 1
+  scores = client.scores()
+  assert scores['start'] == START
+  assert scores['alc'] == pytest.approx(learning_curve.get_alc(), rel=1e-12)
+  assert [point[0] for point in scores['points']] == [START + 5, START + 60]
+  assert [point[3] for point in scores['points']] ==\
+      ['mini.predict_0', 'mini.predict_1']
+  for point, expected in zip(scores['points'], learning_curve.points):
+    assert point[1] == pytest.approx(expected[1], rel=1e-12)
+
+def test_prediction_of_a_bad_shape(service):
+  client, solution = service
+  with pytest.raises(HTTPError) as error:
+    client.score('bad', np.zeros(solution.shape[1] + 1, dtype=np.float32))
+  assert error.value.code == 400
@@ -0,0 +1,127 @@
+"""Streaming (chunked) scoring gives the same scores as in-memory scoring.
+
+Run
+```
+python -m pytest tests
+```
+in the starting kit directory.
+"""
+
+import os
+import sys
+import numpy as np
+import pytest
+
+def _HERE(*args):
+  h = os.path.dirname(os.path.realpath(__file__))
+  return os.path.join(h, *args)
+
+sys.path.append(_HERE(os.pardir, 'AutoDL_scoring_program'))
+import libscores
+import score
+
+CHUNK_SIZES = [1, 7, 64, 10000]
+
+def make_multilabel(num_examples=200, num_classes=5, seed=0):
+  random_state = np.random.RandomState(seed)
+  solution = (random_state.rand(num_examples, num_classes) < 0.3) * 1.
+  prediction = random_state.rand(num_examples, num_classes)
+  # Values at the binarization threshold and at the bounds
+  prediction[::5, 0] = 0.5
+  prediction[::7, -1] = 0
+  prediction[::11, -1] = 1
+  return solution, prediction
+
+def make_multiclass(num_examples=200, num_classes=5, seed=1):
+  random_state = np.random.RandomState(seed)
+  solution = np.eye(num_classes)[random_state.randint(num_classes,
+                                                      size=num_examples)]
+  prediction = random_state.rand(num_examples, num_classes)
+  return solution, prediction
+
+def write_pair(tmp_path, solution, prediction, file_format):
+  """Write a solution and a prediction file, as text or NumPy .npy."""
+  paths = []
+  for name, array in [('solution', solution), ('prediction', prediction)]:
+    path = str(tmp_path / (name + '.' + file_format))
+    if file_format == 'npy':
+      with open(path, 'wb') as f: # np.save would append '.npy'
+        np.save(f, array)
+    else:
+      np.savetxt(path, array) # Full precision: same values once read
+    paths.append(path)
+  return paths
+
+def previous_acc_stat(solution, prediction):
+  """Confusion statistics as computed by the previous autodl_bac: column
+  sums, adding the rows one after the other."""
+  tn = sum(np.multiply((1 - solution), (1 - prediction)))
+  fn = sum(np.multiply(solution, (1 - prediction)))
+  tp = sum(np.multiply(solution, prediction))
+  fp = sum(np.multiply((1 - solution), prediction))
+  return (tn, fp, tp, fn)
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_confusion_statistics_equal_sums_over_all_rows(chunk_size):
+  solution, prediction = make_multilabel()
+  stats = libscores.ConfusionStatistics()
+  for begin in range(0, solution.shape[0], chunk_size):
+    stats.update(solution[begin:begin + chunk_size],
+                 prediction[begin:begin + chunk_size])
+  for value, expected in zip(stats.acc_stat(),
+                             previous_acc_stat(solution, prediction)):
+    np.testing.assert_array_equal(value, expected)
+
+@pytest.mark.parametrize('num_classes', [1, 5])
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_autodl_bac_does_not_depend_on_chunk_size(num_classes, chunk_size):
+  solution, prediction = make_multilabel(num_classes=num_classes)
+  expected = score.autodl_bac(solution, prediction, chunk_size=None)
+  assert score.autodl_bac(solution, prediction,
+                          chunk_size=chunk_size) == expected
+
+@pytest.mark.parametrize('file_format', ['txt', 'npy'])
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('task', ['binary.classification',
+                                  'multiclass.classification'])
+def test_streaming_metrics_equal_in_memory_metrics(tmp_path, file_format,
+                                                   chunk_size, task):
+  for solution, prediction in [make_multilabel(), make_multiclass()]:
+    solution_file, prediction_file = write_pair(tmp_path, solution,
+                                                prediction, file_format)
+    assert libscores.bac_metric_streaming(
+        solution_file, prediction_file, task, chunk_size) ==\
+        libscores.bac_metric(solution, prediction, task)
+    assert libscores.f1_metric_streaming(
+        solution_file, prediction_file, task, chunk_size) ==\
+        libscores.f1_metric(solution, prediction, task)
+
+@pytest.mark.parametrize('file_format', ['txt', 'npy'])
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_score_by_chunks_equals_in_memory_scores(tmp_path, file_format,
+                                                 chunk_size):
+  solution, prediction = make_multiclass()
+  solution_file, prediction_file = write_pair(tmp_path, solution, prediction,
+                                              file_format)
+  assert score.is_multiclass_file(solution_file, chunk_size)
+  bac, acc = score.score_by_chunks(solution_file, prediction_file, True,
+                                   chunk_size)
+  assert bac == score.autodl_bac(solution, prediction)
+  # Summed by chunks instead of all at once
+  assert acc == pytest.approx(score.accuracy(solution, prediction), rel=1e-12)
+
+  solution, prediction = make_multilabel()
+  solution_file, prediction_file = write_pair(tmp_path, solution, prediction,
+                                              file_format)
+  assert not score.is_multiclass_file(solution_file, chunk_size)
+  bac, acc = score.score_by_chunks(solution_file, prediction_file, False,
+                                   chunk_size)
+  assert bac == score.autodl_bac(solution, prediction)
+  assert acc is None
+
+def test_aligned_chunks_of_files_of_different_shapes(tmp_path):
+  solution, prediction = make_multilabel()
+  solution_file, prediction_file = write_pair(tmp_path, solution,
+                                              prediction[:-1], 'txt')
+  with pytest.raises(ValueError):
+    list(libscores.iter_aligned_chunks(solution_file, prediction_file, 7))